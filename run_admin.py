@@ -0,0 +1,50 @@
+from slot_racer.communication import Serializer
+from slot_racer.server.server import ADMIN_PATH
+import argparse
+import asyncio
+import websockets
+
+
+parser = argparse.ArgumentParser(description='Send an admin command to a '
+                                             'running Slot Racer server')
+parser.add_argument('host', nargs='?', default='localhost')
+parser.add_argument('port', nargs='?', type=int, default=8765)
+parser.add_argument('--token', required=True,
+                    help='the admin token the server was started with')
+parser.add_argument('--profile', type=float, metavar='SECONDS', default=10.0,
+                    help='profile the server for this many seconds, '
+                         'at most 300')
+parser.add_argument('--compression', action='store_true',
+                    help='print the compression stats of every subject '
+                         'instead of profiling')
+args = parser.parse_args()
+
+
+async def command(subject, data):
+    serializer = Serializer()
+    uri = f'ws://{args.host}:{args.port}{ADMIN_PATH}'
+    async with websockets.connect(uri) as connection:
+        await connection.send(serializer.compose(subject, (args.token, data)))
+        return serializer.read(await connection.recv()).data
+
+if args.compression:
+    reply = asyncio.get_event_loop().run_until_complete(
+        command('compression', None))
+else:
+    reply = asyncio.get_event_loop().run_until_complete(
+        command('profile', args.profile))
+
+if reply is False and not args.compression and not args.profile > 0:
+    print('The duration must be a positive number of seconds')
+elif reply is False:
+    print('The server refused the token')
+elif args.compression and not reply:
+    print('The server has not sent any message yet')
+elif args.compression:
+    for subject, stats in sorted(reply.items()):
+        print(f'{subject:<18} {stats["messages"]:9d} messages, '
+              f'{stats["compressed"]:9d} compressed, '
+              f'ratio {stats["ratio"]:5.2f}, '
+              f'{stats["us_per_message"]:7.1f} us/message')
+else:
+    print(f'Profiling the server for {args.profile} seconds')
@@ -0,0 +1,51 @@
+from slot_racer.bench import suite
+import argparse
+import os
+import sys
+
+
+parser = argparse.ArgumentParser(description='Benchmark the physics, state '
+                                             'and serialization of the game')
+parser.add_argument('names', nargs='*',
+                    help='only run benchmarks whose name contains one of these')
+parser.add_argument('--baseline', default='bench_baseline.json',
+                    help='baseline file to compare against')
+parser.add_argument('--save', action='store_true',
+                    help='store the results as the new baseline')
+parser.add_argument('--threshold', type=float, default=suite.DEF_THRESHOLD,
+                    help='slowdown ratio above which a benchmark regressed')
+parser.add_argument('--memory', action='store_true',
+                    help='compare the slotted state classes with __dict__ ones '
+                         'instead')
+parser.add_argument('--startup', action='store_true',
+                    help='time cold imports of the server and client instead')
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--target', type=float, default=0.2,
+                    help='seconds each repetition should roughly take')
+args = parser.parse_args()
+
+if args.memory:
+    suite.footprint()
+    sys.exit(0)
+if args.startup:
+    suite.startup(repeat=args.repeat)
+    sys.exit(0)
+
+results = suite.run(args.names, repeat=args.repeat, target=args.target)
+
+regressed = False
+if os.path.exists(args.baseline):
+    baseline = suite.load(args.baseline)
+    if baseline['meta'] != results['meta']:
+        print(f'\nWARNING: baseline was recorded on {baseline["meta"]}')
+    print(f'\nCompared to {args.baseline}:')
+    regressed = suite.report(suite.compare(results, baseline, args.threshold))
+
+if args.save:
+    if os.path.exists(args.baseline):
+        results['results'] = dict(suite.load(args.baseline)['results'],
+                                  **results['results'])
+    suite.save(results, args.baseline)
+    print(f'\nSaved baseline to {args.baseline}')
+
+sys.exit(1 if regressed and not args.save else 0)
@@ -1,14 +1,87 @@
 from slot_racer.client import Client
-import sys
+from slot_racer.client.display import HeadlessDisplay, KEY_SPACE
+from slot_racer.client.profiler import FrameProfiler
+from slot_racer.game import POLICIES, make_policy
+from slot_racer.communication import Tracer, OnDemandProfiler
+from slot_racer.communication.profiling import FORMATS, PSTATS, DEF_DURATION
+from slot_racer.communication.tracing import DEF_SAMPLE_RATE
+import argparse
 
 
-host, port = 'localhost', 8765
+parser = argparse.ArgumentParser(description='Join a Slot Racer server')
+parser.add_argument('host', nargs='?', default='localhost')
+parser.add_argument('port', nargs='?', type=int, default=8765)
+parser.add_argument('--spectate', action='store_true',
+                    help='watch the race without a car')
+parser.add_argument('--headless', action='store_true',
+                    help='run every frame without opening a window, '
+                         'driving the car with a bot policy')
+parser.add_argument('--policy', default='pulse', choices=sorted(POLICIES),
+                    help='throttle policy of the headless car')
+parser.add_argument('--frames', type=int, default=None,
+                    help='number of frames to run headless for')
+parser.add_argument('--start', action='store_true',
+                    help='start the race once connected, when headless')
+parser.add_argument('--profile', action='store_true',
+                    help='time every phase of the frames and report them '
+                         'on exit')
+parser.add_argument('--overlay', action='store_true',
+                    help='draw the frame profile on screen')
+parser.add_argument('--trace', metavar='PATH', default=None,
+                    help='trace a sample of the events end to end and export '
+                         'them to a JSON lines file')
+parser.add_argument('--trace-rate', type=float, default=DEF_SAMPLE_RATE,
+                    help='fraction of our events to trace')
+parser.add_argument('--name', default=None,
+                    help='player name the race results are recorded under')
+parser.add_argument('--cpu-profile', metavar='PREFIX',
+                    default='client-profile',
+                    help='where the profiles requested with SIGUSR1 are '
+                         'written')
+parser.add_argument('--cpu-profile-format', choices=FORMATS, default=PSTATS,
+                    help='cProfile statistics, or collapsed stacks for flame '
+                         'graphs')
+parser.add_argument('--cpu-profile-duration', type=float,
+                    default=DEF_DURATION,
+                    help='seconds a requested profile lasts')
+args = parser.parse_args()
 
-if len(sys.argv) > 1:
-    host = sys.argv[1]
-if len(sys.argv) > 2:
-    port = int(sys.argv[2])
+profiler = None
+if args.profile or args.overlay:
+    profiler = FrameProfiler(window=None, overlay=args.overlay)
 
-x = Client()
-x.join_game(host, port)
+display = None
+if args.headless:
+    display = HeadlessDisplay(frames=args.frames)
 
+tracer = None
+if args.trace:
+    tracer = Tracer(args.trace, sample_rate=args.trace_rate)
+
+on_demand = OnDemandProfiler(args.cpu_profile, args.cpu_profile_duration,
+                             args.cpu_profile_format)
+on_demand.install()
+
+x = Client(display=display, profiler=profiler, tracer=tracer,
+           name=args.name, on_demand=on_demand)
+
+if args.headless:
+    policy = make_policy(args.policy)
+    started = []
+
+    def drive():
+        renderer = x.renderer
+        if args.start and not started and x.my_car is not None:
+            started.append(True)
+            x.send('start_game')
+        car = renderer.local_car
+        if car is not None and policy.wants_throttle(car, renderer.gametime):
+            display.press(KEY_SPACE)
+        else:
+            display.release(KEY_SPACE)
+    display.script = drive
+
+x.join_game(args.host, args.port, spectate=args.spectate)
+
+if args.profile:
+    print(profiler.report())
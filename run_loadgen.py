@@ -0,0 +1,71 @@
+from slot_racer.bench import LoadGenerator
+from slot_racer.game import POLICIES
+from slot_racer.server.simulation import MODES, INLINE
+from multiprocessing import Process
+import argparse
+import time
+
+
+def serve(host, port, simulation):
+    from slot_racer import Server
+    Server(host, port, simulation=simulation).start_server()
+
+
+parser = argparse.ArgumentParser(description='Put a Slot Racer server under '
+                                             'load with headless bots')
+parser.add_argument('host', nargs='?', default='localhost')
+parser.add_argument('port', nargs='?', type=int, default=8765)
+parser.add_argument('--bots', type=int, default=100,
+                    help='number of concurrent bot drivers')
+parser.add_argument('--loops', type=int, default=1,
+                    help='number of asyncio loops to spread the bots over')
+parser.add_argument('--duration', type=float, default=30.0,
+                    help='seconds to race for once every bot is connected')
+parser.add_argument('--ramp', type=int, default=50,
+                    help='number of bots connecting at the same time')
+parser.add_argument('--policy', choices=sorted(POLICIES), default='pulse',
+                    help='throttle pattern the bots follow')
+parser.add_argument('--period', type=float, default=None,
+                    help='pulse policy: length of an on/off cycle')
+parser.add_argument('--duty', type=float, default=None,
+                    help='pulse policy: fraction of the cycle on throttle')
+parser.add_argument('--toggle-rate', type=float, default=None,
+                    help='random policy: toggles per second')
+parser.add_argument('--margin', type=float, default=None,
+                    help='safe policy: fraction of the fall threshold')
+parser.add_argument('--reaction', type=float, default=None,
+                    help='safe policy: seconds to react before braking')
+parser.add_argument('--fps', type=int, default=30,
+                    help='input checks per second for every bot')
+parser.add_argument('--spawn', action='store_true',
+                    help='start a local Server on host:port first')
+parser.add_argument('--simulation', choices=MODES, default=INLINE,
+                    help='where the spawned server runs its simulation')
+args = parser.parse_args()
+
+# Only the options of the chosen policy are handed to it
+POLICY_ARGS = dict(
+    hold=(),
+    pulse=('period', 'duty'),
+    random=('toggle_rate',),
+    safe=('margin', 'reaction')
+)
+policy_args = {name: getattr(args, name) for name in POLICY_ARGS[args.policy]
+               if getattr(args, name) is not None}
+
+server = None
+if args.spawn:
+    # Not a daemon, since the server may start a simulation process of its own
+    server = Process(target=serve,
+                     args=[args.host, args.port, args.simulation])
+    server.start()
+    time.sleep(1)
+
+x = LoadGenerator(args.host, args.port, bots=args.bots, loops=args.loops,
+                  duration=args.duration, ramp=args.ramp,
+                  policy_name=args.policy, policy_args=policy_args,
+                  fps=args.fps)
+print(x.run().report())
+
+if server is not None:
+    server.terminate()
@@ -0,0 +1,22 @@
+from slot_racer.bench import loops
+import argparse
+
+
+parser = argparse.ArgumentParser(description='Compare the event loop backends '
+                                             'a Slot Racer server can run on')
+parser.add_argument('backends', nargs='*',
+                    help='backends to compare, all available ones by default')
+parser.add_argument('--clients', type=int, default=200,
+                    help='number of connections to accept and broadcast to')
+parser.add_argument('--broadcasts', type=int, default=100,
+                    help='number of broadcasts to send to every client')
+parser.add_argument('--ping-rounds', type=int, default=1,
+                    help='pings per new connection (the server uses 50)')
+parser.add_argument('--port', type=int, default=8799)
+args = parser.parse_args()
+
+results = loops.run(args.backends, clients=args.clients,
+                    broadcasts=args.broadcasts, ping_rounds=args.ping_rounds,
+                    port=args.port)
+print(loops.report(results))
+
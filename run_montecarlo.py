@@ -0,0 +1,50 @@
+from slot_racer.montecarlo import parse_policy, make_races, run, save, report
+from slot_racer.game.physics.physics import DEFAULTS
+import argparse
+import time
+
+
+parser = argparse.ArgumentParser(description='Race Slot Racer bots offline, '
+                                             'over a grid of physics constants')
+parser.add_argument('--races', type=int, default=100,
+                    help='races for every combination of the constants')
+parser.add_argument('--cars', type=int, default=4,
+                    help='cars in every race')
+parser.add_argument('--policy', action='append', default=None,
+                    help="policy the cars take in turn, as 'name' or "
+                         "'name:key=value,...' (repeat for several)")
+for name in DEFAULTS:
+    parser.add_argument(f'--{name.lower().replace("_", "-")}', type=float,
+                        nargs='+', default=None, dest=name,
+                        help=f'values of {name} to sweep over')
+parser.add_argument('--timestep', type=float, default=1 / 30)
+parser.add_argument('--max-time', type=float, default=600.0,
+                    help='longest race, in seconds')
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--processes', type=int, default=None,
+                    help='worker processes, one per CPU by default')
+parser.add_argument('--chunksize', type=int, default=16,
+                    help='races handed to a worker at a time')
+parser.add_argument('--out', default=None,
+                    help='JSON file to write the summaries to')
+
+# Workers may be spawned, re-importing this script: only race when it is
+# the one being run
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    grid = {name: getattr(args, name) for name in DEFAULTS
+            if getattr(args, name) is not None}
+    policies = [parse_policy(spec)
+                for spec in args.policy or ['safe', 'pulse']]
+    races = make_races(grid, policies, args.races, args.cars, seed=args.seed,
+                       timestep=args.timestep, max_time=args.max_time)
+
+    start = time.perf_counter()
+    summaries = run(races, args.processes, args.chunksize)
+    elapsed = time.perf_counter() - start
+    report(summaries)
+    total = sum(summary['races'] for summary in summaries.values())
+    print(f'{total} races in {elapsed:.1f}s ({total / elapsed:.1f} races/s)')
+    if args.out is not None:
+        save(summaries, args.out)
@@ -0,0 +1,33 @@
+from slot_racer.communication import TrackReader
+import argparse
+import time
+
+
+parser = argparse.ArgumentParser(description='Follow a Slot Racer race from '
+                                             'the shared memory ring of a '
+                                             'local server')
+parser.add_argument('path', help='ring written by run_server.py --shared')
+parser.add_argument('--interval', type=float, default=1.0,
+                    help='seconds between two printed frames')
+args = parser.parse_args()
+
+reader = TrackReader(args.path)
+printed, frames, skipped, last = 0.0, 0, 0, None
+try:
+    for frame, gametime, winner, cars in reader.follow():
+        frames += 1
+        if last is not None:
+            skipped += frame - last - 1
+        last = frame
+        if time.monotonic() - printed < args.interval:
+            continue
+        printed = time.monotonic()
+        positions = ', '.join(
+            f'#{car_id}: {distance:.2f}{" (fallen)" if fallen else ""}'
+            for car_id, _, fallen, _, distance in cars)
+        status = f' winner: #{winner}' if winner is not None else ''
+        print(f'[{gametime:7.2f}] {positions}{status}')
+except KeyboardInterrupt:
+    pass
+print(f'{frames} frames read, {skipped} skipped')
+reader.close()
@@ -0,0 +1,55 @@
+from slot_racer.replay import RaceLog, Replayer
+import argparse
+
+
+parser = argparse.ArgumentParser(description='Replay a recorded Slot Racer '
+                                             'race')
+parser.add_argument('path', help='race log written by run_server.py --record')
+parser.add_argument('--start', type=float, default=0.0,
+                    help='gametime to start the replay at')
+parser.add_argument('--speed', type=float, default=1.0,
+                    help='replay speed, 1.0 being the original pace')
+parser.add_argument('--headless', action='store_true',
+                    help='print the race once per second instead of '
+                         'opening a window')
+parser.add_argument('--profile', action='store_true',
+                    help='run the replay through the renderer without a '
+                         'window and report where the frame time goes')
+parser.add_argument('--overlay', action='store_true',
+                    help='draw the frame profile on screen')
+args = parser.parse_args()
+
+
+def report(gametime, track, winner, last=[None]):
+    second = int(gametime)
+    if second != last[0]:
+        last[0] = second
+        cars = ', '.join(f'#{car.id}: {car.distance:.2f}'
+                         for car in track.participants)
+        print(f'[{gametime:7.2f}] {cars}' +
+              (f' winner: #{winner}' if winner is not None else ''))
+
+
+if args.headless:
+    Replayer(RaceLog(args.path)).play(report, args.start, speed=args.speed)
+elif args.profile:
+    from slot_racer.client.replay import ReplayRenderer
+    from slot_racer.client.display import HeadlessDisplay
+    from slot_racer.client.profiler import FrameProfiler
+    display, profiler = HeadlessDisplay(), FrameProfiler(window=None)
+    renderer = ReplayRenderer(args.path, args.start, args.speed, display=display,
+                              profiler=profiler)
+
+    def stop_when_finished():
+        if renderer.replayer.finished:
+            display.quit()
+    display.script = stop_when_finished
+    renderer.start()
+    print(profiler.report())
+else:
+    from slot_racer.client.replay import ReplayRenderer
+    from slot_racer.client.profiler import FrameProfiler
+    profiler = FrameProfiler(overlay=True) if args.overlay else None
+    ReplayRenderer(args.path, args.start, args.speed,
+                   profiler=profiler).start()
+
@@ -0,0 +1,34 @@
+from slot_racer.results import ResultsStore
+from slot_racer.results.results import LEADERBOARDS
+import argparse
+import time
+
+
+parser = argparse.ArgumentParser(description='Show the Slot Racer leaderboard '
+                                             'or the races of a player')
+parser.add_argument('path', help='results file written by '
+                                 'run_server.py --results')
+parser.add_argument('--by', choices=sorted(LEADERBOARDS), default='wins',
+                    help='what the leaderboard is sorted by')
+parser.add_argument('--player', default=None,
+                    help='show the last races of this player instead')
+parser.add_argument('--limit', type=int, default=10)
+args = parser.parse_args()
+
+store = ResultsStore(args.path)
+if args.player is None:
+    print(f'{"player":<20}{"races":>7}{"wins":>7}{"falls":>7}{"best lap":>10}')
+    for player, races, wins, falls, best_lap in store.leaderboard(args.by,
+                                                                  args.limit):
+        best_lap = f'{best_lap:9.2f}s' if best_lap is not None else '        -'
+        print(f'{player:<20}{races:>7}{wins:>7}{falls:>7}{best_lap}')
+else:
+    print(f'{"race":>7}  {"date":<20}{"position":>9}{"laps":>6}'
+          f'{"best lap":>10}{"falls":>7}')
+    for race, started, position, laps, best_lap, falls in \
+            store.history(args.player, args.limit):
+        date = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))
+        best_lap = f'{best_lap:9.2f}s' if best_lap is not None else '        -'
+        print(f'{race:>7}  {date:<20}{position:>9}{laps:>6}{best_lap}'
+              f'{falls:>7}')
+store.close()
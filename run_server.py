@@ -1,15 +1,80 @@
 from slot_racer import Server
-import sys
+from slot_racer.communication import (backend, Tracer, OnDemandProfiler,
+                                      Compressor)
+from slot_racer.communication.compression import DEF_THRESHOLD, DEF_LEVEL
+from slot_racer.communication.profiling import FORMATS, PSTATS, DEF_DURATION
+from slot_racer.server.simulation import MODES, INLINE
+from slot_racer.server.inputs import DEF_INPUT_RATE, DEF_INPUT_BURST
+from slot_racer.game import DEF_RESULTS_TIME
+import argparse
 
 
-host, port = 'localhost', 8765
+parser = argparse.ArgumentParser(description='Run a Slot Racer server')
+parser.add_argument('host', nargs='?', default='localhost')
+parser.add_argument('port', nargs='?', type=int, default=8765)
+parser.add_argument('--record', metavar='PATH', default=None,
+                    help='record the race to a log that run_replay.py can '
+                         'play, the next races to PATH-2, PATH-3...')
+parser.add_argument('--loop', choices=backend.BACKENDS, default=None,
+                    help='event loop implementation, defaults to the '
+                         f'{backend.ENV_VAR} environment variable or auto')
+parser.add_argument('--trace', metavar='PATH', default=None,
+                    help='export the hops of the traced events to a JSON '
+                         'lines file')
+parser.add_argument('--simulation', choices=MODES, default=INLINE,
+                    help='run the simulation on the event loop, in a worker '
+                         'thread or in a worker process')
+parser.add_argument('--results', metavar='PATH', default=None,
+                    help='record race results and the leaderboard to an '
+                         'SQLite file')
+parser.add_argument('--input-rate', type=float, default=DEF_INPUT_RATE,
+                    help='inputs per second a client may send before the ones '
+                         'over the rate are held for the next tick (0 to '
+                         'disable)')
+parser.add_argument('--input-burst', type=int, default=DEF_INPUT_BURST,
+                    help='inputs a client may send in a burst')
+parser.add_argument('--shared', metavar='PATH', default=None,
+                    help='publish the cars every tick to a shared memory ring '
+                         'local processes can read, e.g. /dev/shm/slot_racer')
+parser.add_argument('--cpu-profile', metavar='PREFIX',
+                    default='server-profile',
+                    help='where the profiles requested with SIGUSR1 or '
+                         'run_admin.py are written')
+parser.add_argument('--cpu-profile-format', choices=FORMATS, default=PSTATS,
+                    help='cProfile statistics, or collapsed stacks for flame '
+                         'graphs')
+parser.add_argument('--cpu-profile-duration', type=float,
+                    default=DEF_DURATION,
+                    help='seconds a profile requested by signal lasts')
+parser.add_argument('--admin-token', default=None,
+                    help='token admin messages must carry, admin messages are '
+                         'refused without one')
+parser.add_argument('--results-time', type=float, default=DEF_RESULTS_TIME,
+                    help='seconds the results are shown before the next race '
+                         'can start')
+parser.add_argument('--no-gc-tuning', action='store_true',
+                    help='leave the garbage collector running during races')
+parser.add_argument('--compress-above', type=int, metavar='BYTES',
+                    default=DEF_THRESHOLD,
+                    help='compress the messages of at least this many bytes')
+parser.add_argument('--compress-level', type=int, choices=range(1, 10),
+                    default=DEF_LEVEL, metavar='LEVEL',
+                    help='zlib compression level, from 1 (fastest) to 9')
+parser.add_argument('--no-compression', action='store_true',
+                    help='send every message uncompressed')
+args = parser.parse_args()
 
-if len(sys.argv) > 1:
-    host = sys.argv[1]
-if len(sys.argv) > 2:
-    port = int(sys.argv[2])
-
-x = Server(host, port)
+tracer = Tracer(args.trace) if args.trace else None
+on_demand = OnDemandProfiler(args.cpu_profile, args.cpu_profile_duration,
+                             args.cpu_profile_format)
+on_demand.install()
+compressor = Compressor(None if args.no_compression else args.compress_above,
+                        args.compress_level)
+x = Server(args.host, args.port, record=args.record, loop_backend=args.loop,
+           tracer=tracer, simulation=args.simulation, results=args.results,
+           input_rate=args.input_rate, input_burst=args.input_burst,
+           shared=args.shared, on_demand=on_demand,
+           admin_token=args.admin_token, results_time=args.results_time,
+           gc_tuning=not args.no_gc_tuning, compressor=compressor)
 x.start_server()
 
-
@@ -0,0 +1,12 @@
+from slot_racer.communication import tracing
+import argparse
+
+
+parser = argparse.ArgumentParser(description='Report the latency each hop adds '
+                                             'to the traced events')
+parser.add_argument('paths', nargs='+',
+                    help='trace files written by run_server.py --trace and '
+                         'run_client.py --trace')
+args = parser.parse_args()
+
+tracing.report(tracing.summarize(tracing.load(args.paths)))
@@ -1,9 +1,26 @@
 """Module to encapsulate the entire game"""
 
+# package imports
+import importlib
+
 # allows our run modules to run the game, and allows inter module communication
 from .game import *
-from .client import *
 from .server import *
 from .communication import *
 
+# The client is only imported the first time one of its definitions is used,
+# so that the server and the headless tools start without the client's stack
+LAZY = {'Client': '.client'}
+
+
+def __getattr__(name):
+    module = LAZY.get(name, None)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
+def __dir__():
+    return sorted(set(globals()) | set(LAZY))
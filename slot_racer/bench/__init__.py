@@ -0,0 +1,5 @@
+"""Module to measure how the game performs under load"""
+
+from .loadgen import LoadGenerator, LoadStats, Bot
+from . import suite, loops
+
@@ -0,0 +1,316 @@
+# Module to put a Server under load with headless bot drivers
+#
+# Every Bot speaks the same websocket protocol as Client.handle_message
+# (ping/cars/begin_countdown/update/winner) but has no Renderer, so thousands
+# of them can share one or a few asyncio loops.
+
+# package imports
+import time
+import asyncio
+import threading
+import statistics
+import websockets
+from ..game import state, Driver, make_policy
+from ..communication import Serializer, TICK_TIME
+
+
+def percentile(values, fraction):
+    """Returns the value at the given fraction of the sorted values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class LoadStats(object):
+    """LoadStats collects the measurements of all the Bots running on one loop
+
+    It is defined by the following attributes:
+    - sent: dictionary mapping subjects to the number of messages sent
+    - received: dictionary mapping subjects to the number of messages received,
+          the ones that could not be read counted as 'unreadable'
+    - tick_intervals: server side time between two consecutive updates
+    - arrival_intervals: client side time between two consecutive updates
+    - fanout: dictionary mapping a server tick time to the first and last time
+          any Bot received it and how many Bots did
+    - connect_times: time each Bot needed to be accepted (handshake + pings)
+    - started/stopped: wall clock bounds of the measurement
+    """
+    def __init__(self):
+        self.sent              = {}
+        self.received          = {}
+        self.tick_intervals    = []
+        self.arrival_intervals = []
+        self.fanout            = {}
+        self.connect_times     = []
+        self.started           = None
+        self.stopped           = None
+
+    def count(self, table, subject):
+        table[subject] = table.get(subject, 0) + 1
+
+    def record_update(self, server_time, arrival):
+        first, last, count = self.fanout.get(server_time, (arrival, arrival, 0))
+        self.fanout[server_time] = (min(first, arrival), max(last, arrival),
+                                    count + 1)
+
+    def merge(self, other):
+        """Merges the measurements of another loop into this one"""
+        for subject, count in other.sent.items():
+            self.sent[subject] = self.sent.get(subject, 0) + count
+        for subject, count in other.received.items():
+            self.received[subject] = self.received.get(subject, 0) + count
+        self.tick_intervals.extend(other.tick_intervals)
+        self.arrival_intervals.extend(other.arrival_intervals)
+        self.connect_times.extend(other.connect_times)
+        for server_time, (first, last, count) in other.fanout.items():
+            first_, last_, count_ = self.fanout.get(server_time,
+                                                    (first, last, 0))
+            self.fanout[server_time] = (min(first, first_), max(last, last_),
+                                        count + count_)
+        bounds = [t for t in (self.started, other.started) if t is not None]
+        self.started = min(bounds) if bounds else None
+        bounds = [t for t in (self.stopped, other.stopped) if t is not None]
+        self.stopped = max(bounds) if bounds else None
+
+    def report(self):
+        """Returns a printable summary of the measurements"""
+        elapsed = max((self.stopped or 0) - (self.started or 0), 1e-9)
+        spreads = [last - first for first, last, _ in self.fanout.values()]
+        lines = [f'Measured for {elapsed:.2f}s']
+
+        lines.append('Server tick interval (ms): ' + self.summary(
+            self.tick_intervals))
+        lines.append('Server tick overrun (ms):  ' + self.summary(
+            [max(t - TICK_TIME, 0) for t in self.tick_intervals]))
+        lines.append('Update arrival interval (ms): ' + self.summary(
+            self.arrival_intervals))
+        lines.append('Broadcast fan-out (ms): ' + self.summary(spreads))
+        lines.append('Connect time (ms): ' + self.summary(self.connect_times))
+
+        lines.append(f'Sent:     {sum(self.sent.values()) / elapsed:.1f} msg/s')
+        for subject, count in sorted(self.sent.items()):
+            lines.append(f'  {subject:<18} {count / elapsed:10.1f} msg/s')
+        lines.append(f'Received: {sum(self.received.values()) / elapsed:.1f}'
+                     f' msg/s')
+        for subject, count in sorted(self.received.items()):
+            lines.append(f'  {subject:<18} {count / elapsed:10.1f} msg/s')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def summary(values):
+        if not values:
+            return 'no samples'
+        ms = [v * 1000 for v in values]
+        return (f'mean={statistics.mean(ms):.2f} p50={percentile(ms, 0.5):.2f}'
+                f' p99={percentile(ms, 0.99):.2f} max={max(ms):.2f}')
+
+
+class Bot(object):
+    """A Bot is a headless Client. It keeps its own Car so that the events it
+    sends carry the same speed and distance a real player would send
+
+    It is defined by the following attributes:
+    - uri: the websocket address of the server
+    - stats: the LoadStats shared by every Bot on the same loop
+    - policy_name/policy_args: how the bot decides to press the throttle
+    - fps: how many times per second the bot checks its input, like the
+          Renderer does
+    - leader: whether this bot sends 'start_game' once everyone is connected
+    - connection: the websocket connected to the server
+    - reader: the task reading incoming messages
+    - id/car_ids: the car ids received from the server
+    - driver: the Driver playing our car, created at countdown
+    - start_time: the loop time the race starts at
+    - winner: id of the winning car, if available
+    """
+    def __init__(self, uri, stats, policy_name='pulse', policy_args=None,
+                 fps=30, leader=False):
+        self.uri         = uri
+        self.stats       = stats
+        self.policy_name = policy_name
+        self.policy_args = policy_args or {}
+        self.fps         = fps
+        self.leader      = leader
+        self.serializer  = Serializer()
+        self.connection  = None
+        self.reader      = None
+        self.id          = None
+        self.car_ids     = None
+        self.driver      = None
+        self.start_time  = None
+        self.winner      = None
+        self.last_server_time = None
+        self.last_arrival     = None
+
+    async def connect(self, connected):
+        """Open the connection and answer pings until the server accepts us.
+        From then on, messages are read in the background so the server never
+        blocks on a full socket while the other bots connect
+        """
+        start = time.perf_counter()
+        self.connection = await websockets.connect(self.uri, compression=None)
+        while self.id is None:
+            self.handle_message(await self.connection.recv())
+        self.stats.connect_times.append(time.perf_counter() - start)
+        self.reader = asyncio.ensure_future(self.read_messages())
+        connected.release()
+
+    async def run(self, stop_time):
+        """Drive the car until the stop time"""
+        if self.leader:
+            await self.send('start_game')
+
+        loop = asyncio.get_event_loop()
+        while loop.time() < stop_time:
+            if self.driver is not None and loop.time() >= self.start_time:
+                message = self.driver.drive(loop.time() - self.start_time)
+                if message is not None:
+                    await self.send(*message)
+            await asyncio.sleep(1 / self.fps)
+
+        self.reader.cancel()
+        await self.connection.close()
+
+    async def read_messages(self):
+        try:
+            async for message in self.connection:
+                self.handle_message(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def send(self, subject, data=None):
+        self.stats.count(self.stats.sent, subject)
+        await self.connection.send(self.serializer.compose(subject, data))
+
+    def handle_message(self, message):
+        arrival = time.perf_counter()
+        try:
+            message = self.serializer.read(message)
+        except (ValueError, TypeError, IndexError, KeyError):
+            self.stats.count(self.stats.received, 'unreadable')
+            return
+        self.stats.count(self.stats.received, message.subject)
+        subjects = dict(
+            ping=self.ping,
+            cars=self.cars,
+            begin_countdown=self.begin_countdown,
+            update=self.server_update,
+            winner=self.set_winner,
+            reset=self.reset
+        )
+        handler = subjects.get(message.subject, None)
+        if handler is not None:
+            handler(message.data, arrival)
+
+    # Messaging Protocol ------------------------------------------------------
+    def ping(self, data, arrival):
+        self.stats.count(self.stats.sent, 'pong')
+        asyncio.ensure_future(self.connection.send(
+            self.serializer.compose('pong', None)))
+
+    def cars(self, data, arrival):
+        self.id, self.car_ids = data
+
+    def begin_countdown(self, data, arrival):
+        seconds, _ = data
+        policy = make_policy(self.policy_name, **self.policy_args)
+        self.driver = Driver(state.Car(self.id), policy)
+        self.start_time = asyncio.get_event_loop().time() + seconds
+
+    def server_update(self, data, arrival):
+        server_time, events = data
+        self.stats.record_update(server_time, arrival)
+        if self.last_server_time is not None:
+            self.stats.tick_intervals.append(server_time -
+                                             self.last_server_time)
+            self.stats.arrival_intervals.append(arrival - self.last_arrival)
+        self.last_server_time, self.last_arrival = server_time, arrival
+
+    def set_winner(self, data, arrival):
+        self.winner = data
+
+    def reset(self, data, arrival):
+        self.driver = self.start_time = self.winner = None
+
+
+class LoadGenerator(object):
+    """LoadGenerator spreads a number of Bots over a few asyncio loops, each
+    running on its own thread, and merges their measurements
+
+    It is defined by the following attributes:
+    - host/port: where the Server is listening
+    - bots: the total number of bots to connect
+    - loops: the number of asyncio loops (threads) to spread the bots over
+    - duration: how long the bots drive for once everyone is connected
+    - ramp: how many bots may be connecting to the server at the same time
+    - policy_name/policy_args/fps: passed to every Bot
+    - stats: the merged LoadStats once run() returns
+    """
+    def __init__(self, host='localhost', port=8765, bots=100, loops=1,
+                 duration=30.0, ramp=50, policy_name='pulse',
+                 policy_args=None, fps=30):
+        self.host        = host
+        self.port        = port
+        self.bots        = bots
+        self.loops       = max(1, min(loops, bots))
+        self.duration    = duration
+        self.ramp        = ramp
+        self.policy_name = policy_name
+        self.policy_args = policy_args or {}
+        self.fps         = fps
+        self.stats       = LoadStats()
+
+    def run(self):
+        """Runs every loop to completion and returns the merged stats"""
+        connected = threading.Semaphore(0)
+        everyone  = threading.Event()
+        results   = [LoadStats() for _ in range(self.loops)]
+        threads   = []
+        for index in range(self.loops):
+            count = self.bots // self.loops + (index < self.bots % self.loops)
+            threads.append(threading.Thread(
+                target=self._run_loop,
+                args=[index, count, results[index], connected, everyone]
+            ))
+        for thread in threads:
+            thread.start()
+
+        # Only start the race once every bot has been accepted
+        for _ in range(self.bots):
+            connected.acquire()
+        print(f'{self.bots} bots connected. Racing for {self.duration}s...')
+        everyone.set()
+
+        for thread in threads:
+            thread.join()
+        for result in results:
+            self.stats.merge(result)
+        return self.stats
+
+    def _run_loop(self, index, count, stats, connected, everyone):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(
+            self._drive(index, count, stats, connected, everyone))
+        loop.close()
+
+    async def _drive(self, index, count, stats, connected, everyone):
+        uri  = f'ws://{self.host}:{self.port}'
+        bots = [Bot(uri, stats, self.policy_name, self.policy_args, self.fps,
+                    leader=(index == 0 and i == 0)) for i in range(count)]
+
+        # Throttle how many bots connect at once, the server pings each of them
+        ramp = asyncio.Semaphore(max(1, self.ramp // self.loops))
+
+        async def connect(bot):
+            async with ramp:
+                await bot.connect(connected)
+        await asyncio.gather(*[connect(bot) for bot in bots])
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, everyone.wait)
+        stats.started = time.perf_counter()
+        stop_time = loop.time() + self.duration
+        await asyncio.gather(*[bot.run(stop_time) for bot in bots])
+        stats.stopped = time.perf_counter()
@@ -0,0 +1,77 @@
+# Module to compare the event loop backends a Server can run on
+#
+# For every available backend, a Server and its bots share one loop of that
+# backend. We measure how fast the server accepts connections (handshake,
+# pings and roster broadcast included) and how many broadcast messages per
+# second reach the bots.
+
+# package imports
+import time
+import asyncio
+import threading
+import websockets
+from ..server import Server
+from ..communication import backend
+from .loadgen import Bot, LoadStats
+
+
+async def measure(server, port, clients, broadcasts):
+    """Accepts the clients, then broadcasts to them. Returns the accept rate
+    and the broadcast rate, in connections and messages per second
+    """
+    serving = await websockets.serve(server.listener, server.host, port,
+                                     compression=None)
+    try:
+        stats = LoadStats()
+        bots  = [Bot(f'ws://{server.host}:{port}', stats)
+                 for _ in range(clients)]
+
+        start = time.perf_counter()
+        await asyncio.gather(*[bot.connect(threading.Semaphore(0))
+                               for bot in bots])
+        accepted = time.perf_counter() - start
+
+        events = [(i, ('accelerate', (1.0, 0.3, 0.42))) for i in range(10)]
+        start = time.perf_counter()
+        for i in range(broadcasts):
+            await server.update_all('update', (float(i), events))
+        while stats.received.get('update', 0) < clients * broadcasts:
+            await asyncio.sleep(0.001)
+        broadcasted = time.perf_counter() - start
+
+        for bot in bots:
+            bot.reader.cancel()
+            await bot.connection.close()
+        return clients / accepted, clients * broadcasts / broadcasted
+    finally:
+        serving.close()
+        await serving.wait_closed()
+
+
+def run(backends=None, clients=200, broadcasts=100, ping_rounds=1,
+        host='localhost', port=8799):
+    """Runs the measurement on a fresh loop of every backend. Returns a
+    dictionary mapping each backend to its (accept rate, broadcast rate)
+    """
+    results = {}
+    for name in backends or backend.available_backends():
+        server = Server(host, port, loop_backend=name)
+        server.ping_rounds = ping_rounds
+
+        loop = backend.new_event_loop(name)
+        asyncio.set_event_loop(loop)
+        try:
+            results[name] = loop.run_until_complete(
+                measure(server, port, clients, broadcasts))
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+    return results
+
+
+def report(results):
+    lines = [f'{"backend":<10} {"accept (conn/s)":>16} '
+             f'{"broadcast (msg/s)":>18}']
+    for name, (accept, broadcast) in results.items():
+        lines.append(f'{name:<10} {accept:16.1f} {broadcast:18.1f}')
+    return '\n'.join(lines)
@@ -0,0 +1,383 @@
+# Module to time the physics, state and serialization of the game
+#
+# Every benchmark is a function that builds its fixture and returns the
+# callable to time. Results are stored as JSON baselines so that later runs can
+# be compared against them and regressions flagged.
+
+# package imports
+import sys
+import os
+import json
+import time
+import timeit
+import platform
+import subprocess
+import tracemalloc
+from ..game import state, physics, Event, FallData, CollisionIndex
+from ..communication import Serializer, Compressor
+from ..server.extra import ServerClient
+from ..server.inputs import coalesce, valid_event
+from ..server.simulation import Simulation
+
+# global variables
+BENCHMARKS = {}
+DEF_THRESHOLD = 0.25
+GAMETIME = 12.5
+
+
+def benchmark(name):
+    """Registers the decorated fixture under the given name"""
+    def register(fixture):
+        BENCHMARKS[name] = fixture
+        return fixture
+    return register
+
+
+def make_car(idx=0, history=0, accelerating=True):
+    """Builds a car that has already gone through the given number of events"""
+    car = state.Car(idx)
+    for i in range(history):
+        car.prev_events.append(Event(
+            state.Car.ACCELERATE if i % 2 else state.Car.STOP_ACCELERATING,
+            GAMETIME * i / max(history, 1), 0.3, 0.01 * i))
+    car.speed, car.distance = 0.3, 0.42
+    car.is_accelerating = accelerating
+    return car
+
+
+def make_track(cars):
+    track = state.Track(num_participants=cars)
+    for car in track.participants:
+        car.accelerate(0.0)
+    return track
+
+
+def make_events(cars):
+    """Builds the event list a server tick would broadcast"""
+    return [(idx, (state.Car.ACCELERATE, (GAMETIME, 0.3, 0.42 + idx)))
+            for idx in range(cars)]
+
+
+# Micro benchmarks ------------------------------------------------------------
+@benchmark('physics.calculate_posn')
+def bench_calculate_posn():
+    car = make_car()
+    return lambda: physics.calculate_posn(car)
+
+
+@benchmark('physics.threshold')
+def bench_threshold():
+    car = make_car()
+    return lambda: physics.threshold(car)
+
+
+@benchmark('physics.car_timestep')
+def bench_car_timestep():
+    car = make_car()
+    return lambda: physics.car_timestep(car, state.Track.DEF_TS)
+
+
+@benchmark('Car.update')
+def bench_car_update():
+    car = make_car(history=1)
+    return lambda: car.update(GAMETIME)
+
+
+@benchmark('Car.get_past_car[10]')
+def bench_get_past_car_10():
+    car = make_car(history=10)
+    return lambda: car.get_past_car(GAMETIME / 2)
+
+
+@benchmark('Car.get_past_car[1000]')
+def bench_get_past_car_1000():
+    car = make_car(history=1000)
+    return lambda: car.get_past_car(GAMETIME / 2)
+
+
+@benchmark('Car.get_past_car[10000]')
+def bench_get_past_car_10000():
+    car = make_car(history=10000)
+    return lambda: car.get_past_car(GAMETIME / 2)
+
+
+@benchmark('Track.update_all[2]')
+def bench_update_all_2():
+    track = make_track(2)
+    return lambda: track.update_all(GAMETIME)
+
+
+@benchmark('Track.update_all[100]')
+def bench_update_all_100():
+    track = make_track(100)
+    return lambda: track.update_all(GAMETIME)
+
+
+@benchmark('CollisionIndex.update[100]')
+def bench_collisions_100():
+    track = make_track(100)
+    for car in track.participants:
+        car.distance = car.id * 0.01
+    collisions = CollisionIndex(track)
+    collisions.update()
+    return collisions.update
+
+
+@benchmark('Track.generate_track_points')
+def bench_generate_track_points():
+    return lambda: state.Track.generate_track_points(0)
+
+
+@benchmark('Serializer.compose[update]')
+def bench_compose():
+    serializer, events = Serializer(), make_events(10)
+    return lambda: serializer.compose('update', (GAMETIME, events))
+
+
+@benchmark('Serializer.read[update]')
+def bench_read():
+    serializer = Serializer()
+    message = serializer.compose('update', (GAMETIME, make_events(10)))
+    return lambda: serializer.read(message)
+
+
+@benchmark('Compressor.pack[update 100]')
+def bench_pack():
+    compressor = Compressor()
+    message = Serializer().compose('update', (GAMETIME, make_events(100)))
+    return lambda: compressor.pack(message, 'update')
+
+
+@benchmark('Serializer.read[packed 100]')
+def bench_read_compressed():
+    serializer = Serializer()
+    message = Compressor().pack(serializer.compose(
+        'update', (GAMETIME, make_events(100))), 'update')
+    return lambda: serializer.read(message)
+
+
+# Macro benchmarks ------------------------------------------------------------
+def make_tick(cars):
+    """One server tick end to end, without the network: every car sends an
+    event, the server reads and checks it, coalesces the tick's inputs and
+    runs the Simulation on them, then packs its messages, and a client reads
+    the update and applies it
+    """
+    from ..client import Client
+    from ..client.display import HeadlessDisplay
+
+    serializer, compressor = Serializer(), Compressor()
+    simulation = Simulation()
+    simulation.add_participants(range(cars))
+    client = Client(display=HeadlessDisplay(frames=0))
+    renderer = client.renderer
+    for car_id in range(cars):
+        renderer.track.add_participant(renderer.cars.acquire(car_id))
+    client.id = 0
+    renderer.local_car = renderer.track.get_car_by_id(0)
+    renderer.gametime = GAMETIME
+    incoming = [serializer.compose(state.Car.ACCELERATE,
+                                   (GAMETIME, 0.3, 0.42 + car_id * 0.01))
+                for car_id in range(cars)]
+
+    def tick():
+        # Server: read every message, check it and queue it for the tick
+        events = []
+        for car_id, message in enumerate(incoming):
+            parsed = serializer.read(message)
+            if valid_event(parsed.subject, parsed.data):
+                events.append((car_id, GAMETIME, parsed))
+        inputs = [(car_id, received, parsed.subject, parsed.data)
+                  for car_id, received, parsed in coalesce(events)]
+        _, messages, _ = simulation.tick(GAMETIME, inputs)
+        packed = [compressor.pack(message) for message in messages]
+
+        # Client: read the broadcast and apply the remote events
+        for message in packed:
+            parsed = serializer.read(message)
+            if parsed.subject == 'update':
+                client.server_update(parsed.data)
+        renderer.track.update_all(GAMETIME)
+
+        # Keep the event histories from growing between repetitions
+        for car in simulation.track.participants + \
+                renderer.track.participants:
+            del car.prev_events[1:]
+    return tick
+
+
+@benchmark('tick[10 cars]')
+def bench_tick():
+    return make_tick(10)
+
+
+@benchmark('tick[100 cars]')
+def bench_tick_100():
+    return make_tick(100)
+
+
+# Memory footprint ------------------------------------------------------------
+def unslotted(cls):
+    """Rebuilds a slotted class as an ordinary class with a __dict__, the same
+    methods and class attributes, to compare the two
+    """
+    slots = set(cls.__slots__)
+    namespace = {name: value for name, value in vars(cls).items()
+                 if name not in slots and name != '__slots__'}
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+FOOTPRINTS = dict(
+    Car=(state.Car, lambda cls, i: cls(i)),
+    Event=(Event, lambda cls, i: cls(state.Car.ACCELERATE, i, 0.3, 0.42)),
+    FallData=(FallData, lambda cls, i: cls(0.3, 0.42, i)),
+    ServerClient=(ServerClient, lambda cls, i: cls(i, None, 0.0))
+)
+
+
+def allocated(build, count):
+    """Returns the bytes allocated per object built"""
+    tracemalloc.start()
+    objects = [build(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (size - sys.getsizeof(objects)) / len(objects)
+
+
+def footprint(count=10000, out=sys.stdout):
+    """Compares the memory, construction time and attribute reads of the
+    slotted state classes with their __dict__ equivalents
+    """
+    print(f'{"class":<14}{"bytes (dict -> slots)":>24}'
+          f'{"build ns (dict -> slots)":>28}{"read ns (dict -> slots)":>28}',
+          file=out)
+    rows = {}
+    for name, (cls, make) in FOOTPRINTS.items():
+        row = []
+        for variant in (unslotted(cls), cls):
+            build = timeit.Timer(lambda: make(variant, 0))
+            read = timeit.Timer(f'obj.{cls.__slots__[0]}',
+                                globals=dict(obj=make(variant, 0)))
+            row.append((allocated(lambda i: make(variant, i), count),
+                        min(build.repeat(5, 10000)) / 10000 * 1e9,
+                        min(read.repeat(5, 100000)) / 100000 * 1e9))
+        (dict_bytes, dict_build, dict_read), (bytes_, build, read) = row
+        rows[name] = row
+        print(f'{name:<14}{dict_bytes:11.0f} -> {bytes_:8.0f}'
+              f'{dict_build:15.0f} -> {build:8.0f}'
+              f'{dict_read:15.1f} -> {read:8.1f}', file=out)
+    return rows
+
+
+# Startup time ----------------------------------------------------------------
+STARTUP_MODULES = ('slot_racer.server', 'slot_racer', 'slot_racer.client')
+CLIENT_STACK = ('slot_racer.client', 'pyxel', 'glfw')
+STARTUP_SCRIPT = '''
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(
+    name for name in sys.modules
+    if any(name == top or name.startswith(top + '.') for top in {stack!r}))]))
+'''
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def startup(modules=STARTUP_MODULES, repeat=5, out=sys.stdout):
+    """Times a cold import of every module in fresh interpreters, along with
+    the whole process (interpreter start included), and lists the modules of
+    the client stack each import loaded
+    """
+    print(f'{"module":<24}{"import ms":>11}{"process ms":>12}  client stack',
+          file=out)
+    results = {}
+    for module in modules:
+        script = STARTUP_SCRIPT.format(module=module, stack=CLIENT_STACK)
+        imports, processes = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                                    check=True, capture_output=True,
+                                    text=True).stdout
+            processes.append(time.perf_counter() - start)
+            elapsed, loaded = json.loads(output)
+            imports.append(elapsed)
+        results[module] = dict(import_ms=min(imports) * 1000,
+                               process_ms=min(processes) * 1000,
+                               client_stack=loaded)
+        print(f'{module:<24}{min(imports) * 1000:11.1f}'
+              f'{min(processes) * 1000:12.1f}  '
+              f'{", ".join(loaded) or "-"}', file=out)
+    return results
+
+
+def measure(fixture, repeat=5, target=0.2):
+    """Times the callable returned by the fixture. Returns the best time per
+    call in nanoseconds, and the number of calls per repetition
+    """
+    timer = timeit.Timer(fixture())
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * target / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number * 1e9, number
+
+
+def run(names=None, repeat=5, target=0.2, out=sys.stdout):
+    """Runs the selected benchmarks (all of them by default) and returns the
+    results as a dictionary ready to be saved as a baseline
+    """
+    results = {}
+    for name, fixture in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        ns, number = measure(fixture, repeat, target)
+        results[name] = dict(ns_per_op=ns, number=number)
+        print(f'{name:<32} {ns:14.1f} ns/op', file=out)
+    return dict(meta=metadata(), results=results)
+
+
+def metadata():
+    return dict(
+        python=platform.python_version(),
+        implementation=platform.python_implementation(),
+        machine=platform.machine(),
+        system=platform.system()
+    )
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=DEF_THRESHOLD):
+    """Compares results against a baseline. Returns a list of
+    (name, baseline ns, current ns, ratio, regressed) tuples
+    """
+    comparison = []
+    for name, result in results['results'].items():
+        previous = baseline['results'].get(name, None)
+        if previous is None:
+            continue
+        ratio = result['ns_per_op'] / previous['ns_per_op']
+        comparison.append((name, previous['ns_per_op'], result['ns_per_op'],
+                           ratio, ratio > 1 + threshold))
+    return comparison
+
+
+def report(comparison, out=sys.stdout):
+    """Prints the comparison and returns whether anything regressed"""
+    regressed = False
+    for name, previous, current, ratio, slower in comparison:
+        flag = 'REGRESSED' if slower else ''
+        print(f'{name:<32} {previous:12.1f} -> {current:12.1f} ns/op '
+              f'({ratio:5.2f}x) {flag}', file=out)
+        regressed = regressed or slower
+    return regressed
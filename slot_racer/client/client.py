@@ -7,9 +7,14 @@
 import asyncio
 import threading
 from ..game import state, Event
+from .handoff import Handoff
 from .renderer import Renderer
 from .socket import start, Socket
-from ..communication import Serializer
+from ..communication import Serializer, ClockSync, backend
+from ..communication.tracing import get_trace, stamp
+
+# global variables
+TRACED = (state.Car.ACCELERATE, state.Car.STOP_ACCELERATING, 'explode')
 
 
 class Client(object):
@@ -19,48 +24,148 @@ class Client(object):
     - id: the ID it has on the track in the server
     - socket: the connection to the server
     - renderer: the Renderer that the client will use to display the game
-                this also contains the track itself
+                this also contains the track itself. It draws on the given
+                display (a window by default) and reports to the given
+                profiler. The on demand profiler, if given, profiles its
+                frames once a profile is requested
     - serializer: converts our data to a format we can use to communicate
+    - handoff: the Handoff passing what the inbox thread receives to the
+          renderer, which alone touches the track
+    - held_update: the (server time, events) of every update taken since the
+          last frame played, merged into one. Only used by the renderer
+    - clock: our estimate of the server's clock, kept in sync for the whole
+          game. Every event timestamp is expressed in server time
+    - sync_interval: time between two clock synchronizations
+    - tracer: the Tracer sampling our events and exporting the remote ones
+          once applied, if tracing is enabled
     - running: boolean representing the state
+    - loop_backend: the event loop implementation the socket runs on
     - my_car: car id of client's car -- used during starting the game
     - car_ids: ids of all cars on the track -- used during starting the game
+    - name: the player's name, sent to the server once it has accepted us so
+          that our results count towards the leaderboard
 
     It is defined by the following behaviours:
     - _run_socket(host, port): Internal function that is spawned on a new
           thread to create a persistent websocket connection to the server
-    - _check_inbox(): Gets message from inbox and handles it
-    - send(subject, data): Serializes and sends message to outbox
-    - join_game(host, port): Spawns a connection to the server and starts the
-          game, once we're done it ends the game
+    - _sync_clock(): Internal coroutine that keeps synchronizing the clock
+          with the server, on the socket's event loop
+    - _check_inbox(): Drains the inbox and handles every message. What
+          changes the track is published to the handoff
+    - apply_inbound(): Applies what was published since the last frame, on
+          the renderer's thread
+    - apply_updates(): Applies the merged updates to the track, once per frame
+    - send(subject, data): Serializes and hands the message to the socket's
+          loop thread
+    - join_game(host, port, spectate): Spawns a connection to the server and
+          starts the game, once we're done it ends the game. A spectator
+          watches the race without a car of its own
     - handle_message(message): Handles incoming message through defined message
           protocols
     -
     """
-    def __init__(self):
+    def __init__(self, loop_backend=None, display=None, profiler=None,
+                 tracer=None, name=None, on_demand=None):
         self.id         = None
         self.socket     = None
-        self.renderer   = Renderer(state.Track(), self)
+        self.renderer   = Renderer(state.Track(), self, display, profiler,
+                                   on_demand)
         self.serializer = Serializer()
+        self.handoff    = Handoff()
+        self.held_update = None
+        self.clock      = ClockSync()
+        self.sync_interval = 1.0
+        self.tracer     = tracer
         self.running    = True
+        self.loop_backend = backend.resolve(loop_backend)
         self.my_car     = None
         self.car_ids    = None
+        self.name       = name
 
     def _run_socket(self):
-        asyncio.set_event_loop(asyncio.new_event_loop())
-        asyncio.get_event_loop().run_until_complete(start(self.socket))
+        backend.set_event_loop(self.loop_backend)
+        asyncio.get_event_loop().run_until_complete(
+            asyncio.gather(start(self.socket), self._sync_clock()))
+
+    async def _sync_clock(self):
+        # The server only reads our messages once it has accepted us, and
+        # spectators are never accepted. Sync quickly at first, then keep the
+        # estimate fresh for the whole game
+        sent = 0
+        while self.running:
+            if self.my_car is not None:
+                self.send('sync', self.clock.now())
+                sent += 1
+            await asyncio.sleep(self.sync_interval if sent >= 8 else 0.05)
 
     def _check_inbox(self):
         while self.running:
-            message = self.serializer.read(self.socket.inbox.get())
-            self.handle_message(message)
+            for message in self.socket.inbox.get_all():
+                if message is None:
+                    return
+                try:
+                    parsed = self.serializer.read(message)
+                except (ValueError, TypeError, IndexError, KeyError) as exc:
+                    print(f'Dropped a message that could not be read: {exc}')
+                    continue
+                self.handle_message(parsed)
+
+    def apply_inbound(self):
+        renderer = self.renderer
+        for _, subject, data in self.handoff.take():
+            if subject == 'update':
+                server_time, events, arrival = data
+
+                # Size the delay remote cars are rendered with from when the
+                # update arrived, in game time
+                if arrival is not None and renderer.start_time is not None:
+                    renderer.playout.add(server_time,
+                                         arrival - renderer.start_time)
+                if self.held_update is None:
+                    self.held_update = (server_time, list(events))
+                else:
+                    self.held_update[1].extend(events)
+                    self.held_update = (server_time, self.held_update[1])
+            elif subject == 'countdown':
+                start_time, my_car, car_ids = data
+                renderer.switch_to_countdown(start_time)
+                for car_id in car_ids:
+                    renderer.track.add_participant(
+                        renderer.cars.acquire(car_id))
+                renderer.local_car = renderer.track.get_car_by_id(my_car)
+            elif subject == 'winner':
+                renderer.set_winner(data)
+            elif subject == 'reset':
+                self.held_update = None
+                renderer.reset()
+
+    def apply_updates(self):
+        update, self.held_update = self.held_update, None
+        if update is not None:
+            self.server_update(update)
 
     def send(self, subject, data=None):
-        message = self.serializer.compose(subject, data)
-        self.socket.outbox.put(message)
+        trace = None
+        if self.tracer is not None and subject in TRACED and \
+                self.clock.synced:
+            trace = self.tracer.start(self.clock.server_now())
+        if trace is None:
+            message = self.serializer.compose(subject, data)
+            self.socket.send(message)
+            return
+
+        # A traced event is composed on the socket's loop, once it is stamped
+        # with the time it is actually sent
+        data = tuple(data) + (trace,)
+
+        def compose():
+            stamp(trace, 'sent', self.clock.server_now())
+            return self.serializer.compose(subject, data)
+        self.socket.send(compose)
 
     # Joins a game specified by host and port, and exits once client is done
-    def join_game(self, host='localhost', port=8765):
-        self.socket   = Socket(host, port)
+    def join_game(self, host='localhost', port=8765, spectate=False):
+        self.socket   = Socket(host, port, '/spectate' if spectate else '')
         socket_thread = threading.Thread(target=self._run_socket, args=[])
         inbox_thread  = threading.Thread(target=self._check_inbox)
 
@@ -70,18 +175,23 @@ class Client(object):
         self.renderer.start()
 
         # After renderer is quit, end game
-        self.running = self.socket.running = False
+        self.running = False
+        self.socket.stop()
         inbox_thread.join()
         socket_thread.join()
+        if self.tracer is not None:
+            self.tracer.close()
 
     # handler for all incoming messages
     def handle_message(self, message):
         subjects = dict(
             ping=self.ping,
+            sync=self.sync,
             cars=self.cars,
             begin_countdown=self.begin_countdown,
-            update=self.server_update,
-            winner=self.winner
+            update=self.queue_update,
+            winner=self.winner,
+            reset=self.reset
         )
         handler = subjects.get(message.subject, None)
         if handler is None:
@@ -92,44 +202,104 @@ class Client(object):
     # Messaging Protocol ------------------------------------------------------
     def ping(self, data):
         """Used for syncing times with the server"""
-        self.socket.outbox.put(self.serializer.compose('pong', None))
+        self.send('pong')
+
+    def sync(self, data):
+        """Receives the server's timestamps for one of our sync requests"""
+        t3 = self.clock.now()
+        t0, t1, t2 = data
+        self.clock.add_sample(t0, t1, t2, t3)
 
     def cars(self, data):
-        """Receives updates from server on number of cars in track"""
+        """Receives updates from server on number of cars in track. The
+        first one means the server accepted us, so it is told our name
+        """
+        if self.my_car is None and data[0] is not None and \
+                self.name is not None:
+            self.send('name', self.name)
         self.my_car, self.car_ids = data
         self.id = self.my_car
         print(f'Got new car list!\nMy id: {self.my_car}\nList: {self.car_ids}')
 
-    def begin_countdown(self, time):
-        """Starts countdown before game"""
-        self.renderer.switch_to_countdown(time)
+    def begin_countdown(self, data):
+        """Starts countdown before game. The start time is on the server's
+        clock; until the client has synchronized with it, the clock is aligned
+        from the latency-compensated number of seconds
+        """
+        seconds, start_time = data
+        if start_time is None:
+            start_time = self.clock.server_now() + seconds
+        else:
+            self.clock.seed(start_time - seconds)
+        self.handoff.publish('countdown',
+                             (start_time, self.my_car, list(self.car_ids)))
         for car_id in self.car_ids:
-            self.renderer.track.add_participant(state.Car(car_id))
-
             print(f"ADDING {car_id}. Self: {self.id}")
-        self.renderer.local_car = self.renderer.track.get_car_by_id(self.id)
-        print(f'Begin countdown! {time}')
+        print(f'Begin countdown! {seconds}')
+
+    def queue_update(self, data):
+        """Receives update from server on state and events. The renderer
+        merges consecutive updates, so that bursts are applied to the track in
+        one go on the next frame
+        """
+        server_time, events = data
+        if self.tracer is not None:
+            now = self.clock.server_now()
+            for _, (_, event_data) in events:
+                trace = get_trace(event_data)
+                if trace is not None:
+                    stamp(trace, 'client_received', now)
+
+        # Stamp when the update arrived, on the server's clock
+        arrival = self.clock.server_now() if self.clock.synced else None
+        self.handoff.publish('update', (server_time, events, arrival))
 
     def server_update(self, data):
-        """Receives update from server on state and events"""
+        """Applies an update from server on state and events, and feeds the
+        interpolation buffers of the remote cars
+        """
         server_time, events = data
-        if len(events) > 0:
-            events = [(car_id, event) for car_id, event in events
-                      if car_id != self.id]
-            if len(events) > 0:
-                car_id, event = events[0]
-                car = self.renderer.track.get_car_by_id(car_id)
-                events_to_insert = []
-                for car_id, event in events:
-                    event_type, data = event
-                    timestamp, speed, distance = data
-                    e = Event(event_type, timestamp, speed, distance)
-                    events_to_insert.append(e)
+        events_by_car = {}
+        for car_id, (event_type, event_data) in events:
+            # The server found the car collided with another. Our own car falls
+            # right away, a remote car explodes like it would have by itself
+            if event_type == 'collide' and car_id == self.id and \
+                    self.renderer.local_car is not None:
+                timestamp, _, distance = event_data[:3]
+                self.renderer.local_car.collide(distance, timestamp)
+            elif car_id != self.id:
+                timestamp, speed, distance = event_data[:3]
+                if event_type == 'collide':
+                    event_type = 'explode'
+                events_by_car.setdefault(car_id, []).append(
+                    Event(event_type, timestamp, speed, distance))
+                trace = get_trace(event_data)
+                if trace is not None and self.tracer is not None:
+                    stamp(trace, 'applied', self.clock.server_now())
+                    self.tracer.export(trace, car=car_id, subject=event_type,
+                                       receiver=self.id)
 
+        for car_id, events_to_insert in events_by_car.items():
+            car = self.renderer.track.get_car_by_id(car_id)
+            if car is not None:
                 car.append_events(events_to_insert, self.renderer.gametime)
 
+        # Sample every remote car at the time of the update. Samples taken
+        # after the new events happened are taken again
+        for car in self.renderer.track.participants:
+            if car.id != self.id:
+                new_events = events_by_car.get(car.id, ())
+                since = min((event.timestamp for event in new_events),
+                            default=None)
+                self.renderer.interpolation(car.id).add(car, server_time,
+                                                        since)
+
     def winner(self, data):
         """Declares the winner"""
-        self.renderer.set_winner(data)
-
+        self.handoff.publish('winner', data)
 
+    def reset(self, data):
+        """The race is over and the server is back in the lobby. Updates
+        still waiting are dropped, and the renderer resets on its next frame
+        """
+        self.handoff.publish('reset', None)
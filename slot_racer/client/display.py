@@ -0,0 +1,121 @@
+# Module to choose what the Renderer draws on
+#
+# The pyxel display is the pyxel module itself, imported only when a window is
+# actually opened. The headless display runs every frame's update and draw
+# without drawing anything, so the client's per-frame work can be run, tested
+# and profiled without a window.
+
+# package imports
+import time
+
+# global variables
+PYXEL    = 'pyxel'
+HEADLESS = 'headless'
+DISPLAYS = (PYXEL, HEADLESS)
+
+# pyxel uses glfw's key codes
+KEY_SPACE         = 32
+KEY_RIGHT         = 262
+KEY_LEFT          = 263
+MOUSE_LEFT_BUTTON = 2000
+
+
+class HeadlessImage(object):
+    """Stands in for a pyxel image bank. Nothing is kept"""
+    def load(self, x, y, filename):
+        pass
+
+    def set(self, x, y, data):
+        pass
+
+
+class HeadlessDisplay(object):
+    """HeadlessDisplay mimics the parts of pyxel the Renderer uses, minus the
+    window
+
+    It is defined by the following attributes:
+    - frames: the number of frames to run for, forever if None
+    - realtime: whether frames are paced at the display's fps, or run back to
+          back
+    - script: called before every frame, to drive the input
+    - frame_count: the number of frames run so far
+    - pressed: the keys currently held down
+
+    And the following behaviours:
+    - press(key)/release(key): Holds a key down or lets it go
+    - run(update, draw): Runs frames until quit or out of frames
+    - quit(): Stops running frames
+    """
+    def __init__(self, frames=None, realtime=True, script=None):
+        self.frames      = frames
+        self.realtime    = realtime
+        self.script      = script
+        self.fps         = 30
+        self.width       = 0
+        self.height      = 0
+        self.frame_count = 0
+        self.running     = False
+        self.mouse_x     = 0
+        self.mouse_y     = 0
+        self.pressed     = set()
+        self.previous    = set()
+        self.images      = {}
+
+    def init(self, width, height, fps=30, **kwargs):
+        self.width, self.height, self.fps = width, height, fps
+
+    def mouse(self, visible):
+        pass
+
+    def image(self, img):
+        if img not in self.images:
+            self.images[img] = HeadlessImage()
+        return self.images[img]
+
+    def draw(self, *args, **kwargs):
+        pass
+
+    cls = rect = circ = text = blt = draw
+
+    def press(self, key):
+        self.pressed.add(key)
+
+    def release(self, key):
+        self.pressed.discard(key)
+
+    def btn(self, key):
+        return key in self.pressed
+
+    def btnp(self, key):
+        return key in self.pressed and key not in self.previous
+
+    def quit(self):
+        self.running = False
+
+    def run(self, update, draw):
+        self.running = True
+        frame_time = 1 / self.fps
+        while self.running and (self.frames is None or
+                                self.frame_count < self.frames):
+            start = time.monotonic()
+            if self.script is not None:
+                self.script()
+            update()
+            draw()
+            self.previous = set(self.pressed)
+            self.frame_count += 1
+            if self.realtime:
+                time.sleep(max(frame_time - (time.monotonic() - start), 0))
+
+
+def new_display(name=PYXEL, **kwargs):
+    """Creates the display the Renderer draws on. The arguments are passed to
+    the headless display
+    """
+    if name not in DISPLAYS:
+        raise ValueError(f'Unknown display: {name}. '
+                         f'Choose from {", ".join(DISPLAYS)}')
+    if name == HEADLESS:
+        return HeadlessDisplay(**kwargs)
+    import pyxel
+    return pyxel
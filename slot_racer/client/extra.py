@@ -6,35 +6,46 @@
 
 # package imports
 import threading
+from collections import deque
 
 
 class Queue(object):
-    """Implementation of a threadsafe asyncio.Queue()
+    """Implementation of a threadsafe, unbounded queue that can be drained in
+    one go
 
     It is defined by the following attributes:
-    - queue: The asyncio.Queue()
-    - mutex: A lock to protect the queue
+    - queue: The items waiting to be read, oldest first
+    - ready: A condition to wait for items and protect the queue
     """
     def __init__(self):
-        self.count = threading.Semaphore(0)
-        self.queue = []
-        self.mutex = threading.Lock()
+        self.queue = deque()
+        self.ready = threading.Condition(threading.Lock())
 
     def put(self, item):
         """Since the queue is not capped at a size limit, it is always going
         to complete immediately. This is the reason we make this non-async.
         """
-        with self.mutex:
+        with self.ready:
             self.queue.append(item)
-            self.count.release()
+            self.ready.notify()
 
     def get(self):
         """The queue can be empty at various points in execution. At such a
         situation, we don't want to block the code. We simply want to only
         try to access the queue when we know we can get a proper result.
         """
-        self.count.acquire()
-        with self.mutex:
-            return self.queue.pop(0)
-
-
+        with self.ready:
+            while not self.queue:
+                self.ready.wait()
+            return self.queue.popleft()
+
+    def get_all(self, block=True):
+        """Returns every item in the queue at once, oldest first. If block is
+        set, waits until there is at least one
+        """
+        with self.ready:
+            while block and not self.queue:
+                self.ready.wait()
+            items = list(self.queue)
+            self.queue.clear()
+            return items
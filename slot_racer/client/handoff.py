@@ -0,0 +1,68 @@
+# Module to hand what the client receives over to the renderer, without locks
+#
+# The client reads the server's messages on its inbox thread, but the track is
+# only ever touched by the renderer, on the main thread. Every message that
+# changes the track (an update, the countdown, the winner, a reset) is handed
+# over through a Handoff as a batch.
+#
+# The batches form a linked list. The inbox thread builds a new Batch in full,
+# then publishes it by linking it after the last one, which is a single
+# reference swap and so atomic. The renderer keeps the last batch it took and
+# follows the links from there once per frame. Each side only writes its own
+# attributes (the inbox thread the links and the last batch, the renderer the
+# batch it took), so neither ever waits on the other. Publishing never copies
+# the batches the renderer has not taken yet, however many there are, and the
+# batches it took are freed as soon as it moves past them.
+
+
+class Batch(object):
+    """Batch is one message handed over, linked to the one after it
+
+    It is defined by the following attributes:
+    - version: the number of batches published up to this one
+    - subject/data: what was handed over
+    - next: the Batch published after this one, None until there is one.
+          Only written by the producer, once
+    """
+    __slots__ = ('version', 'subject', 'data', 'next')
+
+    def __init__(self, version=0, subject=None, data=None):
+        self.version = version
+        self.subject = subject
+        self.data    = data
+        self.next    = None
+
+
+class Handoff(object):
+    """Handoff passes batches from one producer thread to one consumer thread
+
+    It is defined by the following attributes:
+    - last: the last published Batch, only used by the producer
+    - taken: the last Batch the consumer took, only used by the consumer.
+          Both start at the same empty Batch
+
+    And the following behaviours:
+    - publish(subject, data): Links a new batch after the last one. Only
+          called by the producer
+    - take(): Returns the (version, subject, data) batches published since
+          the last call, oldest first. Only called by the consumer
+    """
+    def __init__(self):
+        self.last  = Batch()
+        self.taken = self.last
+
+    def publish(self, subject, data):
+        last = self.last
+        batch = Batch(last.version + 1, subject, data)
+        last.next = batch
+        self.last = batch
+
+    def take(self):
+        batch = self.taken.next
+        if batch is None:
+            return ()
+        batches = []
+        while batch is not None:
+            batches.append((batch.version, batch.subject, batch.data))
+            self.taken, batch = batch, batch.next
+        return batches
@@ -0,0 +1,114 @@
+# Module to render remote cars smoothly, as late as the network requires
+#
+# Every update from the server is stamped with the server's game time. On each
+# one, the state of every remote car at that time is sampled into its
+# InterpolationBuffer, and the renderer interpolates between the two samples
+# around the time it draws. How far in the past that is comes from the
+# PlayoutDelay, which watches how late the updates actually arrive.
+
+# package imports
+from collections import deque
+from ..game import state
+from ..communication import (TICK_TIME, DEF_REMOTE_DELAY, MIN_REMOTE_DELAY,
+                             MAX_REMOTE_DELAY)
+
+
+class PlayoutDelay(object):
+    """PlayoutDelay sizes how far in the past remote cars are rendered
+
+    An update is late by the time it takes to travel to us. A remote event is
+    also late by the time it took to reach the server, which we estimate as
+    our own one-way trip. On top of that, the next sample can be up to a tick
+    away, and the delay leaves room for a few times the arrival jitter.
+
+    It is defined by the following attributes:
+    - lateness: the last few delays between an update being sent and it
+          being received, in server time
+    - jitter: the smoothed variation of that delay (as in RFC 3550)
+    - margin: how many times the jitter to leave room for
+
+    And the following behaviours:
+    - add(server_time, arrival): Records the arrival of one update
+    - delay(upstream, tick_time): The playout delay for remote cars
+    """
+    def __init__(self, window=64, margin=3.0):
+        self.lateness = deque(maxlen=window)
+        self.jitter   = 0.0
+        self.margin   = margin
+
+    def add(self, server_time, arrival):
+        lateness = arrival - server_time
+        if self.lateness:
+            variation = abs(lateness - self.lateness[-1])
+            self.jitter += (variation - self.jitter) / 16
+        self.lateness.append(lateness)
+
+    def delay(self, upstream=0.0, tick_time=TICK_TIME):
+        if not self.lateness:
+            return DEF_REMOTE_DELAY
+        lateness = sum(self.lateness) / len(self.lateness)
+        delay = max(lateness, 0.0) + upstream + tick_time + \
+            self.margin * self.jitter
+        return min(max(delay, MIN_REMOTE_DELAY), MAX_REMOTE_DELAY)
+
+
+class InterpolationBuffer(object):
+    """InterpolationBuffer holds the recent states of one remote car
+
+    It is defined by the following attributes:
+    - samples: the last (gametime, speed, distance, fallen) states of the car
+    - view: the car handed to the renderer, reused from frame to frame
+
+    And the following behaviours:
+    - add(car, gametime, since): Samples the car at gametime. Samples after
+          since are taken again, since events older than them just arrived
+    - car_at(car, gametime): The car as it should be drawn at gametime.
+          Outside of the samples, the car is rebuilt from its events instead
+    """
+    def __init__(self, capacity=32):
+        self.samples = deque(maxlen=capacity)
+        self.view    = None
+
+    def add(self, car, gametime, since=None):
+        if since is not None:
+            self.samples = deque(
+                (self.sample(car, sample[0]) if sample[0] >= since else sample
+                 for sample in self.samples),
+                maxlen=self.samples.maxlen
+            )
+        if self.samples and gametime <= self.samples[-1][0]:
+            return
+        self.samples.append(self.sample(car, gametime))
+
+    @staticmethod
+    def sample(car, gametime):
+        past = car.get_past_car(gametime)
+        return gametime, past.speed, past.distance, past.fallen
+
+    def car_at(self, car, gametime):
+        samples = self.samples
+        if len(samples) < 2 or not samples[0][0] <= gametime < samples[-1][0]:
+            return car.get_past_car(gametime)
+
+        # Find the samples on either side of gametime, newest first since
+        # that is where the renderer reads
+        index = len(samples) - 1
+        while samples[index - 1][0] > gametime:
+            index -= 1
+        t0, speed0, distance0, fallen0 = samples[index - 1]
+        t1, speed1, distance1, _ = samples[index]
+
+        if self.view is None or self.view.id != car.id:
+            self.view = state.Car(car.id, car.model)
+        view = self.view
+
+        # A fallen car stays where it fell until it is back on the track
+        if fallen0 is not None and gametime <= fallen0.explosion_end:
+            view.speed, view.distance, view.fallen = 0, distance0, fallen0
+            return view
+
+        alpha = (gametime - t0) / (t1 - t0)
+        view.speed    = speed0 + (speed1 - speed0) * alpha
+        view.distance = distance0 + (distance1 - distance0) * alpha
+        view.fallen   = None
+        return view
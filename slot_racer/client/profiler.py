@@ -0,0 +1,114 @@
+# Module to see where the client's frame budget goes
+#
+# The Renderer marks the end of each phase of a frame with lap(phase), and the
+# time since the previous mark is added to that phase. A frame starts with
+# begin() in update and is recorded with end() once it has been drawn.
+
+# package imports
+import time
+from collections import deque
+
+# global variables
+PHASES = ('input', 'simulation', 'rewind', 'trail', 'draw')
+
+
+class FrameProfiler(object):
+    """FrameProfiler splits every frame into its phases
+
+    - input: reading the keys and sending the local car's events
+    - simulation: applying the server's updates and updating the track
+    - rewind: finding where the remote cars are to be drawn
+    - trail: drawing the trails
+    - draw: drawing everything else
+
+    It is defined by the following attributes:
+    - budget: the time a frame may take at the target fps
+    - frames: the phase times of the last few frames
+    - overlay: whether the renderer draws the profile on screen
+
+    And the following behaviours:
+    - begin(): Starts a frame
+    - lap(phase): Adds the time since the last mark to the phase
+    - resume(): Starts timing again without counting the time since the last
+          mark, e.g. between update and draw
+    - end(): Records the frame
+    - stats(): The mean, 95th percentile and worst time of every phase
+    - report(): The stats, formatted
+    """
+    def __init__(self, fps=30, window=300, overlay=False):
+        self.budget  = 1 / fps
+        self.frames  = deque(maxlen=window)
+        self.overlay = overlay
+        self.current = None
+        self.last    = None
+
+    def begin(self):
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.last    = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        if self.current is not None:
+            self.current[phase] += now - self.last
+        self.last = now
+
+    def resume(self):
+        self.last = time.perf_counter()
+
+    def end(self):
+        if self.current is not None:
+            self.frames.append(self.current)
+        self.current = None
+
+    def stats(self, frames=None):
+        """Returns {phase: (mean, p95, max)} in seconds, 'total' included"""
+        frames = list(self.frames)[-frames:] if frames else list(self.frames)
+        if not frames:
+            return {}
+        stats = {}
+        for phase in PHASES + ('total',):
+            if phase == 'total':
+                times = sorted(sum(frame.values()) for frame in frames)
+            else:
+                times = sorted(frame[phase] for frame in frames)
+            p95 = times[min(int(len(times) * 0.95), len(times) - 1)]
+            stats[phase] = (sum(times) / len(times), p95, times[-1])
+        return stats
+
+    def report(self):
+        stats = self.stats()
+        if not stats:
+            return 'No frames profiled'
+        lines = [f'{len(self.frames)} frames, '
+                 f'{self.budget * 1000:.1f} ms budget',
+                 f'{"phase":<12}{"mean":>10}{"p95":>10}{"max":>10}']
+        for phase, (mean, p95, worst) in stats.items():
+            lines.append(f'{phase:<12}{mean * 1000:8.3f}ms{p95 * 1000:8.3f}ms'
+                         f'{worst * 1000:8.3f}ms')
+        mean = stats['total'][0]
+        lines.append(f'{mean / self.budget:.1%} of the frame budget used')
+        return '\n'.join(lines)
+
+    def overlay_lines(self, frames=30):
+        """Short lines for the on-screen overlay, averaged over the last few
+        frames
+        """
+        return [f'{phase[:5]:<6}{mean * 1000:6.2f}ms'
+                for phase, (mean, _, _) in self.stats(frames).items()]
+
+
+class NullProfiler(object):
+    """Stands in for the FrameProfiler when nothing is profiled"""
+    overlay = False
+
+    def begin(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def resume(self):
+        pass
+
+    def end(self):
+        pass
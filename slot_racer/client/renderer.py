@@ -1,17 +1,63 @@
-import pyxel
+import os
 import math
 from enum import Enum
-from datetime import datetime, timedelta
 
-import glfw
-
-from ..game import state, physics
+from ..game import state, physics, FallData, Pool
+from ..communication import TICK_TIME, DEF_REMOTE_DELAY
+from .interpolation import PlayoutDelay, InterpolationBuffer
+from .display import new_display, KEY_SPACE, MOUSE_LEFT_BUTTON
+from .profiler import NullProfiler
 
 # Define the width and height of the screen
 # This makes for a nice 16x9 screen
 WIDTH = 256
 HEIGHT = 144
 
+# The explosion frames are packed side by side into one image bank when the
+# renderer starts, so that drawing a frame is a single blit
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+EXPLOSION_BANK = 0
+
+
+def explosion_atlas(sizes):
+    """Returns the (u, v, w, h) rectangle of every explosion frame in the
+    image bank, given the (w, h) sizes of the frames
+    """
+    frames, u = [], 0
+    for w, h in sizes:
+        frames.append((u, 0, w, h))
+        u += w
+    return tuple(frames)
+
+
+EXPLOSION_FRAMES = explosion_atlas(FallData.img_sizes)
+
+# The track never changes, so it is rasterized once into its own image bank
+# and blitted as a whole on every frame
+TRACK_BANK = 1
+BACKGROUND_COLOR = 7
+TRACK_COLORS = (3, 4)
+
+
+def rasterize_track(track, width=WIDTH, height=HEIGHT):
+    """Rasterizes the track into rows of hex color digits, ready for an image
+    bank. The lanes are painted in layers so that lane 0 passes under lane 1
+    at the first crossing and over it at the second
+    """
+    pixels = [[BACKGROUND_COLOR] * width for _ in range(height)]
+    layers = (
+        (track.track_0_points[:300], TRACK_COLORS[0]),
+        (track.track_1_points[:300], TRACK_COLORS[1]),
+        (track.track_1_points[300:], TRACK_COLORS[1]),
+        (track.track_0_points[300:], TRACK_COLORS[0])
+    )
+    for points, color in layers:
+        for (x, y) in points:
+            x, y = int(x + 128), int(72 - y)
+            if 0 <= x < width and 0 <= y < height:
+                pixels[y][x] = color
+    return [''.join(f'{color:x}' for color in row) for row in pixels]
+
 class Button(object):
     """Simple button for Pyxel. Draws a rectangular button with the given text.
 
@@ -34,25 +80,25 @@ class Button(object):
         self.text_color       = text_color
         self.on_press         = None
 
-    def render(self):
-        """Render the button and check if the button was pressed. If the
-        button has been pressed, run the callback
+    def render(self, display):
+        """Render the button on the display and check if the button was
+        pressed. If the button has been pressed, run the callback
 
         """
-        pyxel.rect(
+        display.rect(
             self.x,
             self.y,
             self.x + self.w,
             self.y + self.h,
             self.background_color
         )
-        pyxel.text(self.x + 7, self.y + 5, self.text, self.text_color)
+        display.text(self.x + 7, self.y + 5, self.text, self.text_color)
 
         # Check if the button is pressed
-        x_in_bounds = self.x < pyxel.mouse_x < self.x + self.w
-        y_in_bounds = self.y < pyxel.mouse_y < self.y + self.h
+        x_in_bounds = self.x < display.mouse_x < self.x + self.w
+        y_in_bounds = self.y < display.mouse_y < self.y + self.h
         if self.on_press is not None:
-            if pyxel.btn(2000) and x_in_bounds and y_in_bounds:
+            if display.btn(MOUSE_LEFT_BUTTON) and x_in_bounds and y_in_bounds:
                 self.on_press()
 
     def set_on_press(self, on_press):
@@ -76,81 +122,174 @@ class Renderer(object):
     - stored_trail: an array of points of previous car locations
     - local_car: the car object that is being played by the local player
     - winner: the id of the winning car, if available
-    - start_time: the absolute start time of the game relative to this client
-    - prev_time: the absolute time of the last frame
+    - start_time: the start time of the game on the server's clock
+    - prev_time: the server time of the last frame
     - dt: the timestep between the current frame and the last frame
     - gametime: the running time of the game
+    - remote_delay: how far in the past remote cars are rendered, sized from
+          how late the updates arrive (or the round trip to the server until
+          they do)
+    - playout: the PlayoutDelay that watches the updates arrive
+    - buffers: the InterpolationBuffer of every remote car, by id
+    - track_baked: whether the track has been rasterized into its image bank
     - play_button: the button that users can click to play the game
     - quit_button: a button to quit the game
+    - display: what the game is drawn on, pyxel's window by default
+    - profiler: times the phases of every frame, if given
+    - on_demand: the OnDemandProfiler profiling update and draw once a
+          profile is requested, if given
+    - cars: the Pool the cars of a race are taken from, and given back to
+          once the race is reset
     """
 
-    def __init__(self, track, client):
+    def __init__(self, track, client, display=None, profiler=None,
+                 on_demand=None):
         self.track = track
         self.client = client
         self.stored_trail = []
         self.local_car = None
         self.render_state = RenderState.MENU
         self.winner = None
+        self.cars = Pool(state.Car)
 
         # Time-specific variables
         self.start_time = None
         self.prev_time = None
         self.dt = 0.0
         self.gametime = 0.0
+        self.remote_delay = DEF_REMOTE_DELAY
+        self.playout = PlayoutDelay()
+        self.buffers = {}
+        self.track_baked = False
+        self.display = new_display() if display is None else display
+        self.profiler = NullProfiler() if profiler is None else profiler
+        self.on_demand = on_demand
 
         # Setup buttons
         self.play_button = Button('Play', 60, 100, 30, 15, 4, 9)
         self.quit_button = Button('Quit', 170, 100, 30, 15, 4, 9)
         self.play_button.set_on_press(lambda: self.client.send('start_game'))
-        self.quit_button.set_on_press(lambda: pyxel.quit())
+        self.quit_button.set_on_press(lambda: self.display.quit())
 
-        # Initialize pyxel
+        # Initialize the display
         # The width is actually 255 because max pyxel width  is 255,
         # but we will assume it is 256
-        pyxel.init(WIDTH - 1 , HEIGHT, fps=30)
-        pyxel.mouse(True)  # Use the mouse
+        self.display.init(WIDTH - 1 , HEIGHT, fps=30)
+        self.display.mouse(True)  # Use the mouse
+        self.load_explosion()
+
+    def load_explosion(self):
+        """Load every explosion frame into its place in the image bank"""
+        for step, (u, v, _, _) in enumerate(EXPLOSION_FRAMES):
+            self.display.image(EXPLOSION_BANK).load(
+                u,
+                v,
+                os.path.join(ASSETS_DIR, f'explosion-{step}.png')
+            )
+
+    def interpolation(self, car_id):
+        """Get the interpolation buffer of a remote car"""
+        if car_id not in self.buffers:
+            self.buffers[car_id] = InterpolationBuffer()
+        return self.buffers[car_id]
+
+    def bake_track(self):
+        """Rasterize the track into its image bank, once"""
+        self.display.image(TRACK_BANK).set(0, 0, rasterize_track(self.track))
+        self.track_baked = True
 
     def set_winner(self, winner):
         """Set the winner of the game to the id of the winning car"""
         self.winner = winner
 
-    def switch_to_countdown(self, seconds):
-        """Switch the renderer to the countdown"""
+    def switch_to_countdown(self, start_time):
+        """Switch the renderer to the countdown, until the start time on the
+        server's clock
+        """
         self.render_state = RenderState.COUNTDOWN
-        self.synchronized_start = datetime.now() + timedelta(seconds=seconds)
+        self.start_time = start_time
+
+    def update_remote_delay(self):
+        """Size the playout delay from how late the updates arrive, plus our
+        one-way trip for the remote events to have reached the server
+        """
+        clock = self.client.clock
+        if self.playout.lateness:
+            upstream = clock.rtt / 2 if clock.rtt is not None else 0.0
+            self.remote_delay = self.playout.delay(upstream, TICK_TIME)
+        else:
+            self.remote_delay = clock.remote_delay(TICK_TIME)
 
     def switch_to_play(self):
         self.render_state = RenderState.PLAY
 
+    def reset(self):
+        """Go back to the menu once the race is over. The cars go back to
+        the pool, the track stays baked for the next race
+        """
+        for car in self.track.reset():
+            self.cars.release(car)
+        self.local_car = None
+        self.winner = None
+        self.render_state = RenderState.MENU
+        self.start_time = None
+        self.prev_time = None
+        self.dt = 0.0
+        self.gametime = 0.0
+        self.buffers.clear()
+        self.stored_trail.clear()
+
     def start(self):
         """Start the renderer given the update and draw methods"""
-        pyxel.run(self.update, self.draw)
+        if self.on_demand is None:
+            self.display.run(self.update, self.draw)
+        else:
+            self.display.run(self.on_demand.wrap(self.update),
+                             self.on_demand.wrap(self.draw))
 
     def update(self):
         """Update the positions of the cars on the track and check if the local
         should accelerate or stop accelerating.
         """
+        profiler = self.profiler
+        profiler.begin()
+
         # Ensure the renderer state is set
         if not isinstance(self.render_state, RenderState):
             self.render_state = RenderState.MENU
 
+        # Apply what the server sent since the last frame: a countdown, the
+        # winner, a reset, the updates to play
+        self.client.apply_inbound()
+
         # Countdown
         if self.render_state is RenderState.COUNTDOWN:
-            if datetime.now() > self.synchronized_start:
+            if self.client.clock.server_now() > self.start_time:
                 self.switch_to_play()
         # Play
         elif self.render_state is RenderState.PLAY:
-            now = datetime.now()
-            if self.start_time is None:
-                self.start_time, self.prev_time = now, now
+            # Apply everything the server sent since the last frame at once
+            self.client.apply_updates()
+            profiler.lap('simulation')
+
+            now = self.client.clock.server_now()
+            if self.prev_time is None:
+                self.prev_time = now
 
             # Run time calculations to get gametime
             self.dt = now - self.prev_time
             self.prev_time = now
-            self.gametime = (now - self.start_time).total_seconds()
+            self.gametime = now - self.start_time
+            self.update_remote_delay()
+
+            # Spectators have no car to drive, only the track to update
+            if self.local_car is None:
+                self.track.update_all(self.gametime)
+                profiler.lap('simulation')
+                return
 
             # Get helper bools for acceleration check
-            space_down = pyxel.btn(glfw.KEY_SPACE)
+            space_down = self.display.btn(KEY_SPACE)
             accelerating = self.local_car.is_accelerating
 
             # If the car is fallen, check if the explode event needs to be
@@ -176,69 +315,76 @@ class Renderer(object):
                         'stop_accelerating',
                         (self.gametime, event.speed, event.distance)
                     )
+            profiler.lap('input')
 
             # Update the track using the delta
             self.track.update_all(self.gametime)
+            profiler.lap('simulation')
 
     def draw(self):
         """Draw the screen! Using the renderer state, draw the state of the
         game, the cars, and the text
         """
+        profiler = self.profiler
+        profiler.resume()
+
         # Clear screen, set background to off-white
-        pyxel.cls(7)
+        self.display.cls(7)
 
         if self.render_state is RenderState.MENU:
-            pyxel.text(110, 10, 'SLOT RACER', 0)
-            self.play_button.render()
-            self.quit_button.render()
+            self.display.text(110, 10, 'SLOT RACER', 0)
+            self.play_button.render(self.display)
+            self.quit_button.render(self.display)
 
         elif self.render_state is RenderState.COUNTDOWN:
-            time = (self.synchronized_start - datetime.now()).total_seconds()
-            pyxel.text(30, 30, f'Get Ready! {str(int(time + 1))}', 0)
+            time = self.start_time - self.client.clock.server_now()
+            self.display.text(30, 30, f'Get Ready! {str(int(time + 1))}', 0)
 
         elif self.render_state is RenderState.PLAY:
-            # Render the track - it is precalculated in the track object
-            for (x, y) in self.track.track_0_points[:300]:
-                pyxel.rect(x + 128, 72 - y, x + 128, 72 - y, 3)
-            for (x, y) in self.track.track_1_points[:300]:
-                pyxel.rect(x + 128, 72 - y, x + 128, 72 - y, 4)
-            for (x, y) in self.track.track_1_points[300:]:
-                pyxel.rect(x + 128, 72 - y, x + 128, 72 - y, 4)
-            for (x, y) in self.track.track_0_points[300:]:
-                pyxel.rect(x + 128, 72 - y, x + 128, 72 - y, 3)
+            # Render the track - it is baked into its image bank when the race
+            # starts, and drawn in a single blit from then on
+            if not self.track_baked:
+                self.bake_track()
+            self.display.blt(0, 0, TRACK_BANK, 0, 0, WIDTH, HEIGHT)
 
             # Render the help text in the upper-right of the screen
-            pyxel.text(110, 10, 'GO GO GO!', 0)
-            pyxel.text(160, 5, 'Press SPACE to', 0)
-            pyxel.text(160, 11, 'accelerate. Don\'t', 0)
-            pyxel.text(160, 17, 'go too fast, or KABOOM!', 0)
+            self.display.text(110, 10, 'GO GO GO!', 0)
+            self.display.text(160, 5, 'Press SPACE to', 0)
+            self.display.text(160, 11, 'accelerate. Don\'t', 0)
+            self.display.text(160, 17, 'go too fast, or KABOOM!', 0)
+
+            profiler.lap('draw')
 
             # Render the trails for the cars, capping it at 20 points total
             self.stored_trail = self.stored_trail[-20:]
             for (x, y) in self.stored_trail:
-                pyxel.circ(x, y, 1, 5)
+                self.display.circ(x, y, 1, 5)
+            profiler.lap('trail')
 
             # Enumerate through and render the cars
             for index, car in enumerate(self.track.participants):
                 gametime = self.gametime
                 color = 9
 
-                # If the car is a remote car, render it 100 ms in the past
+                # If the car is a remote car, render it in the past so that its
+                # events have had the time to reach us, between the states
+                # sampled from the server's updates
                 if self.client.id != index:
-                    gametime = self.gametime - 0.1
-                    car = car.get_past_car(gametime)
+                    gametime = self.gametime - self.remote_delay
+                    car = self.interpolation(car.id).car_at(car, gametime)
                     color = 11
+                profiler.lap('rewind')
 
                 # Get the car's position and render it
                 # Update the x and y for a new coordinate system
                 x, y = car.get_posn()
                 x = x + 128
                 y = 72 - y
-                pyxel.circ(x, y, 2, color)
+                self.display.circ(x, y, 2, color)
 
                 # Render the lap number
                 lap = math.floor(car.distance) + 1
-                pyxel.text(10, 10 * (index + 1), f'{lap}', 0)
+                self.display.text(10, 10 * (index + 1), f'{lap}', 0)
 
                 # Add the car's position to the trail
                 self.stored_trail.append((x, y))
@@ -247,18 +393,34 @@ class Renderer(object):
                 if car.fallen:
                     self.explode(x, y, car, gametime)
                     car.speed = 0
+                profiler.lap('draw')
 
             # Render the "winner" text
             if self.winner is None:
-                pyxel.text(98, 120, 'First to 10 wins!', 0)
+                self.display.text(98, 120, 'First to 10 wins!', 0)
+            elif self.local_car is None:
+                self.display.text(106, 120, f'Car {self.winner} wins!', 0)
             else:
                 if self.winner == self.local_car.id:
-                    pyxel.text(110, 120, 'YOU WIN!!!!', 0)
+                    self.display.text(110, 120, 'YOU WIN!!!!', 0)
                 else:
-                    pyxel.text(110, 120, 'You lose :(', 0)
+                    self.display.text(110, 120, 'You lose :(', 0)
 
-    @staticmethod
-    def explode(x, y, car, gametime):
+        profiler.lap('draw')
+        if profiler.overlay:
+            self.draw_profile()
+        profiler.end()
+
+    def draw_profile(self):
+        """Render the time each phase of the last frames took, in the
+        lower-left of the screen
+        """
+        lines = self.profiler.overlay_lines()
+        top = HEIGHT - 6 * len(lines) - 2
+        for index, line in enumerate(lines):
+            self.display.text(4, top + 6 * index, line, 0)
+
+    def explode(self, x, y, car, gametime):
         """Render a car explosion! Use provided images and the derived frame"""
         # Find the time of the explosion
         explosion_time = 1 - (car.fallen.explosion_end - gametime)
@@ -266,12 +428,7 @@ class Renderer(object):
 
         # Get the step of the explosion to render
         step = int(explosion_time * 16)
-        w, h = car.fallen.img_sizes[step]
+        u, v, w, h = EXPLOSION_FRAMES[step]
 
-        # Render the explosion image
-        pyxel.image(0).load(
-            0,
-            0,
-            f'slot_racer/client/assets/explosion-{step}.png'
-        )
-        pyxel.blt(x - (w / 2), y - (h / 2), 0, 0, 0, w, h)
+        # Render the explosion frame from the preloaded image bank
+        self.display.blt(x - (w / 2), y - (h / 2), EXPLOSION_BANK, u, v, w, h)
@@ -0,0 +1,63 @@
+# Module to watch a recorded race through the Renderer
+
+# package imports
+import time
+from .renderer import Renderer, RenderState
+from .display import KEY_LEFT, KEY_RIGHT
+from ..replay import RaceLog, Replayer
+
+
+class ReplayClient(object):
+    """Stands in for the Client while replaying: it owns no car on the track
+    and never sends anything
+    """
+    id = None
+
+    def send(self, subject, data=None):
+        pass
+
+
+class ReplayRenderer(Renderer):
+    """Renders a recorded race instead of a live one
+
+    ReplayRenderer attributes (on top of the Renderer ones):
+    - replayer: the Replayer streaming the race log
+    - speed: how fast the replay runs, 1.0 being the original pace
+    - seek_step: how many seconds the arrow keys jump backwards or forwards
+    """
+
+    def __init__(self, path, start=0.0, speed=1.0, seek_step=5.0,
+                 display=None, profiler=None):
+        self.replayer  = Replayer(RaceLog(path), start)
+        self.speed     = speed
+        self.seek_step = seek_step
+        super().__init__(self.replayer.track, ReplayClient(), display,
+                         profiler)
+        self.render_state = RenderState.PLAY
+        self.gametime     = self.replayer.gametime
+
+    def update(self):
+        """Advance the replay by the time since the last frame, and seek when
+        the arrow keys are pressed
+        """
+        self.profiler.begin()
+        now = time.monotonic()
+        if self.prev_time is None:
+            self.prev_time = now
+        self.dt, self.prev_time = now - self.prev_time, now
+
+        if self.display.btnp(KEY_LEFT):
+            self.replayer.seek(self.gametime - self.seek_step)
+            self.stored_trail = []
+        elif self.display.btnp(KEY_RIGHT):
+            self.replayer.seek(self.gametime + self.seek_step)
+            self.stored_trail = []
+        else:
+            self.replayer.advance(min(self.gametime + self.dt * self.speed,
+                                      self.replayer.log.duration))
+
+        self.profiler.lap('simulation')
+
+        self.track    = self.replayer.track
+        self.gametime = self.replayer.gametime
+        self.winner   = self.replayer.winner
@@ -17,28 +17,41 @@ async def start(skt):
 class Socket(object):
     """Our interface to manage a persistent socket connection
 
+        A single asyncio loop thread owns the connection: it receives into the
+        inbox and sends from an asyncio outbox. Other threads hand messages to
+        it with send(), which is thread-safe and never blocks.
+
         It is defined by the following attributes:
         - host: string representing the host
         - port: integer representing what port number to connect to
+        - path: the path to connect to, '/spectate' to join as a spectator
         - connection: the actual websocket
-        - swap_time: time to swap execution between receiver and sender
+        - loop: the event loop that owns the connection
         - inbox: Incoming messages Queue
-        - outbox: Outgoing messages Queue
+        - outbox: Outgoing messages asyncio.Queue, only touched by the loop
+        - pending: messages sent before the connection was opened
         - running: Boolean representing whether Socket is running or not
 
         It is defined by the following behaviors:
         - raise_error_uninit(): Raises error if the socket is not initialized
         - run(): Handles the message consumption and production
+        - send(message): Hands a message to the loop, from any thread. The
+              message can also be a callable that composes it on the loop,
+              right before it is sent
+        - stop(): Closes the connection, from any thread
         - _receive_handler(): handles message consumption
-        - _outgoing_message(): handle message production
+        - _send_handler(): handle message production
     """
-    def __init__(self, host='localhost', port=8765):
+    def __init__(self, host='localhost', port=8765, path=''):
         self.host       = host
         self.port       = port
+        self.path       = path
         self.connection = None
-        self.swap_time  = 0.01
+        self.loop       = None
         self.inbox      = Queue()
-        self.outbox     = Queue()
+        self.outbox     = None
+        self.pending    = []
+        self.lock       = threading.Lock()
         self.running    = True
 
     def raise_error_uninit(self):
@@ -47,29 +60,56 @@ class Socket(object):
                             "USAGE: asyncio.run(socket.start(...) to use this.")
 
     async def run(self):
+        # The server compresses its large messages itself, see compression
         self.connection = await websockets.connect(f'ws://{self.host}:'
-                                                   f'{self.port}')
-        outbox_thread = threading.Thread(target=self._send_handler)
-        outbox_thread.start()
+                                                   f'{self.port}{self.path}',
+                                                   compression=None)
+        with self.lock:
+            self.outbox = asyncio.Queue()
+            for message in self.pending:
+                self.outbox.put_nowait(message)
+            self.pending = None
+            self.loop = asyncio.get_event_loop()
+        if not self.running:
+            await self.connection.close()
+
         consumer_task = asyncio.ensure_future(self._receive_handler())
+        producer_task = asyncio.ensure_future(self._send_handler())
         done, pending = await asyncio.wait(
-            [consumer_task],
+            [consumer_task, producer_task],
             return_when=asyncio.FIRST_COMPLETED
         )
         for task in pending:
             task.cancel()
-        outbox_thread.join()
+        self.running = False
+        self.inbox.put(None)
+
+    def send(self, message):
+        """Queue a message for the loop thread. The loop is woken up through
+        call_soon_threadsafe, so no thread ever waits on the connection
+        """
+        with self.lock:
+            if self.loop is None:
+                self.pending.append(message)
+                return
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait, message)
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            if self.loop is None:
+                return
+        asyncio.run_coroutine_threadsafe(self.connection.close(), self.loop)
 
     async def _receive_handler(self):
         self.raise_error_uninit()
         async for message in self.connection:
             self.inbox.put(message)
-            await asyncio.sleep(self.swap_time)
 
-    def _send_handler(self):
+    async def _send_handler(self):
         self.raise_error_uninit()
         while self.running:
-            message = self.outbox.get()
-            asyncio.run(self.connection.send(message))
-
-
+            message = await self.outbox.get()
+            if callable(message):
+                message = message()
+            await self.connection.send(message)
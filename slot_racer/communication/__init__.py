@@ -2,5 +2,11 @@
 client"""
 
 from .serializer import Serializer
-
+from .clock import (Clock, ClockSync, TICK_TIME, DEF_REMOTE_DELAY,
+                    MIN_REMOTE_DELAY, MAX_REMOTE_DELAY)
+from .tracing import Tracer
+from .shared import TrackPublisher, TrackReader
+from .profiling import OnDemandProfiler
+from .compression import Compressor
+from . import backend, tracing, shared, profiling, compression
 
@@ -0,0 +1,66 @@
+# Module to choose which event loop implementation the server and the clients
+# run on
+#
+# The stock asyncio loop is always available. uvloop is used when it is
+# installed and either requested or left to 'auto'. The choice can come from a
+# command line flag or from the SLOT_RACER_LOOP environment variable.
+
+# package imports
+import os
+import asyncio
+
+# global variables
+AUTO     = 'auto'
+ASYNCIO  = 'asyncio'
+UVLOOP   = 'uvloop'
+BACKENDS = (AUTO, ASYNCIO, UVLOOP)
+ENV_VAR  = 'SLOT_RACER_LOOP'
+
+
+def _uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop
+
+
+def available_backends():
+    """Returns the backends that can actually be used on this machine"""
+    backends = [ASYNCIO]
+    if _uvloop() is not None:
+        backends.append(UVLOOP)
+    return backends
+
+
+def resolve(name=None):
+    """Turns a requested backend (or the environment's, or 'auto') into the
+    one that will be used. A backend that is not installed falls back to the
+    stock asyncio loop
+    """
+    name = name or os.environ.get(ENV_VAR, AUTO)
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown event loop backend: {name}. '
+                         f'Choose from {", ".join(BACKENDS)}')
+    if name == AUTO:
+        return UVLOOP if _uvloop() is not None else ASYNCIO
+    if name == UVLOOP and _uvloop() is None:
+        print('uvloop is not installed, falling back to asyncio')
+        return ASYNCIO
+    return name
+
+
+def new_event_loop(name=None):
+    """Creates an event loop of the requested backend"""
+    if resolve(name) == UVLOOP:
+        return _uvloop().new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def set_event_loop(name=None):
+    """Creates an event loop of the requested backend and makes it the
+    current thread's loop. Returns the loop
+    """
+    loop = new_event_loop(name)
+    asyncio.set_event_loop(loop)
+    return loop
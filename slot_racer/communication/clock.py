@@ -0,0 +1,124 @@
+# Module to give the server and its clients a shared time base
+#
+# The server's clock is its monotonic clock. Clients estimate the offset (and
+# skew) between their own monotonic clock and the server's with NTP-style
+# exchanges: the client stamps t0 when it sends a 'sync' request, the server
+# stamps t1 when it receives it and t2 when it replies, and the client stamps
+# t3 when the reply arrives.
+
+# package imports
+import time
+import statistics
+from collections import deque
+
+# global variables
+TICK_TIME        = 0.05
+DEF_REMOTE_DELAY = 0.1
+MIN_REMOTE_DELAY = 0.02
+MAX_REMOTE_DELAY = 0.25
+
+
+class Clock(object):
+    """A monotonic clock. Wall clock adjustments never move it, so it is safe
+    to measure game time with
+
+    It is defined by the following behaviours:
+    - now(): seconds since an arbitrary, fixed origin
+    """
+    def now(self):
+        return time.monotonic()
+
+
+class ClockSync(Clock):
+    """ClockSync estimates the server's clock from NTP-style samples
+
+    Only the samples with the shortest round trips are trusted, since queueing
+    only ever delays a message. Over those, the offset is fitted as a line of
+    local time, whose slope is the skew between the two clocks.
+
+    It is defined by the following attributes:
+    - samples: the last (local midpoint, offset, round trip) samples
+    - offset: the estimated server time minus local time at reference
+    - skew: how many seconds the offset drifts per local second
+    - reference: the local time the offset was estimated at
+    - rtt: the shortest round trip time in the window
+    - jitter: the standard deviation of the round trip times in the window
+
+    And the following behaviours:
+    - add_sample(t0, t1, t2, t3): Records one exchange with the server
+    - seed(server_time): Gives a rough estimate before any sample exists
+    - server_now(): The current server time
+    - to_server(local)/to_local(server): Converts between the time bases
+    - remote_delay(tick_time): How far in the past remote cars should be
+          rendered for their events to have arrived
+    """
+    def __init__(self, window=32, trusted=0.5):
+        self.samples   = deque(maxlen=window)
+        self.trusted   = trusted
+        self.offset    = 0.0
+        self.skew      = 0.0
+        self.reference = 0.0
+        self.rtt       = None
+        self.jitter    = 0.0
+
+    @property
+    def synced(self):
+        return len(self.samples) > 0
+
+    def add_sample(self, t0, t1, t2, t3):
+        rtt    = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self.samples.append(((t0 + t3) / 2, offset, max(rtt, 0.0)))
+        self._estimate()
+
+    def seed(self, server_time, local_time=None):
+        """Aligns the clocks from a single server timestamp, until real samples
+        come in. Used when all we know is when the server sent something
+        """
+        if self.synced:
+            return
+        local_time = self.now() if local_time is None else local_time
+        self.offset, self.reference = server_time - local_time, local_time
+
+    def _estimate(self):
+        rtts = [rtt for _, _, rtt in self.samples]
+        self.rtt    = min(rtts)
+        self.jitter = statistics.pstdev(rtts) if len(rtts) > 1 else 0.0
+
+        # Only trust the samples with the shortest round trips
+        count = max(1, int(len(self.samples) * self.trusted))
+        best  = sorted(self.samples, key=lambda sample: sample[2])[:count]
+        times   = [local for local, _, _ in best]
+        offsets = [offset for _, offset, _ in best]
+        self.reference = statistics.mean(times)
+        self.offset    = statistics.mean(offsets)
+
+        # Fit the drift once the samples span enough time to tell it apart
+        # from noise
+        spread = max(times) - min(times)
+        if len(best) >= 4 and spread > 1.0:
+            variance = sum((t - self.reference) ** 2 for t in times)
+            self.skew = sum((t - self.reference) * (o - self.offset)
+                            for t, o in zip(times, offsets)) / variance
+        else:
+            self.skew = 0.0
+
+    def to_server(self, local):
+        return local + self.offset + self.skew * (local - self.reference)
+
+    def to_local(self, server):
+        return (server - self.offset + self.skew * self.reference) / \
+            (1 + self.skew)
+
+    def server_now(self):
+        return self.to_server(self.now())
+
+    def remote_delay(self, tick_time):
+        """A remote event reaches us after travelling to the server, waiting
+        for the next tick and travelling to us. Without samples, keep the
+        default delay
+        """
+        if self.rtt is None:
+            return DEF_REMOTE_DELAY
+        delay = self.rtt + tick_time + 2 * self.jitter
+        return min(max(delay, MIN_REMOTE_DELAY), MAX_REMOTE_DELAY)
@@ -0,0 +1,151 @@
+# Module to compress the large messages the server sends, and only those
+#
+# Most messages are a few dozen bytes of JSON (pings, events, the update of a
+# quiet tick), and compressing them costs more time than the bytes it saves.
+# Others grow with the number of cars (the roster, the update of a busy tick,
+# the snapshot a spectator is greeted with). The websocket's own
+# permessage-deflate compresses every message alike, so it is turned off, and
+# the Compressor only deflates the messages above a threshold instead.
+#
+# A compressed message is sent as a binary frame: a TAG byte, which never
+# starts a JSON message, followed by raw deflate data. The deflate stream is
+# primed with a preset DICTIONARY made of the fragments every message repeats,
+# so that even a message of a few hundred bytes compresses well. Every message
+# is compressed on its own, since a broadcast is compressed once and sent to
+# every connection, and the dictionary is the same for every connection.
+
+# package imports
+import time
+import zlib
+
+# global variables
+TAG           = b'\x01'
+WBITS         = -zlib.MAX_WBITS
+DEF_THRESHOLD = 512
+DEF_LEVEL     = 1
+
+# The fragments that repeat the most go last, closest to the data
+DICTIONARY = ''.join([
+    '["begin_countdown", [', '["winner", ', '["sync", [', '["cars", [',
+    'null, [', ', ["collide", [', ', ["explode", [', '], [',
+    ', ["stop_accelerating", [', ', ["accelerate", [', '["update", [',
+    ']]], [', ']]]]', '0.0', ', 0.'
+]).encode()
+
+
+def unpack(message, zdict=DICTIONARY):
+    """Decompresses a message if it was compressed, and returns it as is
+    otherwise. A corrupt or truncated compressed message raises ValueError,
+    as a malformed JSON message does once it is parsed
+    """
+    if isinstance(message, (bytes, bytearray)) and message[:1] == TAG:
+        inflater = zlib.decompressobj(WBITS, zdict=zdict)
+        try:
+            data = inflater.decompress(message[1:]) + inflater.flush()
+        except zlib.error as exc:
+            raise ValueError(f'Corrupt compressed message: {exc}') from exc
+        if not inflater.eof:
+            raise ValueError('Truncated compressed message')
+        return data
+    return message
+
+
+def subject_of(message):
+    """The subject of a composed message, without parsing the whole of it"""
+    end = message.find('"', 2)
+    return message[2:end] if message.startswith('["') and end > 0 else None
+
+
+class SubjectStats(object):
+    """SubjectStats counts what compression did to the messages of a subject
+
+    It is defined by the following attributes:
+    - messages: the number of messages sent
+    - compressed: the number of them that were compressed
+    - raw/sent: the bytes of the messages before and after compression,
+          once encoded to UTF-8
+    - seconds: the time spent compressing them
+    """
+    __slots__ = ('messages', 'compressed', 'raw', 'sent', 'seconds')
+
+    def __init__(self):
+        self.messages   = 0
+        self.compressed = 0
+        self.raw        = 0
+        self.sent       = 0
+        self.seconds    = 0.0
+
+
+class Compressor(object):
+    """Compressor deflates the messages above a size threshold
+
+    It is defined by the following attributes:
+    - threshold: messages shorter than this many bytes, once encoded to
+          UTF-8, are sent as they are. None turns compression off
+    - level: the zlib compression level. The fastest level saves nearly as
+          many bytes as the default one on our messages, in a fraction of the
+          time
+    - zdict: the preset dictionary, the receivers must use the same one
+    - stats: the SubjectStats of every subject
+
+    And the following behaviours:
+    - pack(message, subject): Returns the message as it is, or compressed to
+          bytes if it is above the threshold and compressing it saves bytes
+    - summary(): The stats of every subject, as a dictionary
+    - report(): Returns a printable summary of the stats
+    """
+    def __init__(self, threshold=DEF_THRESHOLD, level=DEF_LEVEL,
+                 zdict=DICTIONARY):
+        self.threshold = threshold
+        self.level     = level
+        self.zdict     = zdict
+        self.stats     = {}
+
+    def pack(self, message, subject=None):
+        if self.threshold is None:
+            return message
+        if subject is None:
+            subject = subject_of(message)
+        stats = self.stats.get(subject, None)
+        if stats is None:
+            stats = self.stats[subject] = SubjectStats()
+        data = message.encode()
+        stats.messages += 1
+        stats.raw += len(data)
+        if len(data) < self.threshold:
+            stats.sent += len(data)
+            return message
+
+        start = time.perf_counter()
+        deflater = zlib.compressobj(self.level, zlib.DEFLATED, WBITS,
+                                    zdict=self.zdict)
+        packed = TAG + deflater.compress(data) + deflater.flush()
+        stats.seconds += time.perf_counter() - start
+        if len(packed) >= len(data):
+            stats.sent += len(data)
+            return message
+        stats.compressed += 1
+        stats.sent += len(packed)
+        return packed
+
+    def summary(self):
+        return {subject: dict(messages=stats.messages,
+                              compressed=stats.compressed, raw=stats.raw,
+                              sent=stats.sent,
+                              ratio=stats.raw / max(stats.sent, 1),
+                              us_per_message=stats.seconds * 1e6 /
+                              max(stats.compressed, 1))
+                for subject, stats in self.stats.items()}
+
+    def report(self):
+        lines = [f'{"Subject":<18} {"messages":>9} {"compressed":>10} '
+                 f'{"raw KB":>9} {"sent KB":>9} {"ratio":>6} {"us/msg":>7}']
+        for subject, stats in sorted(self.summary().items(),
+                                     key=lambda item: -item[1]['raw']):
+            lines.append(f'{str(subject):<18} {stats["messages"]:9d} '
+                         f'{stats["compressed"]:10d} '
+                         f'{stats["raw"] / 1024:9.1f} '
+                         f'{stats["sent"] / 1024:9.1f} '
+                         f'{stats["ratio"]:6.2f} '
+                         f'{stats["us_per_message"]:7.1f}')
+        return '\n'.join(lines)
@@ -0,0 +1,165 @@
+# Module to profile a running server or client on demand
+#
+# The OnDemandProfiler stays off until it is asked for a profile, by a signal
+# (SIGUSR1) or by an admin message. The code it profiles is split into
+# sections (a server tick, the reading of a message, a frame's update or
+# draw) that are marked with begin()/end(), which only check one attribute
+# while the profiler is off. Once a profile is requested, the sections are
+# profiled for a bounded window and the profile is written to disk, either:
+#
+#   pstats     cProfile statistics, enabled only while a section runs. Read
+#              them with python -m pstats
+#   collapsed  a sampler thread records the stack of the profiled thread, a
+#              few hundred times a second, while a section runs. Each line is
+#              'outer;inner;innermost count', the input of flame graph tools
+
+# package imports
+import os
+import math
+import sys
+import time
+import signal
+import cProfile
+import threading
+
+# global variables
+PSTATS       = 'pstats'
+COLLAPSED    = 'collapsed'
+FORMATS      = (PSTATS, COLLAPSED)
+DEF_DURATION = 10.0
+MAX_DURATION = 300.0
+DEF_INTERVAL = 0.002
+
+
+class OnDemandProfiler(object):
+    """OnDemandProfiler profiles sections of code for a window, on request
+
+    It is defined by the following attributes:
+    - prefix: the path the profiles are written to, completed with the pid,
+          the time and the format
+    - duration: how long a requested profile lasts by default
+    - format: 'pstats' or 'collapsed'
+    - interval: the time between two samples, when collapsing stacks
+    - window: the length of the requested profile, None while off
+    - deadline: when the current profile ends
+    - depth: how many sections are running, sections can be nested
+
+    And the following behaviours:
+    - request(duration): Asks for a profile of at most MAX_DURATION
+          seconds. Returns False, and asks for nothing, if the duration is not
+          a positive number. Safe to call from a signal handler or another
+          thread
+    - install(signum): Requests a profile whenever the process gets the signal
+    - begin()/end(began): Mark a section, end takes what begin returned
+    - wrap(function): Marks every call to the function as a section
+    """
+    def __init__(self, prefix='profile', duration=DEF_DURATION,
+                 format=PSTATS, interval=DEF_INTERVAL):
+        if format not in FORMATS:
+            raise ValueError(f'Unknown profile format: {format}. '
+                             f'Choose from {", ".join(FORMATS)}')
+        self.prefix   = prefix
+        self.duration = duration
+        self.format   = format
+        self.interval = interval
+        self.window   = None
+        self.deadline = None
+        self.depth    = 0
+        self.profile  = None
+        self.stacks   = None
+        self.thread   = None
+        self.sampler  = None
+
+    def request(self, duration=None):
+        if duration is None:
+            duration = self.duration
+        if isinstance(duration, bool) or \
+                not isinstance(duration, (int, float)) or \
+                not math.isfinite(duration) or duration <= 0:
+            return False
+        if self.window is None:
+            self.window = min(duration, MAX_DURATION)
+        return True
+
+    def install(self, signum=getattr(signal, 'SIGUSR1', None)):
+        if signum is not None:
+            signal.signal(signum, lambda *_: self.request())
+
+    def begin(self):
+        if self.window is None:
+            return False
+        now = time.monotonic()
+        if self.deadline is None:
+            self.start(now)
+        elif now > self.deadline:
+            # The window is over, it is written once no section runs
+            if self.depth == 0:
+                self.finish()
+            return False
+        self.depth += 1
+        if self.depth == 1 and self.profile is not None:
+            self.profile.enable()
+        return True
+
+    def end(self, began):
+        if not began:
+            return
+        self.depth -= 1
+        if self.depth == 0 and self.profile is not None:
+            self.profile.disable()
+        if self.depth == 0 and time.monotonic() > self.deadline:
+            self.finish()
+
+    def wrap(self, function):
+        def sampled(*args, **kwargs):
+            began = self.begin()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.end(began)
+        return sampled
+
+    def start(self, now):
+        self.deadline = now + self.window
+        if self.format == PSTATS:
+            self.profile = cProfile.Profile()
+        else:
+            self.stacks = {}
+            self.thread = threading.get_ident()
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+
+    def _sample(self):
+        """Counts the stacks of the profiled thread while it runs a section"""
+        stacks = self.stacks
+        while self.deadline is not None and \
+                time.monotonic() <= self.deadline:
+            time.sleep(self.interval)
+            if self.depth <= 0:
+                continue
+            frame = sys._current_frames().get(self.thread, None)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:'
+                             f'{code.co_name}')
+                frame = frame.f_back
+            stack = ';'.join(reversed(stack))
+            stacks[stack] = stacks.get(stack, 0) + 1
+
+    def finish(self):
+        """Writes the profile and turns the profiler off"""
+        path = f'{self.prefix}-{os.getpid()}-{int(time.time())}.{self.format}'
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(path)
+        else:
+            self.deadline = None
+            self.sampler.join()
+            with open(path, 'w') as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f'{stack} {count}\n')
+        print(f'Profile written to {path}')
+        self.window = self.deadline = self.profile = self.stacks = None
+        self.sampler = None
+        self.depth = 0
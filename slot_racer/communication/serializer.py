@@ -6,6 +6,7 @@
 # package imports
 import json
 from collections import namedtuple
+from .compression import unpack
 
 # global variables
 Message = namedtuple('Message', ['subject', 'data'])
@@ -16,13 +17,13 @@ class Serializer(object):
 
     It is defined by the following behaviours:
     - compose(subject, data): makes a message
-    - read(message): parses a message
+    - read(message): parses a message, compressed (see compression) or not
     """
     def compose(self, subject, data):
         return json.dumps((subject, data))
 
     def read(self, message):
-        parsed = json.loads(message)
+        parsed = json.loads(unpack(message))
         return Message(subject=parsed[0], data=parsed[1])
 
 
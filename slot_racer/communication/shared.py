@@ -0,0 +1,175 @@
+# Module to publish the state of the track to local processes through shared
+# memory
+#
+# The server's simulation writes the state of every car, once per tick, to a
+# memory-mapped file. Local processes (bots, overlays, analytics, a spectator
+# relay) map the same file and read the cars straight out of it, without a
+# socket, a copy or any work for the server: nothing they do reaches the
+# broadcast path.
+#
+# The file is a header followed by a ring of frames, one frame per tick:
+#
+#   header  magic, version, capacity (frames in the ring), max cars, frame
+#           size, open flag, and the number of the last complete frame
+#   frame   sequence, gametime, car count, winner (id + 1, 0 for none), then
+#           (id, flags, speed, distance) for every car
+#
+# Frames are written under a seqlock: the writer makes a frame's sequence odd
+# before writing it and even (2 * frame number + 2) once it is done. A reader
+# reads the sequence, the frame and the sequence again, and only keeps the
+# frame if both were the same even number. A reader that was lapped by the
+# writer sees another sequence and gets None rather than a torn frame.
+
+# package imports
+import mmap
+import time
+import struct
+
+# global variables
+MAGIC        = b'SLOTSHM\0'
+VERSION      = 1
+HEADER       = struct.Struct('<8sHHIIIQ')
+FRAME        = struct.Struct('<QdII')
+CAR          = struct.Struct('<IIdd')
+SEQUENCE     = struct.Struct('<Q')
+OPEN         = struct.Struct('<H')
+OPEN_OFFSET  = 10
+LAST_FRAME   = HEADER.size - SEQUENCE.size
+DEF_CAPACITY = 64
+DEF_MAX_CARS = 256
+
+ACCELERATING, FALLEN = 1, 2
+
+
+def frame_size(max_cars):
+    return FRAME.size + max_cars * CAR.size
+
+
+class TrackPublisher(object):
+    """TrackPublisher writes the cars of a track to a shared memory ring
+
+    It is defined by the following attributes:
+    - path: the file the ring is mapped from, /dev/shm keeps it in memory
+    - capacity: the number of frames in the ring
+    - max_cars: the most cars a frame holds, the cars after them are left out
+    - frame: the number of the last frame written
+
+    And the following behaviours:
+    - publish(gametime, cars, winner): Writes a frame
+    - close(): Marks the ring closed and unmaps it. The file is left for the
+          readers still mapping it
+    """
+    def __init__(self, path, capacity=DEF_CAPACITY, max_cars=DEF_MAX_CARS):
+        self.path     = path
+        self.capacity = capacity
+        self.max_cars = max_cars
+        self.size     = frame_size(max_cars)
+        self.frame    = -1
+
+        length = HEADER.size + capacity * self.size
+        with open(path, 'w+b') as f:
+            f.truncate(length)
+            self.map = mmap.mmap(f.fileno(), length)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, 1, capacity, max_cars,
+                         self.size, 0)
+
+    def publish(self, gametime, cars, winner=None):
+        self.frame += 1
+        offset = HEADER.size + (self.frame % self.capacity) * self.size
+        sequence = 2 * self.frame + 2
+
+        # Odd while the frame is being written
+        SEQUENCE.pack_into(self.map, offset, sequence - 1)
+        count = 0
+        for car in cars[:self.max_cars]:
+            flags = (ACCELERATING * bool(car.is_accelerating) |
+                     FALLEN * (car.fallen is not None))
+            CAR.pack_into(self.map, offset + FRAME.size + count * CAR.size,
+                          car.id, flags, car.speed, car.distance)
+            count += 1
+        FRAME.pack_into(self.map, offset, sequence - 1, gametime, count,
+                        0 if winner is None else winner + 1)
+        SEQUENCE.pack_into(self.map, offset, sequence)
+
+        # Readers look for the last complete frame in the header
+        SEQUENCE.pack_into(self.map, LAST_FRAME, self.frame + 1)
+
+    def close(self):
+        OPEN.pack_into(self.map, OPEN_OFFSET, 0)
+        self.map.close()
+
+
+class TrackReader(object):
+    """TrackReader reads the frames a TrackPublisher writes
+
+    It is defined by the following attributes:
+    - path: the file the ring is mapped from
+    - capacity/max_cars/size: the shape of the ring, read from its header
+
+    And the following behaviours:
+    - last(): The number of the last complete frame, -1 if there is none
+    - read(frame): The (gametime, winner, cars) of a frame, where cars are
+          (id, accelerating, fallen, speed, distance) tuples. None if the
+          frame was overwritten while it was read, or is not written yet
+    - latest(): The last complete frame, as (frame, gametime, winner, cars)
+    - follow(poll): Yields every frame as it is written, skipping the ones
+          the reader was too slow for
+    - is_open(): Whether the publisher is still writing
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.capacity, self.max_cars, self.size, _ = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a shared track ring')
+
+    def is_open(self):
+        return bool(OPEN.unpack_from(self.map, OPEN_OFFSET)[0])
+
+    def last(self):
+        return SEQUENCE.unpack_from(self.map, LAST_FRAME)[0] - 1
+
+    def read(self, frame):
+        if frame < 0:
+            return None
+        offset = HEADER.size + (frame % self.capacity) * self.size
+        expected = 2 * frame + 2
+        if SEQUENCE.unpack_from(self.map, offset)[0] != expected:
+            return None
+        _, gametime, count, winner = FRAME.unpack_from(self.map, offset)
+        cars = [CAR.unpack_from(self.map, position) for position in
+                range(offset + FRAME.size, offset + FRAME.size +
+                      min(count, self.max_cars) * CAR.size, CAR.size)]
+        if SEQUENCE.unpack_from(self.map, offset)[0] != expected:
+            return None
+        cars = [(car_id, bool(flags & ACCELERATING), bool(flags & FALLEN),
+                 speed, distance) for car_id, flags, speed, distance in cars]
+        return gametime, (winner - 1 if winner else None), cars
+
+    def latest(self):
+        while True:
+            frame = self.last()
+            if frame < 0:
+                return None
+            data = self.read(frame)
+            if data is not None:
+                return (frame,) + data
+
+    def follow(self, poll=0.005):
+        frame = self.last()
+        while self.is_open() or frame < self.last():
+            last = self.last()
+            if frame >= last:
+                time.sleep(poll)
+                continue
+
+            # Skip the frames the writer already overwrote
+            frame = max(frame + 1, last - self.capacity + 1)
+            data = self.read(frame)
+            if data is not None:
+                yield (frame,) + data
+
+    def close(self):
+        self.map.close()
@@ -0,0 +1,90 @@
+# Module to test the compression of the messages the server sends
+
+
+# local imports
+from .compression import Compressor, unpack, TAG, DEF_THRESHOLD
+from .serializer import Serializer
+from ..game.state.extra import log
+
+# global definitions
+SERIALIZER = Serializer()
+CARS       = 50
+
+
+def update(cars=CARS):
+    """An update message with cars events, as the server composes it"""
+    events = [[car_id, 'accelerate', [1.25 + car_id, 0.5, 0.01 * car_id]]
+              for car_id in range(cars)]
+    return SERIALIZER.compose('update', (1.25, events))
+
+
+def test0():
+    """Test0: Messages below the threshold are sent as they are
+       - A short message is returned as the same text
+       - The threshold and the stats are counted in bytes, not characters
+    """
+    compressor, match = Compressor(), []
+
+    # a short message is returned as the same text
+    message = update(cars=2)
+    match.append(compressor.pack(message) is message)
+    match.append(SERIALIZER.read(message).subject == 'update')
+
+    # the threshold and the stats are counted in bytes, not characters
+    wide = '["name", "' + 'é' * (DEF_THRESHOLD // 2) + '"]'
+    match.append(len(wide) < DEF_THRESHOLD <= len(wide.encode()))
+    match.append(isinstance(compressor.pack(wide), bytes))
+    stats = compressor.summary()['name']
+    match.append(stats['raw'] == len(wide.encode()) and
+                 stats['compressed'] == 1)
+
+    log(match, test0.__doc__)
+
+
+def test1():
+    """Test1: Messages above the threshold are compressed and read back
+       - A large message is sent as a tagged binary frame
+       - It reads back to the same message
+       - The stats count the bytes saved
+    """
+    compressor, match = Compressor(), []
+    message = update()
+
+    # a large message is sent as a tagged binary frame
+    packed = compressor.pack(message)
+    match.append(isinstance(packed, bytes) and packed[:1] == TAG)
+    match.append(len(packed) < len(message.encode()))
+
+    # it reads back to the same message
+    match.append(unpack(packed).decode() == message)
+    match.append(SERIALIZER.read(packed) == SERIALIZER.read(message))
+
+    # the stats count the bytes saved
+    stats = compressor.summary()['update']
+    match.append(stats['raw'] == len(message.encode()) and
+                 stats['sent'] == len(packed) and stats['ratio'] > 1)
+
+    log(match, test1.__doc__)
+
+
+def test2():
+    """Test2: A corrupt compressed message raises ValueError
+       - Corrupt data
+       - Truncated data
+    """
+    packed, match = Compressor().pack(update()), []
+    for message in (TAG + b'\xff' * 16, packed[:len(packed) // 2]):
+        try:
+            SERIALIZER.read(message)
+            match.append(False)
+        except ValueError:
+            match.append(True)
+
+    log(match, test2.__doc__)
+
+
+def run():
+    """Runs all tests"""
+    test0()
+    test1()
+    test2()
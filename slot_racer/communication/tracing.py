@@ -0,0 +1,131 @@
+# Module to trace a sample of the players' inputs from end to end
+#
+# A traced event carries a 4th element, [trace id, hops], where hops is a list
+# of [hop name, server time] pairs. The client that sends the event starts the
+# trace and every stage it goes through appends its hop:
+#
+#   input            the renderer turns a keypress into an event
+#   sent             the socket's loop writes it to the connection
+#   server_received  the server reads it
+#   broadcast        the server's tick broadcasts it
+#   client_received  another client's inbox reads the broadcast
+#   applied          that client's renderer applies it to the track
+#
+# Every hop is stamped on the server's clock, so hops stamped on different
+# machines can be compared. Spans are exported as JSON lines: the server writes
+# the hops up to the broadcast, and every other client the complete trace.
+
+# package imports
+import sys
+import time
+import json
+import random
+import statistics
+
+# global variables
+HOPS = ('input', 'sent', 'server_received', 'broadcast', 'client_received',
+        'applied')
+DEF_SAMPLE_RATE = 0.05
+
+
+def get_trace(data):
+    """Returns the trace carried by an event's data, if there is one"""
+    return data[3] if len(data) > 3 else None
+
+
+def stamp(trace, hop, server_time):
+    trace[1].append([hop, server_time])
+
+
+class Tracer(object):
+    """Tracer starts and exports the traces
+
+    It is defined by the following attributes:
+    - path: the JSON lines file spans are appended to
+    - sample_rate: the fraction of events that are traced
+    - spans: the spans waiting to be written
+    - flush_every: how many spans are written at a time
+    - flush_interval: the longest spans wait before being written
+
+    And the following behaviours:
+    - start(server_time): Starts a trace for a sampled event, None otherwise
+    - export(trace, **fields): Queues a span to be written
+    - flush()/close(): Writes the waiting spans
+    """
+    def __init__(self, path, sample_rate=DEF_SAMPLE_RATE, flush_every=32,
+                 flush_interval=1.0, seed=None):
+        self.path        = path
+        self.sample_rate = sample_rate
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.flushed     = time.monotonic()
+        self.spans       = []
+        self.random      = random.Random(seed)
+
+    def start(self, server_time):
+        if self.random.random() >= self.sample_rate:
+            return None
+        return [f'{self.random.getrandbits(64):016x}', [['input', server_time]]]
+
+    def export(self, trace, **fields):
+        trace_id, hops = trace
+        self.spans.append(dict(trace=trace_id, hops=list(hops), **fields))
+        if len(self.spans) >= self.flush_every or \
+                time.monotonic() - self.flushed > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.flushed = time.monotonic()
+        if not self.spans:
+            return
+        spans, self.spans = self.spans, []
+        with open(self.path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(span) + '\n')
+
+    def close(self):
+        self.flush()
+
+
+def load(paths):
+    """Reads the spans of the given files"""
+    spans = []
+    for path in paths:
+        with open(path) as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    return spans
+
+
+def summarize(spans):
+    """Returns {(from hop, to hop): [delays]} over the given spans. When a
+    trace was exported more than once, the longest span of it is kept
+    """
+    traces = {}
+    for span in spans:
+        previous = traces.get(span['trace'], None)
+        if previous is None or len(span['hops']) > len(previous['hops']):
+            traces[span['trace']] = span
+
+    delays = {}
+    for span in traces.values():
+        hops = span['hops']
+        for (hop, start), (next_hop, end) in zip(hops, hops[1:]):
+            delays.setdefault((hop, next_hop), []).append(end - start)
+        if len(hops) > 1:
+            delays.setdefault((hops[0][0], hops[-1][0]), []).append(
+                hops[-1][1] - hops[0][1])
+    return delays
+
+
+def report(delays, out=sys.stdout):
+    """Prints the delay each hop adds, slowest on average first"""
+    print(f'{"hop":<36}{"count":>7}{"mean":>10}{"p50":>10}{"p95":>10}',
+          file=out)
+    rows = sorted(delays.items(), key=lambda item: -statistics.mean(item[1]))
+    for (hop, next_hop), values in rows:
+        values = sorted(values)
+        p95 = values[min(int(len(values) * 0.95), len(values) - 1)]
+        print(f'{hop + " -> " + next_hop:<36}{len(values):>7}'
+              f'{statistics.mean(values) * 1000:8.2f}ms'
+              f'{statistics.median(values) * 1000:8.2f}ms'
+              f'{p95 * 1000:8.2f}ms', file=out)
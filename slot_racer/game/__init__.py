@@ -3,5 +3,8 @@
 # game_code should provide access to the modules that define the game
 from .physics import *
 from .state import *
+from .bots import *
+from .collisions import *
+from .lifecycle import *
 
 
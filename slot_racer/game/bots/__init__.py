@@ -0,0 +1,5 @@
+"""Module to define scripted drivers that can play the game without a player"""
+
+# bots module should provide access to all the definitions in bots.py
+from .bots import *
+
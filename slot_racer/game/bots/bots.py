@@ -0,0 +1,152 @@
+# Module to define scripted drivers that can race a Car without a player
+
+
+# package imports
+import math
+import random
+from ..physics import physics
+
+# global variables
+__all__ = ['HoldPolicy', 'PulsePolicy', 'RandomPolicy', 'SafePolicy',
+           'POLICIES', 'make_policy', 'Driver']
+
+
+class HoldPolicy(object):
+    """A policy that keeps the throttle down for the whole race. Useful to
+    generate as many falls (and explode events) as possible
+    """
+    def wants_throttle(self, car, gametime):
+        return True
+
+
+class PulsePolicy(object):
+    """A policy that presses the throttle for a fraction of each period
+
+    It is defined by the following attributes:
+    - period: length of one on/off cycle in seconds
+    - duty: fraction of the period the throttle is held down for
+    """
+    def __init__(self, period=1.0, duty=0.5):
+        self.period = period
+        self.duty   = duty
+
+    def wants_throttle(self, car, gametime):
+        return (gametime % self.period) < self.period * self.duty
+
+
+class RandomPolicy(object):
+    """A policy that toggles the throttle at random moments
+
+    It is defined by the following attributes:
+    - toggle_rate: average number of toggles per second
+    - rng: the random number generator, seeded for reproducible runs
+    - pressed: whether the throttle is currently held down
+    - last_time: the gametime of the last decision
+    """
+    def __init__(self, toggle_rate=2.0, seed=None):
+        self.toggle_rate = toggle_rate
+        self.rng         = random.Random(seed)
+        self.pressed     = False
+        self.last_time   = 0.0
+
+    def wants_throttle(self, car, gametime):
+        elapsed, self.last_time = gametime - self.last_time, gametime
+        if self.rng.random() < self.toggle_rate * max(elapsed, 0):
+            self.pressed = not self.pressed
+        return self.pressed
+
+
+class Probe(object):
+    """A point ahead of a car, to read the falling threshold at"""
+    __slots__ = ('id', 'distance')
+
+
+class SafePolicy(object):
+    """A policy that accelerates only while the car could still brake in time
+    for every curve ahead. The threshold only drops ahead of a curve, so the
+    policy looks as far ahead as the car would take to stop: were it to keep
+    accelerating for its reaction time and then brake, it must stay below the
+    threshold of every point on the way
+
+    It is defined by the following attributes:
+    - margin: fraction of the falling threshold the car is allowed to reach
+    - reaction: seconds the car keeps accelerating before it would brake
+    - samples: the points checked on the way
+    """
+    def __init__(self, margin=0.9, reaction=0.1, samples=16):
+        self.margin   = margin
+        self.reaction = reaction
+        self.samples  = samples
+        self.probe    = Probe()
+
+    def wants_throttle(self, car, gametime):
+        acceleration = physics.ACCELERATION
+        speed = min(car.speed + acceleration * self.reaction,
+                    physics.MAX_SPEED)
+        start = car.distance + car.speed * self.reaction
+        braking = speed * speed / (2 * acceleration)
+        probe = self.probe
+        probe.id = car.id
+        for i in range(self.samples + 1):
+            ahead = braking * i / self.samples
+            probe.distance = start + ahead
+            arriving = math.sqrt(max(speed * speed -
+                                     2 * acceleration * ahead, 0.0))
+            if arriving > physics.threshold(probe) * self.margin:
+                return False
+        return True
+
+
+POLICIES = dict(
+    hold=HoldPolicy,
+    pulse=PulsePolicy,
+    random=RandomPolicy,
+    safe=SafePolicy
+)
+
+
+def make_policy(name, **kwargs):
+    """Builds the policy registered under the given name"""
+    policy = POLICIES.get(name, None)
+    if policy is None:
+        raise ValueError(f'Unknown policy: {name}. '
+                         f'Choose from {", ".join(POLICIES)}')
+    return policy(**kwargs)
+
+
+class Driver(object):
+    """A Driver plays a Car the same way Renderer.update does for a player,
+    except that the space bar is replaced by a policy
+
+    It is defined by the following attributes:
+    - car: the Car that is being driven
+    - policy: decides whether the throttle should be held down
+
+    And the following behaviours:
+    - drive(gametime): Advances the car to the gametime, applies the policy
+          to it and returns the (subject, data) message a Client would send,
+          or None
+    """
+    def __init__(self, car, policy):
+        self.car    = car
+        self.policy = policy
+
+    def drive(self, gametime):
+        car = self.car
+        car.update(gametime)
+
+        # If the car is fallen, the explode event is only reported once
+        if car.fallen:
+            if not car.fallen.sent_to_server:
+                car.fallen.sent_to_server = True
+                return 'explode', (gametime, 0, car.distance)
+            return None
+
+        throttle = self.policy.wants_throttle(car, gametime)
+        if throttle and not car.is_accelerating:
+            event = car.accelerate(gametime)
+        elif not throttle and car.is_accelerating:
+            event = car.stop_accelerating(gametime)
+        else:
+            return None
+        return event.event_type, (gametime, event.speed, event.distance)
@@ -0,0 +1,4 @@
+"""Module to detect the collisions between cars"""
+
+# collisions module should provide access to all the definitions in collisions.py
+from .collisions import CollisionIndex, COLLISION_DISTANCE
@@ -0,0 +1,227 @@
+# Module to detect collisions between the cars on a track
+#
+# Every lane is a figure of eight: it crosses itself in its middle, and it
+# crosses (or runs along) the other lanes. calculate_posn draws three lanes:
+# car 0's, car 1's and the one every other car shares. Two cars collide when
+# they come within COLLISION_DISTANCE of each other.
+#
+# Checking every pair of cars on every tick is O(n^2). Instead, the cars of
+# every lane are kept sorted by their distance into the lap. Cars close to
+# each other along their lane are neighbours in that order, so the sweep only
+# looks ahead of every car while it is still within reach. Where lanes cross,
+# a car is also looked up, by bisection, in the range of the lane it crosses.
+# The crossings are found once, by sampling the lanes, for the current physics
+# constants. Cars barely move between ticks, so the order is kept by an
+# insertion sort, which only costs O(n) on a nearly sorted list.
+
+# package imports
+import math
+import bisect
+from ..physics import physics
+from ..state import Car
+
+# global variables
+COLLISION_DISTANCE = 4.0
+SAMPLES            = 200
+_CROSSINGS         = {}
+
+
+def lane(car_id):
+    """The lane calculate_posn puts a car in"""
+    return min(car_id, 2)
+
+
+def lane_points(lane_id, samples=SAMPLES):
+    """Samples a lane at samples evenly spaced distances into the lap"""
+    dummy = Car(lane_id)
+    points = []
+    for i in range(samples):
+        dummy.distance = i / samples
+        points.append(physics.calculate_posn(dummy))
+    return points
+
+
+def find_crossings(samples=SAMPLES):
+    """Finds where the lanes come within reach of one another (or of
+    themselves, away from the car itself). Returns the reach of every lane, as
+    a fraction of the lap, and for every lane and every sample the
+    (other lane, lo, hi) ranges of distance into the lap a car of the other
+    lane is within reach in. Being within reach is mutual, so every range is
+    only kept on one side: the lane with the lower id, or for a lane crossing
+    itself, the sample further back into the lap
+    """
+    points = {lane_id: lane_points(lane_id, samples) for lane_id in range(3)}
+    steps = {lane_id: [math.dist(p[i], p[(i + 1) % samples])
+                       for i in range(samples)]
+             for lane_id, p in points.items()}
+
+    # How far into the lap, at worst, two cars of a lane can be and collide
+    reach = {lane_id: COLLISION_DISTANCE / (min(step) * samples) + 1 / samples
+             for lane_id, step in steps.items()}
+    neighbours = {lane_id: math.ceil(reach[lane_id] * samples)
+                  for lane_id in points}
+
+    crossings = {lane_id: [[] for _ in range(samples)] for lane_id in points}
+    for lane_id in points:
+        for other, other_points in points.items():
+            # A car can be anywhere between two samples, and so can the other
+            margin = COLLISION_DISTANCE + max(steps[lane_id]) + \
+                max(steps[other])
+            if other < lane_id:
+                continue
+            for i, point in enumerate(points[lane_id]):
+                close = [j for j, other_point in enumerate(other_points)
+                         if math.dist(point, other_point) <= margin and
+                         (other != lane_id or
+                          min(abs(i - j), samples - abs(i - j)) >
+                          neighbours[lane_id])]
+                crossings[lane_id][i].extend(
+                    (other, lo / samples, (hi + 1) / samples)
+                    for lo, hi in runs(close) if other != lane_id or lo > i)
+    return reach, crossings
+
+
+def runs(indices):
+    """Groups sorted indices into (first, last) runs of consecutive ones"""
+    grouped = []
+    for index in indices:
+        if grouped and grouped[-1][1] == index - 1:
+            grouped[-1][1] = index
+        else:
+            grouped.append([index, index])
+    return grouped
+
+
+def crossings():
+    """The crossings for the current physics constants"""
+    key = (physics.SOCKET_WIDTH, physics.TRACK_WIDTH)
+    if key not in _CROSSINGS:
+        _CROSSINGS[key] = find_crossings()
+    return _CROSSINGS[key]
+
+
+class CollisionIndex(object):
+    """CollisionIndex finds the cars of a track that run into one another
+
+    It is defined by the following attributes:
+    - track: the Track whose cars are checked
+    - cars: the track's participants the lanes were built from
+    - lanes: the cars of every lane, sorted by their distance into the lap
+    - keys: the distance into the lap of every car of every lane, in the
+          same order, kept up to date by resort
+    - contacts: the pairs of car ids that were within reach on the last
+          update. Cars already touching do not collide again until they part,
+          so cars lined up at the start do not all collide
+    - spare/positions: the set the next contacts are gathered in, and the
+          positions of the cars checked, reused from one update to the next
+    - reach/crossings: where the lanes come within reach, see find_crossings
+
+    And the following behaviours:
+    - update(): Sorts the cars again and returns the (car, car) pairs that
+          came into contact since the last update
+    - candidates(): Yields the pairs of cars close enough along their lanes,
+          or where their lanes cross, to be worth checking. A pair may be
+          yielded more than once
+    - reset(): Forgets the cars and their contacts, once the race is over
+    """
+    def __init__(self, track):
+        self.track     = track
+        self.reach, self.crossings = crossings()
+        self.positions = {}
+        self.reset()
+
+    def reset(self):
+        self.cars     = None
+        self.lanes    = {}
+        self.keys     = {}
+        self.contacts = None
+        self.spare    = set()
+
+    def rebuild(self):
+        self.cars = list(self.track.participants)
+        self.lanes, self.keys = {}, {}
+        for car in self.cars:
+            self.lanes.setdefault(lane(car.id), []).append(car)
+        for lane_id, cars in self.lanes.items():
+            cars.sort(key=lambda car: car.distance % 1)
+            self.keys[lane_id] = [car.distance % 1 for car in cars]
+
+    def resort(self):
+        """Insertion sort, cheap since the cars were sorted on the last
+        update and moved little since
+        """
+        for lane_id, cars in self.lanes.items():
+            keys = self.keys[lane_id]
+            for i, car in enumerate(cars):
+                keys[i] = car.distance % 1
+            for i in range(1, len(cars)):
+                car, key, j = cars[i], keys[i], i - 1
+                while j >= 0 and keys[j] > key:
+                    cars[j + 1], keys[j + 1] = cars[j], keys[j]
+                    j -= 1
+                cars[j + 1], keys[j + 1] = car, key
+
+    def candidates(self):
+        # Neighbours along every lane, wrapping around the finish line
+        for lane_id, cars in self.lanes.items():
+            keys, reach, count = self.keys[lane_id], self.reach[lane_id], \
+                len(cars)
+            for i in range(count):
+                car, key = cars[i], keys[i]
+                for j in range(i + 1, i + count):
+                    if j >= count:
+                        j -= count
+                    if (keys[j] - key) % 1 > reach:
+                        break
+                    yield car, cars[j]
+
+        # Cars where their lane crosses another, or itself
+        for lane_id, cars in self.lanes.items():
+            crossings = self.crossings[lane_id]
+            samples = len(crossings)
+            for car, key in zip(cars, self.keys[lane_id]):
+                for other, lo, hi in crossings[int(key * samples) % samples]:
+                    other_cars = self.lanes.get(other, None)
+                    if other_cars is None:
+                        continue
+                    other_keys = self.keys[other]
+                    for j in range(bisect.bisect_left(other_keys, lo),
+                                   bisect.bisect_left(other_keys, hi)):
+                        if other_cars[j] is not car:
+                            yield car, other_cars[j]
+
+    def update(self):
+        if self.cars != self.track.participants:
+            self.rebuild()
+            self.contacts = None
+        else:
+            self.resort()
+
+        # Gather the contacts in the set of the update before last, and only
+        # place the cars that are worth checking
+        previous, contacts, positions = self.contacts, self.spare, \
+            self.positions
+        contacts.clear()
+        positions.clear()
+        collisions = []
+        for car, other in self.candidates():
+            if car.id > other.id:
+                car, other = other, car
+            ids = (car.id, other.id)
+            if ids in contacts:
+                continue
+            posn = positions.get(car.id, None)
+            if posn is None:
+                posn = positions[car.id] = car.get_posn()
+            other_posn = positions.get(other.id, None)
+            if other_posn is None:
+                other_posn = positions[other.id] = other.get_posn()
+            if math.dist(posn, other_posn) <= COLLISION_DISTANCE:
+                contacts.add(ids)
+                if previous is not None and ids not in previous:
+                    collisions.append((car, other))
+
+        # Only new contacts are collisions
+        self.contacts, self.spare = contacts, previous or set()
+        collisions.sort(key=lambda cars: (cars[0].id, cars[1].id))
+        return collisions
@@ -0,0 +1,134 @@
+# Module to test the detection of collisions between cars
+
+
+# local imports
+import math
+import random
+from .collisions import CollisionIndex, COLLISION_DISTANCE, SAMPLES
+from ..state import Track
+from ..state.extra import log
+
+# global definitions
+INIT_LEN = 10
+APART    = 0.5
+
+
+def touching(car, other):
+    return math.dist(car.get_posn(), other.get_posn()) <= COLLISION_DISTANCE
+
+
+def crossing(track):
+    """Places cars 0 and 1, which drive on different lanes, where their lanes
+    cross and they touch. Returns whether such a place was found
+    """
+    car, other = track.participants[0], track.participants[1]
+    for i in range(SAMPLES):
+        car.distance = i / SAMPLES
+        for j in range(SAMPLES):
+            other.distance = j / SAMPLES
+            if touching(car, other) and \
+                    abs(car.distance - other.distance) > 0.1:
+                return True
+    return False
+
+
+def test0():
+    """Test0: Two cars in the same lane collide once they touch
+       - Cars apart do not collide
+       - Cars that come into contact collide, as a pair
+    """
+    track, match = Track(num_participants=4), []
+    index = CollisionIndex(track)
+    car, other = track.participants[2], track.participants[3]
+
+    # cars apart do not collide
+    car.distance, other.distance = 0.3, 0.3 + APART
+    index.update()
+    match.append(index.update() == [])
+
+    # cars that come into contact collide, as a pair
+    other.distance = car.distance + 0.001
+    match.append(touching(car, other))
+    match.append(index.update() == [(car, other)])
+
+    log(match, test0.__doc__)
+
+
+def test1():
+    """Test1: Cars on crossing lanes collide where the lanes cross
+       - The lanes cross somewhere away from the start
+       - Cars that meet there collide
+    """
+    track, match = Track(num_participants=2), []
+    index = CollisionIndex(track)
+    car, other = track.participants
+
+    # the lanes cross somewhere away from the start
+    found = crossing(track)
+    match.append(found)
+    meet = car.distance, other.distance
+
+    # cars that meet there collide
+    car.distance, other.distance = meet[0], meet[1] + APART
+    index.update()
+    other.distance = meet[1]
+    match.append(found and index.update() == [(car, other)])
+
+    log(match, test1.__doc__)
+
+
+def test2():
+    """Test2: A contact that persists does not collide again
+       - Cars still touching on the next update do not collide
+       - Cars that part and touch again collide again
+    """
+    track, match = Track(num_participants=4), []
+    index = CollisionIndex(track)
+    car, other = track.participants[2], track.participants[3]
+
+    car.distance, other.distance = 0.6, 0.6 + APART
+    index.update()
+    other.distance = car.distance + 0.001
+    match.append(len(index.update()) == 1)
+
+    # cars still touching on the next update do not collide
+    car.distance, other.distance = 0.602, 0.603
+    match.append(touching(car, other) and index.update() == [])
+
+    # cars that part and touch again collide again
+    other.distance = car.distance + APART
+    match.append(index.update() == [])
+    other.distance = car.distance + 0.001
+    match.append(index.update() == [(car, other)])
+
+    log(match, test2.__doc__)
+
+
+def test3():
+    """Test3: The index finds the same collisions as checking every pair
+    """
+    track, match = Track(num_participants=INIT_LEN), []
+    index = CollisionIndex(track)
+    rng, previous = random.Random(0), None
+
+    for _ in range(50):
+        for car in track.participants:
+            car.distance = rng.random()
+        contacts = {(car.id, other.id)
+                    for car in track.participants
+                    for other in track.participants
+                    if car.id < other.id and touching(car, other)}
+        found = {(car.id, other.id) for car, other in index.update()}
+        match.append(found == (contacts - previous if previous is not None
+                               else set()))
+        previous = contacts
+
+    log(match, test3.__doc__)
+
+
+def run():
+    """Runs all tests"""
+    test0()
+    test1()
+    test2()
+    test3()
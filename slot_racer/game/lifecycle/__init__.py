@@ -0,0 +1,6 @@
+"""Module to run races one after another without growing"""
+
+# lifecycle module should provide access to the pools, the modes of a race and
+# the tuning of the garbage collector
+from .lifecycle import (Pool, Collector, LOBBY, COUNTDOWN, PLAY, RESULTS,
+                        COUNTDOWN_TIME, DEF_RESULTS_TIME)
@@ -0,0 +1,97 @@
+# Module to run races one after another on a long-running server
+#
+# A race goes through the modes LOBBY -> COUNTDOWN -> PLAY -> RESULTS, and is
+# then reset to the LOBBY for the next one. Nothing of a finished race is
+# kept: its cars go back to a Pool, from which the next race takes them again
+# instead of allocating new ones, and the Track and the room itself are reset
+# in place.
+#
+# The garbage collector is kept out of the ticks. The structures built at
+# startup are frozen, so collections never walk them again, and during a race
+# automatic collections are paused: only the young generation is collected,
+# right after a tick, and everything else once the race is reset.
+
+# package imports
+import gc
+
+# global variables
+LOBBY     = 'LOBBY'
+COUNTDOWN = 'COUNTDOWN'
+PLAY      = 'PLAY'
+RESULTS   = 'RESULTS'
+MODES     = (LOBBY, COUNTDOWN, PLAY, RESULTS)
+
+COUNTDOWN_TIME   = 5
+DEF_RESULTS_TIME = 10.0
+
+
+class Pool(object):
+    """Pool keeps the objects a race is done with for the next races
+
+    It is defined by the following attributes:
+    - factory: builds a new object from the arguments of acquire
+    - reset: puts a released object back in its initial state, given the same
+          arguments. The factory's class must have a reset behaviour if none is
+          given
+    - free: the objects waiting to be acquired again
+    - created/reused: the number of objects built and taken from the pool
+
+    And the following behaviours:
+    - acquire(*args): Takes an object from the pool, or builds one
+    - release(obj): Gives an object back to the pool
+    """
+    def __init__(self, factory, reset=None):
+        self.factory = factory
+        self.reset   = reset or factory.reset
+        self.free    = []
+        self.created = 0
+        self.reused  = 0
+
+    def acquire(self, *args):
+        if self.free:
+            obj = self.free.pop()
+            self.reset(obj, *args)
+            self.reused += 1
+            return obj
+        self.created += 1
+        return self.factory(*args)
+
+    def release(self, obj):
+        self.free.append(obj)
+
+
+class Collector(object):
+    """Collector keeps garbage collections out of the ticks of a race
+
+    It is defined by the following attributes:
+    - enabled: whether the collector is tuned at all. If not, every behaviour
+          leaves the garbage collector as it is
+
+    And the following behaviours:
+    - freeze(): Collects, then moves everything left out of the collector's
+          reach. Called once the long-lived structures are built
+    - pause(): Stops automatic collections, when a race starts
+    - collect_young(): Collects the young generation, between two ticks
+    - resume(): Collects everything and restarts automatic collections, when
+          the race is reset
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+    def freeze(self):
+        if self.enabled:
+            gc.collect()
+            gc.freeze()
+
+    def pause(self):
+        if self.enabled:
+            gc.disable()
+
+    def collect_young(self):
+        if self.enabled and not gc.isenabled():
+            gc.collect(0)
+
+    def resume(self):
+        if self.enabled:
+            gc.collect()
+            gc.enable()
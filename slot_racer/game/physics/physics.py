@@ -13,6 +13,30 @@ BIG_WIDTH = TRACK_WIDTH / 2.0 + 2.0 * math.sqrt(2) * SOCKET_WIDTH
 SMALL_WIDTH = BIG_WIDTH - 4.0 * SOCKET_WIDTH - 4.0 * math.sqrt(2) * SOCKET_WIDTH
 RATIO = SMALL_WIDTH / (SMALL_WIDTH + BIG_WIDTH)
 ACCELERATION = 0.2
+DEFAULTS = dict(SOCKET_WIDTH=SOCKET_WIDTH, TRACK_WIDTH=TRACK_WIDTH,
+                MAX_SPEED=MAX_SPEED, ACCELERATION=ACCELERATION)
+
+
+def configure(**constants):
+    """Changes the tunable constants (SOCKET_WIDTH, TRACK_WIDTH, MAX_SPEED and
+    ACCELERATION, unchanged ones keep their default) and recomputes the ones
+    derived from them. This only affects the current process
+    """
+    global SOCKET_WIDTH, TRACK_WIDTH, MAX_SPEED, ACCELERATION
+    global BIG_WIDTH, SMALL_WIDTH, RATIO
+    unknown = set(constants) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f'Unknown physics constants: {", ".join(unknown)}. '
+                         f'Choose from {", ".join(DEFAULTS)}')
+    values = dict(DEFAULTS, **constants)
+    SOCKET_WIDTH = values['SOCKET_WIDTH']
+    TRACK_WIDTH  = values['TRACK_WIDTH']
+    MAX_SPEED    = values['MAX_SPEED']
+    ACCELERATION = values['ACCELERATION']
+    BIG_WIDTH   = TRACK_WIDTH / 2.0 + 2.0 * math.sqrt(2) * SOCKET_WIDTH
+    SMALL_WIDTH = BIG_WIDTH - 4.0 * SOCKET_WIDTH - \
+        4.0 * math.sqrt(2) * SOCKET_WIDTH
+    RATIO = SMALL_WIDTH / (SMALL_WIDTH + BIG_WIDTH)
 
 
 def falling(car):
@@ -16,18 +16,21 @@ class FallData(object):
           allows us to enforce that
     - sent_to_server: Allows us to represent whether the fall data was
           communicated
-    - img_sizes: Enforces how the explosion should grow
+    - img_sizes: Enforces how the explosion should grow. It is the same for
+          every fall, so it is shared by the class
     """
+    img_sizes = (
+        (3, 3), (9, 8), (11, 14), (14, 24), (15, 19), (14, 19),
+        (16, 21), (16, 22), (16, 22), (18, 25), (15, 21), (13, 20),
+        (12, 21), (11, 23), (14, 23), (12, 4), (12, 3)
+    )
+    __slots__ = ('speed', 'distance', 'explosion_end', 'sent_to_server')
+
     def __init__(self, speed, distance, gametime):
         self.speed    = speed
         self.distance = distance
         self.explosion_end = gametime + 1.0
         self.sent_to_server = False
-        self.img_sizes = [
-            (3, 3), (9, 8), (11, 14), (14, 24), (15, 19), (14, 19),
-            (16, 21), (16, 22), (16, 22), (18, 25), (15, 21), (13, 20),
-            (12, 21), (11, 23), (14, 23), (12, 4), (12, 3)
-        ]
 
 
 class Event(object):
@@ -41,7 +44,12 @@ class Event(object):
     - speed: The speed of the car when this event occurred
     - distance: The distance the car had already travelled when this event
           occurred
+
+    Cars keep every event they go through, so events are slotted to keep them
+    small
     """
+    __slots__ = ('event_type', 'timestamp', 'speed', 'distance')
+
     def __init__(self, event_type, timestamp, speed=0.0, distance=0.0):
         self.event_type = event_type
         self.timestamp  = timestamp
@@ -7,7 +7,6 @@
 # package imports
 from .extra import FallData, Event
 from ..physics import physics
-import copy
 
 
 class Car(object):
@@ -34,19 +33,29 @@ class Car(object):
           acceleration
     - fall(speed, distance, gametime): Sets the fallen attribute in the case of
           a fall
+    - collide(distance, gametime): Makes the car fall where the server found
+          it collided with another
     - get_posn(): Returns the x, y coordinates for the distance of the car
     - append_events(events, gametime): Update events from the server
     - get_past_car(gametime): Useful in allowing us to create the lag we
           wanted to simulate in order to allow for updates to not fall prey to
-          the actual lag that might exist in network
+          the actual lag that might exist in network. The past car is rebuilt
+          from the last event before gametime, so it carries no other history
     - update(gametime): Runs updates on the car periodically, allowing it to
           behave as intended (falling, moving forward etc)
+    - reset(idx, model): Puts the car back at the start, as if it was new, so
+          that the car of a finished race can be used in the next one
     """
 
     # global representations independent of each car
     ACCELERATE        = "accelerate"
     STOP_ACCELERATING = "stop_accelerating"
 
+    # Cars are kept in slots rather than a __dict__: they are smaller and
+    # faster to read, and a misspelt attribute fails instead of being created
+    __slots__ = ('id', 'speed', 'distance', 'is_accelerating', 'prev_events',
+                 'fallen', 'model')
+
     def __init__(self, idx, model=None):
         self.id              = idx
         self.speed           = 0
@@ -56,18 +65,25 @@ class Car(object):
         self.fallen          = None
         self.model           = model
 
+    def reset(self, idx, model=None):
+        self.id              = idx
+        self.speed           = 0
+        self.distance        = 0
+        self.is_accelerating = False
+        self.prev_events.clear()
+        self.fallen          = None
+        self.model           = model
+
     def accelerate(self, gametime):
         self.is_accelerating = True
         self.prev_events.append(Event(self.ACCELERATE, gametime, self.speed,
                                       self.distance))
-        print(f'Accelerate: {self.prev_events[-1]}')
         return self.prev_events[-1]
 
     def stop_accelerating(self, gametime):
         self.is_accelerating = False
         self.prev_events.append(Event(self.STOP_ACCELERATING, gametime,
                                       self.speed, self.distance))
-        print(f'Stop Accelerating: {self.prev_events[-1]}')
         return self.prev_events[-1]
 
     def fall(self, speed, distance, gametime):
@@ -76,6 +92,14 @@ class Car(object):
         self.prev_events.append(Event('explode', gametime, 0, self.distance))
         return self.prev_events[-1]
 
+    def collide(self, distance, gametime):
+        # The server decided on the fall, so it is not reported back to it
+        self.speed = 0
+        self.distance = distance
+        event = self.fall(0, distance, gametime)
+        self.fallen.sent_to_server = True
+        return event
+
     def get_posn(self):
         return physics.calculate_posn(self)
 
@@ -93,9 +117,11 @@ class Car(object):
                 last_event = event
                 break
 
-        # Store a copy of your past to restore ourselves back to
-        prev_self = copy.deepcopy(self)
-        prev_self.fallen = None
+        # Build the car as it was at that event. Only the event it is replayed
+        # from is needed, so nothing else is copied
+        prev_self = Car(self.id, self.model)
+        if last_event:
+            prev_self.prev_events.append(last_event)
 
         # Set the car's to where it was at that event
         if last_event:
@@ -106,7 +132,6 @@ class Car(object):
             elif last_event.event_type == 'explode' and gametime - \
                     last_event.timestamp < 1.0:
                 prev_self.is_accelerating = False
-                print("explode", last_event)
                 prev_self.fall(last_event.speed, last_event.distance,
                                last_event.timestamp)
             else:
@@ -170,6 +195,8 @@ class Track(object):
     - check_winner(): Returns the winner if there is one otherwise returns None
     - update_all(gametime): Run an update on every car. This is to be called at
           each timestep
+    - reset(): Takes every car off the track and returns them, to be used in
+          the next race on the same track
     - generate_track_points(car_id): Returns the points for the track in the
           actual game visual (to be used by Renderer)
     """
@@ -224,6 +251,11 @@ class Track(object):
         else:
             raise Exception("There are no cars on the track!")
 
+    def reset(self):
+        cars = self.participants[:]
+        self.participants.clear()
+        return cars
+
     @staticmethod
     def generate_track_points(car_id):
         dummy = Car(car_id)
@@ -0,0 +1,4 @@
+"""Module to simulate races offline, to tune the game's physics and bots"""
+
+# montecarlo module should provide access to all the definitions in montecarlo.py
+from .montecarlo import parse_policy, run_race, make_races, run, save, report
@@ -0,0 +1,184 @@
+# Module to race bots offline, thousands of times, to tune the game
+#
+# A race is described by a plain dictionary (its physics constants, the policy
+# of every car, a seed...) so that it can be sent to a worker process. Every
+# race is simulated with the game's own Track, Cars, physics, collisions and
+# Drivers, at a fixed timestep and without any networking, and summarized with
+# RaceStats.
+# The races of a sweep are spread over a process pool, and their summaries are
+# aggregated per configuration.
+
+# package imports
+import sys
+import json
+import itertools
+import statistics
+import multiprocessing
+from ..game import state, physics, Driver, make_policy, CollisionIndex
+from ..results import RaceStats
+
+# global variables
+DEF_TIMESTEP = 1 / 30
+DEF_MAX_TIME = 600.0
+
+
+def parse_policy(spec):
+    """Parses 'name' or 'name:key=value,key=value' into (name, kwargs)"""
+    name, _, args = spec.partition(':')
+    kwargs = {}
+    for arg in filter(None, args.split(',')):
+        key, _, value = arg.partition('=')
+        kwargs[key.replace('-', '_')] = float(value)
+    return name, kwargs
+
+
+def run_race(race):
+    """Simulates one race and returns its summary. The race is a dictionary
+    with the following keys:
+    - policies: the (name, kwargs) policy of every car
+    - physics: the physics constants to race with
+    - seed: seeds the random policies
+    - timestep/max_time: the simulation step and the longest race
+    """
+    physics.configure(**race.get('physics', {}))
+    timestep = race.get('timestep', DEF_TIMESTEP)
+    max_time = race.get('max_time', DEF_MAX_TIME)
+
+    track = state.Track(num_participants=len(race['policies']))
+    drivers = []
+    for index, (name, kwargs) in enumerate(race['policies']):
+        if name == 'random':
+            kwargs = dict(kwargs, seed=race.get('seed', 0) * 1000 + index)
+        drivers.append(Driver(track.participants[index],
+                              make_policy(name, **kwargs)))
+
+    stats, winner, gametime = RaceStats(), None, 0.0
+    collisions = CollisionIndex(track)
+    while winner is None and gametime < max_time:
+        gametime += timestep
+        # Every car has a driver, which advances it before deciding
+        for driver in drivers:
+            driver.drive(gametime)
+        for pair in collisions.update():
+            for car in pair:
+                if car.fallen is None:
+                    car.collide(car.distance, gametime)
+        stats.tick(gametime, track)
+        winner = track.check_winner()
+
+    result = stats.result(gametime, track,
+                          winner.id if winner is not None else None)
+    for car in result['cars']:
+        car['policy'] = race['policies'][car['car_id']][0]
+    return dict(key=race['key'], **result)
+
+
+def make_races(physics_grid, policies, races, cars, seed=0, **options):
+    """Builds every race of a sweep: races races for each combination of the
+    physics constants in the grid ({constant: [values]}). The cars take the
+    policies in turn
+    """
+    names = sorted(physics_grid)
+    combinations = itertools.product(*(physics_grid[name] for name in names))
+    specs = [policies[index % len(policies)] for index in range(cars)]
+    for values in combinations:
+        constants = dict(zip(names, values))
+        key = json.dumps(constants, sort_keys=True)
+        for race in range(races):
+            yield dict(key=key, physics=constants, policies=specs,
+                       seed=seed + race, **options)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Aggregate(object):
+    """Aggregate sums up the races of one configuration
+
+    It is defined by the following attributes:
+    - races: the number of races
+    - unfinished: the number of races nobody won before max_time
+    - durations: the winning times
+    - lap_times: every lap time, by policy
+    - falls/time: the falls and the race time of every car, by policy
+    - wins: the number of wins, by policy
+    """
+    def __init__(self):
+        self.races      = 0
+        self.unfinished = 0
+        self.durations  = []
+        self.lap_times  = {}
+        self.falls      = {}
+        self.time       = {}
+        self.wins       = {}
+
+    def add(self, result):
+        self.races += 1
+        if result['winner'] is None:
+            self.unfinished += 1
+        else:
+            self.durations.append(result['duration'])
+        for car in result['cars']:
+            policy = car['policy']
+            self.lap_times.setdefault(policy, []).extend(car['lap_times'])
+            self.falls[policy] = self.falls.get(policy, 0) + car['falls']
+            self.time[policy] = self.time.get(policy, 0.0) + \
+                result['duration']
+            if car['car_id'] == result['winner']:
+                self.wins[policy] = self.wins.get(policy, 0) + 1
+
+    def summary(self):
+        durations = self.durations or [float('nan')]
+        policies = {}
+        for policy in sorted(self.time):
+            laps = self.lap_times.get(policy, [])
+            policies[policy] = dict(
+                win_rate=self.wins.get(policy, 0) / self.races,
+                falls_per_minute=60 * self.falls[policy] / self.time[policy],
+                mean_lap=statistics.mean(laps) if laps else None,
+                best_lap=min(laps) if laps else None
+            )
+        return dict(
+            races=self.races,
+            unfinished=self.unfinished,
+            duration_mean=statistics.mean(durations),
+            duration_p50=percentile(durations, 0.5),
+            duration_p95=percentile(durations, 0.95),
+            policies=policies
+        )
+
+
+def run(races, processes=None, chunksize=16):
+    """Runs the races over a process pool and returns the summary of every
+    configuration, by key
+    """
+    aggregates = {}
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(run_race, races, chunksize):
+            aggregates.setdefault(result['key'], Aggregate()).add(result)
+    return {key: aggregate.summary()
+            for key, aggregate in sorted(aggregates.items())}
+
+
+def save(summaries, path):
+    with open(path, 'w') as f:
+        json.dump([dict(physics=json.loads(key), **summary)
+                   for key, summary in summaries.items()], f)
+
+
+def report(summaries, out=sys.stdout):
+    for key, summary in summaries.items():
+        constants = ', '.join(f'{name}={value}'
+                              for name, value in json.loads(key).items())
+        print(f'{constants or "default physics"}: {summary["races"]} races, '
+              f'{summary["unfinished"]} unfinished, winning time '
+              f'{summary["duration_mean"]:.1f}s mean, '
+              f'{summary["duration_p95"]:.1f}s p95', file=out)
+        for policy, stats in summary['policies'].items():
+            mean_lap = stats['mean_lap']
+            mean_lap = f'{mean_lap:6.2f}s' if mean_lap is not None else '     -'
+            print(f'    {policy:<8} wins {stats["win_rate"]:6.1%}  '
+                  f'falls/min {stats["falls_per_minute"]:5.2f}  '
+                  f'mean lap {mean_lap}', file=out)
@@ -0,0 +1,5 @@
+"""Module to record races and replay them"""
+
+# replay module should provide access to all the definitions in replay.py
+from .replay import RaceRecorder, RaceLog, Replayer
+
@@ -0,0 +1,399 @@
+# Module to record races to a compact binary log and replay them
+#
+# A race log is a header followed by records. Every record starts with a tag
+# and the server gametime it was written at:
+# - EVENT: an event the server ingested from a client
+# - KEYFRAME: the full state of every Car on the Track
+# - WINNER: the id of the winning car
+# - INDEX: (written on close) the gametime and file offset of every keyframe
+# The file ends with the offset of the INDEX record, so a reader can load the
+# index without scanning. If the server died before closing the log, the
+# reader rebuilds the index with a single scan instead.
+
+# package imports
+import os
+import time
+import struct
+import bisect
+import threading
+from ..game import state, Event, FallData
+
+# global variables
+MAGIC         = b'SLOTRACE'
+INDEX_MAGIC   = b'SLOTIDX\0'
+VERSION       = 1
+HEADER        = struct.Struct('<8sHd')
+RECORD        = struct.Struct('<Bd')
+EVENT         = struct.Struct('<HBddd')
+COUNT         = struct.Struct('<I')
+CAR           = struct.Struct('<HBBdddddd')
+WINNER        = struct.Struct('<H')
+INDEX_ENTRY   = struct.Struct('<dQ')
+TRAILER       = struct.Struct('<Q8s')
+
+TAG_EVENT, TAG_KEYFRAME, TAG_WINNER, TAG_INDEX = 1, 2, 3, 4
+RECORD_SIZES = {TAG_EVENT: EVENT.size, TAG_WINNER: WINNER.size}
+CHUNK_SIZE   = 64 * 1024
+
+EVENT_TYPES = [None, state.Car.ACCELERATE, state.Car.STOP_ACCELERATING,
+               'explode']
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+ACCELERATING, HAS_EVENT, FALLEN = 1, 2, 4
+
+
+class RaceRecorder(object):
+    """RaceRecorder appends a race to a log file without blocking the server.
+    Records are packed into an in-memory buffer on the calling thread, and a
+    writer thread flushes that buffer to disk
+
+    It is defined by the following attributes:
+    - path: the file the race is written to
+    - keyframe_interval: gametime between two keyframes
+    - next_keyframe: the gametime at which the next keyframe is due
+    - keyframes: list of (gametime, offset) pairs, written as the index
+    - position: the file offset the next record will be written at
+    - buffer: records waiting to be flushed
+    - flush_interval: maximum time records wait in the buffer
+
+    And the following behaviours:
+    - event(gametime, car_id, event): Records an ingested event
+    - tick(gametime, track): Records a keyframe if one is due
+    - keyframe(gametime, track): Records the state of every Car on the track
+    - winner(gametime, car_id): Records the winner
+    - close(): Writes the index and closes the file
+    """
+    def __init__(self, path, keyframe_interval=1.0, flush_interval=0.5):
+        self.path              = path
+        self.keyframe_interval = keyframe_interval
+        self.flush_interval    = flush_interval
+        self.next_keyframe     = 0.0
+        self.keyframes         = []
+        self.buffer            = bytearray(HEADER.pack(MAGIC, VERSION,
+                                                       keyframe_interval))
+        self.position          = len(self.buffer)
+        self.file              = open(path, 'wb')
+        self.lock              = threading.Lock()
+        self.wakeup            = threading.Event()
+        self.running           = True
+        self.writer            = threading.Thread(target=self._write,
+                                                  daemon=True)
+        self.writer.start()
+
+    def _append(self, record):
+        with self.lock:
+            self.buffer += record
+            self.position += len(record)
+
+    def _write(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            data, self.buffer = self.buffer, bytearray()
+        if data:
+            self.file.write(data)
+            self.file.flush()
+
+    def event(self, gametime, car_id, event):
+        code = EVENT_CODES.get(event.event_type, None)
+        if code is None:
+            return
+        self._append(RECORD.pack(TAG_EVENT, gametime) +
+                     EVENT.pack(car_id, code, event.timestamp, event.speed,
+                                event.distance))
+
+    def tick(self, gametime, track):
+        if gametime >= self.next_keyframe:
+            self.keyframe(gametime, track)
+
+    def keyframe(self, gametime, track):
+        record = bytearray(RECORD.pack(TAG_KEYFRAME, gametime))
+        record += COUNT.pack(len(track.participants))
+        for car in track.participants:
+            record += pack_car(car)
+        with self.lock:
+            self.keyframes.append((gametime, self.position))
+            self.buffer += record
+            self.position += len(record)
+        self.next_keyframe = gametime + self.keyframe_interval
+
+    def winner(self, gametime, car_id):
+        self._append(RECORD.pack(TAG_WINNER, gametime) + WINNER.pack(car_id))
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        self.writer.join()
+
+        gametime = self.keyframes[-1][0] if self.keyframes else 0.0
+        index = bytearray(RECORD.pack(TAG_INDEX, gametime))
+        index += COUNT.pack(len(self.keyframes))
+        for entry in self.keyframes:
+            index += INDEX_ENTRY.pack(*entry)
+        index += TRAILER.pack(self.position, INDEX_MAGIC)
+        self._append(index)
+        self.flush()
+        self.file.close()
+
+
+def pack_car(car):
+    """Packs everything needed to restore a Car, including its last event since
+    Car.update simulates forward from it
+    """
+    flags, code, timestamp, speed, distance = 0, 0, 0.0, 0.0, 0.0
+    if car.is_accelerating:
+        flags |= ACCELERATING
+    if car.prev_events:
+        last = car.prev_events[-1]
+        flags |= HAS_EVENT
+        code = EVENT_CODES.get(last.event_type, 0)
+        timestamp, speed, distance = last.timestamp, last.speed, last.distance
+    explosion_end = 0.0
+    if car.fallen:
+        flags |= FALLEN
+        explosion_end = car.fallen.explosion_end
+    return CAR.pack(car.id, flags, code, timestamp, speed, distance,
+                    explosion_end, car.speed, car.distance)
+
+
+def unpack_car(data, offset):
+    """Restores a Car packed by pack_car. Returns the car and the new offset"""
+    (idx, flags, code, timestamp, speed, distance, explosion_end, car_speed,
+     car_distance) = CAR.unpack_from(data, offset)
+    car = state.Car(idx)
+    car.speed, car.distance = car_speed, car_distance
+    car.is_accelerating = bool(flags & ACCELERATING)
+    if flags & HAS_EVENT:
+        car.prev_events.append(Event(EVENT_TYPES[code], timestamp, speed,
+                                     distance))
+    if flags & FALLEN:
+        car.fallen = FallData(0, car_distance, explosion_end - 1.0)
+        car.fallen.sent_to_server = True
+    return car, offset + CAR.size
+
+
+class RaceLog(object):
+    """RaceLog reads a race log and seeks into it through the keyframe index
+
+    It is defined by the following attributes:
+    - path: the file the race was written to
+    - keyframe_interval: gametime between two keyframes
+    - index: sorted gametimes of the keyframes
+    - offsets: file offsets of the keyframes, matching index
+    - end: file offset where the records stop (the INDEX record, or EOF)
+    - duration: gametime of the last record
+
+    And the following behaviours:
+    - records(offset): Yields (tag, gametime, payload) from the given offset
+    - seek(gametime): Returns a Track as it was at the given gametime
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, version, self.keyframe_interval = HEADER.unpack(
+            self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a race log')
+        self.index, self.offsets = [], []
+        self.duration = 0.0
+        if not self._load_index():
+            self._scan_index()
+
+    def close(self):
+        self.file.close()
+
+    def _load_index(self):
+        size = self.file.seek(0, os.SEEK_END)
+        if size < HEADER.size + TRAILER.size:
+            return False
+        self.file.seek(size - TRAILER.size)
+        offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+        if magic != INDEX_MAGIC:
+            return False
+        self.file.seek(offset)
+        tag, gametime = RECORD.unpack(self.file.read(RECORD.size))
+        count, = COUNT.unpack(self.file.read(COUNT.size))
+        data = self.file.read(count * INDEX_ENTRY.size)
+        for i in range(count):
+            keyframe_time, keyframe_offset = INDEX_ENTRY.unpack_from(
+                data, i * INDEX_ENTRY.size)
+            self.index.append(keyframe_time)
+            self.offsets.append(keyframe_offset)
+        self.end = offset
+        # The last records follow the last keyframe, at most one interval on
+        for tag, gametime, _ in self.records(self.offsets[-1] if count else
+                                             HEADER.size):
+            self.duration = gametime
+        return True
+
+    def _scan_index(self):
+        self.end = self.file.seek(0, os.SEEK_END)
+        offset = HEADER.size
+        for tag, gametime, _, record_offset in self._read(offset):
+            if tag == TAG_KEYFRAME:
+                self.index.append(gametime)
+                self.offsets.append(record_offset)
+            self.duration = gametime
+
+    def records(self, offset):
+        for tag, gametime, payload, _ in self._read(offset):
+            yield tag, gametime, payload
+
+    def _read(self, offset, chunk_size=CHUNK_SIZE):
+        """Yields (tag, gametime, (data, position), offset) for every record
+        from the given offset. The file is read in chunks, so stopping early
+        only costs the chunks that were actually needed
+        """
+        data, position = b'', 0
+        while True:
+            # Make sure the whole record header and payload are in memory
+            needed = RECORD.size
+            if position + needed <= len(data):
+                tag = data[position]
+                if tag == TAG_KEYFRAME and \
+                        position + needed + COUNT.size <= len(data):
+                    count, = COUNT.unpack_from(data, position + needed)
+                    needed += COUNT.size + count * CAR.size
+                elif tag == TAG_KEYFRAME:
+                    needed += COUNT.size
+                else:
+                    needed += RECORD_SIZES.get(tag, 0)
+            if position + needed > len(data):
+                if offset >= self.end:
+                    return  # the log ends here, possibly mid-record
+                self.file.seek(offset)
+                chunk = self.file.read(min(max(chunk_size, needed),
+                                           self.end - offset))
+                data, position = data[position:] + chunk, 0
+                offset += len(chunk)
+                continue
+
+            tag, gametime = RECORD.unpack_from(data, position)
+            if tag not in RECORD_SIZES and tag != TAG_KEYFRAME:
+                return
+            record_offset = offset - len(data) + position
+            yield tag, gametime, (data, position + RECORD.size), record_offset
+            position += needed
+
+    def seek(self, gametime):
+        """Returns (track, offset, winner): the Track as it was at the given
+        gametime, the offset of the first record after it and the winner so
+        far. Only the records since the closest keyframe are replayed, or
+        every record if the log has no keyframe at all
+        """
+        i = bisect.bisect_right(self.index, gametime) - 1
+        if i < 0 and self.index:
+            raise ValueError(f'No keyframe before gametime {gametime}')
+
+        # A race that ended before its first keyframe, or a log cut short
+        # before it, is replayed from the start
+        start = self.offsets[i] if self.index else HEADER.size
+        track, offset, winner = state.Track(), start, None
+        for tag, record_time, (data, position), record_offset in \
+                self._read(offset):
+            offset = record_offset
+            if record_time > gametime:
+                break
+            if tag == TAG_KEYFRAME and record_offset == start:
+                track = read_keyframe(data, position)
+            else:
+                winner = apply_record(track, tag, record_time, data, position,
+                                      winner)
+        else:
+            offset = self.end
+        if track.participants:
+            track.update_all(gametime)
+        return track, offset, winner
+
+
+def read_keyframe(data, position):
+    track = state.Track()
+    count, = COUNT.unpack_from(data, position)
+    position += COUNT.size
+    for _ in range(count):
+        car, position = unpack_car(data, position)
+        track.add_participant(car, car.id)
+    return track
+
+
+def apply_record(track, tag, gametime, data, position, winner=None):
+    """Applies an EVENT or WINNER record to the track, returns the winner"""
+    if tag == TAG_EVENT:
+        car_id, code, timestamp, speed, distance = EVENT.unpack_from(data,
+                                                                     position)
+        car = track.get_car_by_id(car_id)
+        if car is not None:
+            car.append_events([Event(EVENT_TYPES[code], timestamp, speed,
+                                     distance)], gametime)
+    elif tag == TAG_WINNER:
+        winner, = WINNER.unpack_from(data, position)
+    return winner
+
+
+class Replayer(object):
+    """Replayer streams a RaceLog forward in time
+
+    It is defined by the following attributes:
+    - log: the RaceLog being replayed
+    - track: the Track as of gametime
+    - gametime: the current replay time
+    - winner: id of the winning car, if it has been recorded yet
+
+    And the following behaviours:
+    - seek(gametime): Jumps to the given gametime
+    - advance(gametime): Moves the replay forward to the given gametime
+    - play(consumer, start, fps, speed): Feeds every frame to a headless
+          consumer, which is called with (gametime, track, winner)
+    """
+    def __init__(self, log, gametime=0.0):
+        self.log = log
+        self.seek(gametime)
+
+    def seek(self, gametime):
+        first = self.log.index[0] if self.log.index else 0.0
+        gametime = min(max(gametime, first), self.log.duration)
+        self.track, self.offset, self.winner = self.log.seek(gametime)
+        self.gametime = gametime
+        self.pending  = self.log._read(self.offset)
+        self.next     = next(self.pending, None)
+
+    def advance(self, gametime):
+        if gametime < self.gametime:
+            return self.seek(gametime)
+        while self.next is not None and self.next[1] <= gametime:
+            tag, record_time, (data, position), _ = self.next
+            if tag != TAG_KEYFRAME:
+                self.winner = apply_record(self.track, tag, record_time, data,
+                                           position, self.winner)
+            self.next = next(self.pending, None)
+        self.gametime = gametime
+        if self.track.participants:
+            self.track.update_all(gametime)
+
+    @property
+    def finished(self):
+        return self.next is None and self.gametime >= self.log.duration
+
+    def play(self, consumer, start=0.0, fps=30, speed=None):
+        """Replays from start until the end of the log. With a speed, frames
+        are paced in real time (speed 1.0 is the original pace), otherwise
+        they are produced as fast as the consumer takes them
+        """
+        self.seek(start)
+        start, began = self.gametime, time.monotonic()
+        while True:
+            consumer(self.gametime, self.track, self.winner)
+            if self.finished:
+                break
+            gametime = min(self.gametime + 1 / fps, self.log.duration)
+            if speed:
+                delay = began + (gametime - start) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self.advance(gametime)
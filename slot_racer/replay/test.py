@@ -0,0 +1,147 @@
+# Module to test the recording of races and their replay
+
+
+# local imports
+import os
+import shutil
+import tempfile
+from .replay import RaceRecorder, RaceLog, Replayer
+from ..game.state import Track
+from ..game.state.extra import log
+
+# global definitions
+INIT_LEN = 3
+DEF_TS   = 0.05
+DURATION = 6.0
+SEEKS    = (0.0, 0.4, 1.0, 2.55, 3.0, 4.95, DURATION)
+TMP      = None
+
+
+def race(path, close=True):
+    """Races INIT_LEN cars while recording them, every car toggling its
+    throttle at its own pace. Returns the (speed, distance) of every car at
+    the gametimes in SEEKS
+    """
+    track, recorder = Track(num_participants=INIT_LEN), RaceRecorder(path)
+    states, step = {}, 0
+    while step * DEF_TS <= DURATION + 1e-9:
+        gametime = round(step * DEF_TS, 6)
+        for car in track.participants:
+            if step % (10 + 5 * car.id) == 0:
+                event = car.stop_accelerating(gametime) \
+                    if car.is_accelerating else car.accelerate(gametime)
+                recorder.event(gametime, car.id, event)
+        track.update_all(gametime)
+        recorder.tick(gametime, track)
+        if gametime in SEEKS:
+            states[gametime] = positions(track)
+        step += 1
+    recorder.winner(DURATION, 1)
+    if close:
+        recorder.close()
+    else:
+        recorder.flush()
+    return states
+
+
+def positions(track):
+    return [(car.id, round(car.speed, 9), round(car.distance, 9))
+            for car in track.participants]
+
+
+def test0():
+    """Test0: Seeking into a closed log restores the race
+       - The index is read from the end of the file
+       - The cars are where they were at every seek
+       - The winner is only known once it was recorded
+    """
+    path, match = os.path.join(TMP, 'closed.log'), []
+    states = race(path)
+    race_log = RaceLog(path)
+
+    # the index is read from the end of the file
+    match.append(len(race_log.index) == int(DURATION) + 1)
+
+    # the cars are where they were at every seek
+    for gametime, expected in states.items():
+        track, _, winner = race_log.seek(gametime)
+        match.append(positions(track) == expected)
+
+    # the winner is only known once it was recorded
+    match.append(race_log.seek(DURATION - 1)[2] is None)
+    match.append(race_log.seek(DURATION)[2] == 1)
+    race_log.close()
+
+    log(match, test0.__doc__)
+
+
+def test1():
+    """Test1: A log that was never closed is indexed by scanning it
+    """
+    path, match = os.path.join(TMP, 'open.log'), []
+    states = race(path, close=False)
+    race_log = RaceLog(path)
+
+    match.append(len(race_log.index) == int(DURATION) + 1)
+    for gametime, expected in states.items():
+        match.append(positions(race_log.seek(gametime)[0]) == expected)
+    race_log.close()
+
+    log(match, test1.__doc__)
+
+
+def test2():
+    """Test2: Replaying forward matches seeking
+       - Advancing frame by frame
+       - Going back in time
+    """
+    path, match = os.path.join(TMP, 'replay.log'), []
+    states = race(path)
+    race_log = RaceLog(path)
+    replayer = Replayer(race_log)
+
+    # advancing frame by frame
+    for gametime in sorted(states):
+        replayer.advance(gametime)
+        match.append(positions(replayer.track) == states[gametime])
+    match.append(replayer.finished and replayer.winner == 1)
+
+    # going back in time
+    replayer.advance(1.0)
+    match.append(positions(replayer.track) == states[1.0])
+    race_log.close()
+
+    log(match, test2.__doc__)
+
+
+def test3():
+    """Test3: A log without keyframes is replayed from the start
+    """
+    path, match = os.path.join(TMP, 'empty.log'), []
+    recorder = RaceRecorder(path)
+    recorder.winner(0.5, 2)
+    recorder.close()
+    race_log = RaceLog(path)
+
+    match.append(race_log.index == [])
+    track, _, winner = race_log.seek(0.5)
+    match.append(track.participants == [] and winner == 2)
+    frames = []
+    Replayer(race_log).play(lambda *frame: frames.append(frame))
+    match.append(frames[-1][2] == 2)
+    race_log.close()
+
+    log(match, test3.__doc__)
+
+
+def run():
+    """Runs all tests"""
+    global TMP
+    TMP = tempfile.mkdtemp()
+    try:
+        test0()
+        test1()
+        test2()
+        test3()
+    finally:
+        shutil.rmtree(TMP)
@@ -0,0 +1,4 @@
+"""Module to keep race results and the leaderboard"""
+
+# results module should provide access to all the definitions in results.py
+from .results import RaceStats, ResultsStore
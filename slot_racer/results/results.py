@@ -0,0 +1,257 @@
+# Module to keep the results of every race and the players' leaderboard
+#
+# RaceStats follows a race on the server's track and builds its result once
+# there is a winner. ResultsStore keeps the results in an SQLite file: the
+# server only queues them, and a writer thread writes them in batches, one
+# transaction at a time. Next to the raw results, the store maintains a
+# players table summing every player's races, so that the leaderboard is read
+# from an index instead of being aggregated over every result.
+
+# package imports
+import math
+import time
+import queue
+import sqlite3
+import threading
+
+# global variables
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS races (
+    id       INTEGER PRIMARY KEY,
+    started  REAL NOT NULL,
+    duration REAL NOT NULL,
+    winner   INTEGER,
+    cars     INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    race_id  INTEGER NOT NULL REFERENCES races (id),
+    car_id   INTEGER NOT NULL,
+    player   TEXT,
+    position INTEGER NOT NULL,
+    laps     INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    best_lap REAL,
+    falls    INTEGER NOT NULL,
+    PRIMARY KEY (race_id, car_id)
+);
+CREATE TABLE IF NOT EXISTS laps (
+    race_id  INTEGER NOT NULL,
+    car_id   INTEGER NOT NULL,
+    lap      INTEGER NOT NULL,
+    time     REAL NOT NULL,
+    PRIMARY KEY (race_id, car_id, lap)
+);
+CREATE TABLE IF NOT EXISTS players (
+    player   TEXT PRIMARY KEY,
+    races    INTEGER NOT NULL DEFAULT 0,
+    wins     INTEGER NOT NULL DEFAULT 0,
+    falls    INTEGER NOT NULL DEFAULT 0,
+    best_lap REAL,
+    last_race INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_by_player ON results (player, race_id);
+CREATE INDEX IF NOT EXISTS races_by_start ON races (started);
+CREATE INDEX IF NOT EXISTS players_by_wins ON players (wins DESC, races);
+CREATE INDEX IF NOT EXISTS players_by_best_lap ON players (best_lap);
+'''
+FLUSH_POLL = 0.5
+LEADERBOARDS = {
+    'wins': 'ORDER BY wins DESC, races',
+    'best_lap': 'WHERE best_lap IS NOT NULL ORDER BY best_lap'
+}
+
+
+class RaceStats(object):
+    """RaceStats follows the cars of a race, tick by tick
+
+    It is defined by the following attributes:
+    - laps: the gametime every lap of every car was completed at, by car id
+    - falls: the number of times every car fell off, by car id
+    - fallen: the cars that are currently fallen
+
+    And the following behaviours:
+    - tick(gametime, track): Records the laps completed and falls since the
+          last tick
+    - result(gametime, track, winner): The result of the race, ready for the
+          ResultsStore
+    - reset(): Forgets the race, for the next one
+    """
+    def __init__(self):
+        self.laps   = {}
+        self.falls  = {}
+        self.fallen = set()
+
+    def reset(self):
+        self.laps.clear()
+        self.falls.clear()
+        self.fallen.clear()
+
+    def tick(self, gametime, track):
+        for car in track.participants:
+            laps = self.laps.setdefault(car.id, [])
+            while len(laps) < math.floor(car.distance):
+                laps.append(gametime)
+            if car.fallen is not None and car.id not in self.fallen:
+                self.fallen.add(car.id)
+                self.falls[car.id] = self.falls.get(car.id, 0) + 1
+            elif car.fallen is None:
+                self.fallen.discard(car.id)
+
+    def result(self, gametime, track, winner):
+        cars = sorted(track.participants,
+                      key=lambda car: (car.id != winner, -car.distance))
+        results = []
+        for position, car in enumerate(cars, 1):
+            done = self.laps.get(car.id, [])
+            lap_times = [end - start for start, end in zip([0.0] + done, done)]
+            results.append(dict(
+                car_id=car.id,
+                position=position,
+                laps=len(done),
+                distance=car.distance,
+                lap_times=lap_times,
+                best_lap=min(lap_times, default=None),
+                falls=self.falls.get(car.id, 0)
+            ))
+        return dict(duration=gametime, winner=winner, cars=results)
+
+
+class ResultsStore(object):
+    """ResultsStore records race results without blocking the server
+
+    It is defined by the following attributes:
+    - path: the SQLite file the results are kept in
+    - pending: the races waiting to be written
+    - batch_size: the most races written in one transaction. Races that
+          queue up while a batch is written go in the next one
+    - failed: the number of races that could not be written. A batch that
+          fails is rolled back and logged, and the writer goes on
+
+    And the following behaviours:
+    - record(result, players): Queues a race result, with the name of the
+          player of every car (cars without one are kept out of the players
+          table)
+    - flush(): Waits until every queued race is written. Fails if the
+          writer has stopped, instead of waiting forever
+    - leaderboard(by, limit): The best players, by 'wins' or 'best_lap'
+    - history(player, limit): The last races of a player
+    - close(): Writes what is left and stops the writer
+    """
+    def __init__(self, path, batch_size=64):
+        self.path       = path
+        self.batch_size = batch_size
+        self.pending    = queue.Queue()
+        self.failed     = 0
+        self.readers    = threading.local()
+
+        connection = self.connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def record(self, result, players=None):
+        self.pending.put((time.time(), result, dict(players or {})))
+
+    def _write(self):
+        connection = self.connect()
+        running = True
+        while running:
+            batch = [self.pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            # None closes the store, an Event asks to be told once everything
+            # before it is written
+            races = [race for race in batch if isinstance(race, tuple)]
+            if races:
+                try:
+                    with connection:
+                        for started, result, players in races:
+                            self._insert(connection, started, result, players)
+                except Exception as exc:
+                    self.failed += len(races)
+                    print(f'Could not write {len(races)} race results: '
+                          f'{exc!r}')
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    item.set()
+        connection.close()
+
+    @staticmethod
+    def _insert(connection, started, result, players):
+        cursor = connection.execute(
+            'INSERT INTO races (started, duration, winner, cars) '
+            'VALUES (?, ?, ?, ?)',
+            (started, result['duration'], result['winner'],
+             len(result['cars'])))
+        race_id = cursor.lastrowid
+        for car in result['cars']:
+            player = players.get(car['car_id'], None)
+            connection.execute(
+                'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (race_id, car['car_id'], player, car['position'], car['laps'],
+                 car['distance'], car['best_lap'], car['falls']))
+            connection.executemany(
+                'INSERT INTO laps VALUES (?, ?, ?, ?)',
+                [(race_id, car['car_id'], lap, lap_time)
+                 for lap, lap_time in enumerate(car['lap_times'], 1)])
+            if player is None:
+                continue
+            connection.execute(
+                'INSERT OR IGNORE INTO players (player) VALUES (?)', (player,))
+            connection.execute(
+                'UPDATE players SET races = races + 1, wins = wins + :won, '
+                'falls = falls + :falls, last_race = :race, best_lap = CASE '
+                'WHEN :lap IS NULL THEN best_lap '
+                'WHEN best_lap IS NULL OR :lap < best_lap THEN :lap '
+                'ELSE best_lap END WHERE player = :player',
+                dict(won=int(car['car_id'] == result['winner']),
+                     falls=car['falls'], race=race_id, lap=car['best_lap'],
+                     player=player))
+
+    def flush(self):
+        done = threading.Event()
+        self.pending.put(done)
+        while not done.wait(FLUSH_POLL):
+            if not self.writer.is_alive():
+                raise RuntimeError('The results writer has stopped')
+
+    def reader(self):
+        """Every thread reads through its own connection"""
+        connection = getattr(self.readers, 'connection', None)
+        if connection is None:
+            connection = self.readers.connection = self.connect()
+        return connection
+
+    def leaderboard(self, by='wins', limit=10):
+        if by not in LEADERBOARDS:
+            raise ValueError(f'Unknown leaderboard: {by}. '
+                             f'Choose from {", ".join(LEADERBOARDS)}')
+        return self.reader().execute(
+            'SELECT player, races, wins, falls, best_lap FROM players '
+            f'{LEADERBOARDS[by]} LIMIT ?', (limit,)).fetchall()
+
+    def history(self, player, limit=20):
+        return self.reader().execute(
+            'SELECT races.id, races.started, results.position, results.laps, '
+            'results.best_lap, results.falls FROM results '
+            'JOIN races ON races.id = results.race_id '
+            'WHERE results.player = ? ORDER BY results.race_id DESC LIMIT ?',
+            (player, limit)).fetchall()
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
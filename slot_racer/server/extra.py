@@ -3,14 +3,19 @@
 #
 # Module to implement the extraneous definitions we might need in a server
 
-from ..game import Track
+from ..game import Track, LOBBY
 
 
 class ServerClient(object):
-    def __init__(self, id, socket, latency):
+    __slots__ = ('id', 'socket', 'latency', 'name', 'bucket', 'held')
+
+    def __init__(self, id, socket, latency, bucket=None):
         self.id = id
         self.socket = socket
         self.latency = latency
+        self.name = None
+        self.bucket = bucket
+        self.held = None
 
 
 class ServerState(object):
@@ -24,9 +29,16 @@ class ServerState(object):
           [client_ids, latencies]
     - track: the server's copy of the track which is updated/modified based on
           client updates
+    - mode: where the race is in its lifecycle, LOBBY, COUNTDOWN, PLAY or
+          RESULTS
+    - start_time: the time the race starts at on the server's clock, None in
+          the lobby
+
+    And the following behaviours:
+    - reset(): Sends the room back to the lobby, keeping its clients
     """
     def __init__(self):
-        self.mode   = 'LOBBY'
+        self.mode   = LOBBY
         self.clients = {}
         self.track   = Track()
         self.max_id  = 0
@@ -35,15 +47,27 @@ class ServerState(object):
     def get_update(self):
         pass
 
-    def add_client(self, client_socket, client_latency):
-        client = ServerClient(self.max_id, client_socket, client_latency)
+    def reset(self):
+        self.mode       = LOBBY
+        self.start_time = None
+        for client in self.clients.values():
+            client.held = None
+
+    def add_client(self, client_socket, client_latency, bucket=None):
+        client = ServerClient(self.max_id, client_socket, client_latency,
+                              bucket)
         self.clients[client.socket] = client
         self.max_id += 1
         return client.id
 
     def remove_client(self, client_socket):
-        self.track.remove_participant(self.clients[client_socket].id)
-        del self.clients[client_socket]
+        client = self.clients.pop(client_socket, None)
+        if client is not None and self.track.get_car_by_id(client.id):
+            self.track.remove_participant(client.id)
 
     def get_ids(self):
         return [client.id for client in self.clients.values()]
+
+    def get_names(self):
+        return {client.id: client.name for client in self.clients.values()
+                if client.name is not None}
@@ -0,0 +1,79 @@
+# Module to keep noisy clients from flooding the server with inputs
+#
+# Every throttle event carries the speed and distance of the car when it
+# happened, and a car only moves on from its last event, so only the last
+# throttle event of a car in a tick matters: the ones before it are coalesced
+# away without changing where the car ends up. Explode events are always kept.
+#
+# On top of that, every client's inputs go through a token bucket. An input
+# over the rate is not dropped outright, since it may be the last one the
+# client sends: it is held, replacing the one held before it, and applied on
+# the first tick the client has a token for it again.
+#
+# The simulation is shared by every client, so an input it could not apply
+# is rejected as it is read, before it is queued for a tick.
+
+# package imports
+import math
+from ..game import Car
+
+# global variables
+THROTTLE          = (Car.ACCELERATE, Car.STOP_ACCELERATING)
+GAME_EVENTS       = THROTTLE + ('explode',)
+DEF_INPUT_RATE    = 30.0
+DEF_INPUT_BURST   = 30
+
+
+def coalesce(events):
+    """Keeps only the last throttle event of every car, in order, from a tick's
+    (car id, received gametime, message) events. Returns the kept events
+    """
+    last = {}
+    for index, (car_id, _, parsed) in enumerate(events):
+        if parsed.subject in THROTTLE:
+            last[car_id] = index
+    return [event for index, event in enumerate(events)
+            if event[2].subject not in THROTTLE or last[event[0]] == index]
+
+
+def valid_event(subject, data):
+    """Whether a client's game event can be applied: a known subject, and
+    data starting with the timestamp, speed and distance of the car
+    """
+    if subject not in GAME_EVENTS or not isinstance(data, (list, tuple)) or \
+            len(data) < 3:
+        return False
+    return all(isinstance(value, (int, float)) and
+               not isinstance(value, bool) and math.isfinite(value)
+               for value in data[:3])
+
+
+class TokenBucket(object):
+    """TokenBucket allows a steady rate of inputs with some bursts
+
+    It is defined by the following attributes:
+    - rate: the tokens added every second
+    - burst: the most tokens the bucket holds
+    - tokens: the tokens currently in the bucket
+    - updated: the time the tokens were last counted
+
+    And the following behaviours:
+    - take(now): Takes a token if there is one, returns whether there was
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate=DEF_INPUT_RATE, burst=DEF_INPUT_BURST):
+        self.rate    = rate
+        self.burst   = burst
+        self.tokens  = float(burst)
+        self.updated = None
+
+    def take(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
@@ -4,15 +4,27 @@
 # Module to create a Server and its associated behaviours
 
 # package imports
-import time
 import asyncio
 import websockets
-from datetime import datetime, timedelta
 from threading import Lock
+import hmac
 import statistics
-from ..game import Car, Track, Event
-from ..communication import Serializer
+from ..communication import (Serializer, Clock, TICK_TIME, backend,
+                             OnDemandProfiler, Compressor)
+from ..game import (Collector, LOBBY, COUNTDOWN, PLAY, RESULTS, COUNTDOWN_TIME,
+                    DEF_RESULTS_TIME)
+from ..communication.tracing import get_trace, stamp
 from .extra import ServerState
+from .spectator import SpectatorChannel
+from .simulation import SimulationWorker, INLINE
+from .inputs import (coalesce, valid_event, TokenBucket, DEF_INPUT_RATE,
+                     DEF_INPUT_BURST)
+from ..results import ResultsStore
+
+# global variables
+SPECTATE_PATH = '/spectate'
+ADMIN_PATH = '/admin'
+MAX_NAME_LENGTH = 32
 
 
 class Server(object):
@@ -26,14 +38,62 @@ class Server(object):
     - listen_time: time listener loop waits for update_all
     - state: the state of the server defined below in ServerState
     - serializer: converts messages for reading and sending
+    - clock: the monotonic clock every timestamp of the game is expressed in.
+          Clients synchronize their own clock to it through 'sync' messages
+    - simulation: the SimulationWorker running the authoritative track (and
+          recording the race and sharing it with local processes, if
+          enabled) inline, in a thread or in a process
+    - events: the (car id, received gametime, message) inputs waiting for the
+          next tick. Only the last throttle event of every car is applied
+    - input_rate/input_burst: the inputs every client may send per second,
+          and in a burst, before the ones over the rate are held until the
+          client has a token again. A rate of None lets every input through
+    - coalesced/limited: the number of inputs coalesced away and held back
+    - rejected: the number of messages dropped because they could not be
+          read, or were game events the simulation could not apply
+    - on_demand: the OnDemandProfiler profiling the synchronous part of the
+          ticks and the reading of messages once a profile is requested, by
+          a signal or by a 'profile' message sent to /admin with the admin
+          token
+    - admin_token: the token admin messages must carry, None refuses them
+    - compressor: the Compressor deflating the messages above its threshold.
+          The websocket's own compression is turned off
+    - winner: the id of the winning car, once there is one
+    - results_time: how long the results are shown once the race is won,
+          before the room is reset to the lobby for the next race
+    - collector: the Collector keeping garbage collections out of the ticks.
+          The structures built at startup are frozen, and during a race only
+          the young generation is collected, between two ticks
+    - results: the ResultsStore every race result is queued to, if enabled
+    - loop_backend: the event loop implementation to run on (see
+          communication.backend), 'auto' picks uvloop when it is installed
+    - ping_rounds: how many times a new client is pinged to find its latency
+    - spectators: the SpectatorChannel sharing every broadcast with the
+          read-only connections made to /spectate
+    - tracer: the Tracer exporting the hops of the traced events up to their
+          broadcast, if tracing is enabled
 
     It is defined by the following behaviours:
     - start_server(): starts a socket connection that clients can connect to
     - update_all(update): updates all the clients
+    - broadcast(message): sends an encoded message to every client and
+          spectator, compressed once for all of them if it is large enough
+    - tick(): runs a tick of the race
+    - reset(): ends the race and sends everyone back to the lobby
     - listener(websocket, path): listens for messages from clients
+    - send_cars(): sends every client the car list and its own id
+    - spectate(websocket): streams the race to a read-only spectator
+    - admin(websocket): answers the admin messages of a connection to /admin
+    - buffer(subject, data): composes and compresses a message for the
+          spectators, as bytes
     """
 
-    def __init__(self, host='localhost', port=8765):
+    def __init__(self, host='localhost', port=8765, record=None,
+                 loop_backend=None, tracer=None, simulation=None,
+                 results=None, input_rate=DEF_INPUT_RATE,
+                 input_burst=DEF_INPUT_BURST, shared=None, on_demand=None,
+                 admin_token=None, results_time=DEF_RESULTS_TIME,
+                 gc_tuning=True, compressor=None):
         self.host        = host
         self.port        = port
         self.server      = None
@@ -41,142 +101,398 @@ class Server(object):
         self.listen_time = 0.01
         self.state       = ServerState()
         self.serializer  = Serializer()
-        self.track       = Track()
+        self.clock       = Clock()
         self.events      = []
         self.events_lock = Lock()
-        self.gametime   = 0
+        self.gametime    = 0
         self.winner      = None
+        self.results_time = results_time
+        self.results_end = None
+        self.collector   = Collector(gc_tuning)
+        self.simulation  = SimulationWorker(simulation or INLINE, record,
+                                            shared, self.collector)
+        self.results     = ResultsStore(results) if results else None
+        self.spectators  = SpectatorChannel()
+        self.loop_backend = backend.resolve(loop_backend)
+        self.ping_rounds = 50
+        self.tracer      = tracer
+        self.input_rate  = input_rate
+        self.input_burst = input_burst
+        self.coalesced   = 0
+        self.limited     = 0
+        self.rejected    = 0
+        self.on_demand   = on_demand or OnDemandProfiler('server-profile')
+        self.admin_token = admin_token
+        self.compressor  = compressor or Compressor()
 
     def start_server(self):
         """Start the server! Use the provided host and port, and run forever"""
-        self.server = websockets.serve(self.listener, self.host, self.port)
-        print(f'Listening at {self.host}:{self.port}...')
+        backend.set_event_loop(self.loop_backend)
+        self.simulation.start()
+        self.server = websockets.serve(self.listener, self.host, self.port,
+                                       compression=None)
+        print(f'Listening at {self.host}:{self.port} '
+              f'on the {self.loop_backend} loop, simulating '
+              f'{self.simulation.mode}...')
         asyncio.ensure_future(self.loop())
         asyncio.get_event_loop().run_until_complete(self.server)
-        asyncio.get_event_loop().run_forever()
+        self.collector.freeze()
+        try:
+            asyncio.get_event_loop().run_forever()
+        finally:
+            self.simulation.close()
+            if self.results is not None:
+                self.results.close()
+            if self.tracer is not None:
+                self.tracer.close()
+            if self.compressor.stats:
+                print(self.compressor.report())
 
     async def loop(self):
         while True:
             # If the game has a set start time, run the loop!
             if self.state.start_time is not None:
-                now = datetime.now()
-                self.game_time = (now - self.state.start_time).total_seconds()
+                now = self.clock.now()
+                self.gametime = now - self.state.start_time
 
                 # Ensure the game has started
                 if now > self.state.start_time:
-                    self.track.update_all(self.game_time)
+                    if self.state.mode == COUNTDOWN:
+                        self.state.mode = PLAY
+                        self.collector.pause()
+                    await self.tick()
+                    self.collector.collect_young()
 
-                    # Check for winners. If there is a winner, broadcast it
-                    winner = self.track.check_winner()
-                    if winner is not None and self.winner is None:
-                        self.winner = winner
-                        await self.update_all('winner', winner.id)
+                    # The results are shown for a while once there is a
+                    # winner
+                    if self.state.mode == PLAY and self.winner is not None:
+                        self.state.mode = RESULTS
+                        self.results_end = now + self.results_time
 
-                    # Send out all of the most recent events and clear the list
-                    # Only modify the events with access to the mutex
-                    with self.events_lock:
-                        events = self.events
-                        self.events = []
-                    await self.update_all('update', (self.game_time, events))
+                # The race is over once its results were shown, or once every
+                # player left
+                if not self.state.clients or (self.state.mode == RESULTS and
+                                              now > self.results_end):
+                    await self.reset()
 
             # Wait 0.05 seconds between each server tick
-            await asyncio.sleep(0.05)
+            await asyncio.sleep(TICK_TIME)
+
+    async def tick(self):
+        # Only the synchronous part of the tick is profiled: a profile taken
+        # across the awaits would also record the coroutines that run in the
+        # meantime
+        sampled = self.on_demand.begin()
+        try:
+            future = self.start_tick()
+        finally:
+            self.on_demand.end(sampled)
+
+        # The simulation applies the inputs, updates the track, checks for a
+        # winner and encodes the winner (once) and the update. Broadcast them
+        # as they are
+        self.winner, messages, result = await future
+
+        # The race was just won. Queue its result, the store writes it off the
+        # loop
+        if result is not None and self.results is not None:
+            self.results.record(result, self.state.get_names())
+        for message in messages:
+            await self.broadcast(message)
+
+    def start_tick(self):
+        """Hands the tick's inputs to the simulation, and returns the future
+        of its result. An inline simulation runs the tick right away
+        """
+        # Hand the most recent events, and the inputs held back by the rate
+        # limit once their client has a token for them, to the simulation and
+        # clear the list. Only modify the events with access to the mutex
+        now = self.clock.now()
+        with self.events_lock:
+            events = self.events
+            self.events = []
+            for client in self.state.clients.values():
+                if client.held is not None and client.bucket.take(now):
+                    events.append(client.held)
+                    client.held = None
+        received = len(events)
+        events = coalesce(events)
+        self.coalesced += received - len(events)
+        if self.tracer is not None:
+            self.trace_broadcast(events)
+        inputs = [(car_id, received, parsed.subject, parsed.data)
+                  for car_id, received, parsed in events]
+        return self.simulation.submit('tick', self.gametime, inputs)
+
+    async def reset(self):
+        """Reset the race and send everyone back to the lobby. The simulation
+        gives its cars back to its pool and keeps its track for the next race
+        """
+        await self.simulation.call('reset')
+        with self.events_lock:
+            self.events = []
+            self.state.reset()
+        self.winner      = None
+        self.gametime    = 0
+        self.results_end = None
+        self.collector.resume()
+        await self.update_all('reset')
+
+    def trace_broadcast(self, events):
+        """Stamp the traced events as broadcast, and export their hops so
+        far
+        """
+        now = self.clock.now()
+        for car_id, _, parsed in events:
+            trace = get_trace(parsed.data)
+            if trace is not None:
+                stamp(trace, 'broadcast', now)
+                self.tracer.export(trace, car=car_id, subject=parsed.subject)
 
     async def send(self, skt, subject, data=None):
         """Send a message to the given client socket"""
         message = self.serializer.compose(subject, data)
-        await skt.send(message)
+        await skt.send(self.compressor.pack(message, subject))
 
     async def update_all(self, subject, data=None):
-        """Update all of the clients with the given message"""
-        message = self.serializer.compose(subject, data)
-        await asyncio.wait([skt.send(message) for skt in self.state.clients])
+        """Update all of the clients with the given message. Spectators share
+        a single encoded copy of it
+        """
+        await self.broadcast(self.serializer.compose(subject, data))
+
+    async def broadcast(self, message):
+        message = self.compressor.pack(message)
+        self.spectators.publish(message if isinstance(message, bytes) else
+                                message.encode())
+        if self.state.clients:
+            await asyncio.wait([asyncio.ensure_future(skt.send(message))
+                                for skt in self.state.clients])
+
+    def buffer(self, subject, data):
+        message = self.compressor.pack(self.serializer.compose(subject, data),
+                                       subject)
+        return message if isinstance(message, bytes) else message.encode()
 
     async def listener(self, skt, path):
         """Listen for a new socket connection. On connection, update the server
         state and listen for messages from that client
         """
+        if path == SPECTATE_PATH:
+            return await self.spectate(skt)
+        if path == ADMIN_PATH:
+            return await self.admin(skt)
+
         try:
             # There is a new socket! Find its latency
             latency = await self.ping(skt)
             print(f'New Client Connected! Latency: {latency}')
 
             # Add the client to the server state and tell everyone about it
-            self.state.add_client(skt, latency)
+            bucket = TokenBucket(self.input_rate, self.input_burst) \
+                if self.input_rate else None
+            self.state.add_client(skt, latency, bucket)
             client = self.state.clients[skt]
 
-            # Update all with new car list. In each case, give
-            # the client their own id. This is a special update all because
-            # we include each client's own id in the message
-            all_cars = self.state.get_ids()
-            for client_socket in self.state.clients:
-                other_client = self.state.clients[client_socket]
-                await self.send(
-                    client_socket,
-                    'cars',
-                    (other_client.id, all_cars)
-                )
+            await self.send_cars()
 
             # Start listening for messages
             async for message in skt:
                 await self.read_message(client, message)
 
         except websockets.exceptions.ConnectionClosed as e:
-            print(f'Connection with Client '
-                  f'#{self.state.clients[skt][0]} closed!')
+            if skt in self.state.clients:
+                print(f'Connection with Client '
+                      f'#{self.state.clients[skt].id} closed!')
 
         finally:
             self.state.remove_client(skt)
-            await self.update_all(f'cars {str(self.state.get_ids())}')
+            await self.send_cars()
+
+    async def send_cars(self):
+        """Update all with the new car list. In each case, give the client
+        their own id. This is a special update all because we include each
+        client's own id in the message
+        """
+        all_cars = self.state.get_ids()
+        self.spectators.publish(self.buffer('cars', (None, all_cars)))
+        if self.state.clients:
+            await asyncio.wait([
+                asyncio.ensure_future(self.send(skt, 'cars',
+                                                (client.id, all_cars)))
+                for skt, client in self.state.clients.items()])
+
+    async def spectate(self, skt):
+        """Stream the race to a spectator. It is not pinged and gets no state
+        of its own: it is greeted with the car list (and, if the race is on,
+        the countdown and the last event of every car), then it is sent the
+        same encoded broadcasts as every other spectator, from the ones
+        published while the greeting was put together
+        """
+        cursor = self.spectators.seq
+        greeting = [('cars', (None, self.state.get_ids()))]
+        if self.state.start_time is not None:
+            seconds = self.state.start_time - self.clock.now()
+            events  = await self.simulation.call('snapshot')
+            greeting.append(('begin_countdown',
+                             (seconds, self.state.start_time)))
+            greeting.append(('update', (self.gametime, events)))
+            if self.winner is not None:
+                greeting.append(('winner', self.winner))
+        greeting = [self.buffer(subject, data) for subject, data in greeting]
+
+        try:
+            await self.spectators.serve(skt, greeting, cursor)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def admin(self, skt):
+        """Answer the admin messages of the connection. Every message carries
+        the admin token: ('profile', (token, seconds)) starts a profile of the
+        next seconds, at most profiling.MAX_DURATION, and ('compression',
+        (token, None)) is answered with the compression stats of every
+        subject. A malformed message, or a duration that is not a positive
+        number, is answered with False
+        """
+        try:
+            async for message in skt:
+                subject = None
+                try:
+                    parsed = self.serializer.read(message)
+                    if isinstance(parsed.subject, str):
+                        subject = parsed.subject
+                    token, args = parsed.data
+                except (ValueError, TypeError, IndexError, KeyError):
+                    await self.send(skt, subject, False)
+                    continue
+                allowed = self.admin_token is not None and \
+                    hmac.compare_digest(encode_token(token),
+                                        encode_token(self.admin_token))
+                reply = allowed
+                if allowed and subject == 'profile':
+                    reply = self.on_demand.request(args)
+                elif allowed and subject == 'compression':
+                    reply = self.compressor.summary()
+                await self.send(skt, subject, reply)
+        except websockets.exceptions.ConnectionClosed:
+            pass
 
     async def read_message(self, client, message):
         """Read an incoming message"""
-        parsed = self.serializer.read(message)
+        # As in tick, only the synchronous part is profiled. The reply the
+        # message needs, if any, is awaited once the profile is paused
+        sampled = self.on_demand.begin()
+        try:
+            reply = self.handle_message(client, message)
+        finally:
+            self.on_demand.end(sampled)
+        if reply is not None:
+            await reply
+
+    def handle_message(self, client, message):
+        """Handle an incoming message right away. Returns the coroutine of
+        the reply it needs, for the caller to await, or None
+        """
+        received = self.clock.now()
+
+        # A message that cannot be read, corrupt compressed data or
+        # malformed JSON, is dropped without closing the connection
+        try:
+            parsed = self.serializer.read(message)
+        except (ValueError, TypeError, IndexError, KeyError):
+            self.rejected += 1
+            return
 
         # Handle the incoming message, splitting on the subject
         if parsed.subject == 'start_game':
-            await self.begin_countdown()
+            return self.begin_countdown()
+
+        # The client is telling us the name of its player
+        elif parsed.subject == 'name':
+            client.name = str(parsed.data)[:MAX_NAME_LENGTH]
+
+        # The client is synchronizing its clock. Reply with when we received
+        # its request and when we answered it
+        elif parsed.subject == 'sync':
+            return self.send(client.socket, 'sync',
+                             (parsed.data, received, self.clock.now()))
+
+        # There is no race to apply a game event to in the lobby
+        elif self.state.mode == LOBBY:
+            return
 
-        # The message is a game event. Append the event to the event list
+        # A malformed game event would break the tick of every player, drop
+        # it before it is queued
+        elif not valid_event(parsed.subject, parsed.data):
+            self.rejected += 1
+            return
+
+        # The message is a game event. Append the event to the event list,
+        # for the simulation to apply on the next tick. Explode events are
+        # never limited, and the throttle event held before one goes ahead of
+        # it; a throttle event over the client's rate is held instead, in
+        # place of the one held before it
         else:
-            car = self.track.get_car_by_id(client.id)
-            timestamp, speed, distance = parsed.data
-            event = Event(parsed.subject, timestamp, speed, distance)
-            car.append_events([event], self.gametime)
+            trace = get_trace(parsed.data)
+            if trace is not None:
+                stamp(trace, 'server_received', received)
+            event = (client.id, self.gametime, parsed)
             with self.events_lock:
-                self.events.append((client.id, parsed))
+                if parsed.subject == 'explode':
+                    if client.held is not None:
+                        self.events.append(client.held)
+                        client.held = None
+                    self.events.append(event)
+                elif client.bucket is None or client.bucket.take(received):
+                    self.events.append(event)
+                    client.held = None
+                else:
+                    self.limited += 1
+                    client.held = event
 
     async def send_countdown(self, client):
         """Send a game countdown to the given client. The message includes
-        the number of seconds to start the game in
+        the number of seconds to start the game in, and the start time on the
+        server's clock for clients that have synchronized with it
         """
-        seconds = 5 - client.latency
-        await self.send(client.socket, 'begin_countdown', seconds)
+        seconds = self.state.start_time - self.clock.now() - client.latency
+        await self.send(client.socket, 'begin_countdown',
+                        (seconds, self.state.start_time))
 
     async def begin_countdown(self):
         """Begin the countdown! Ensure the game is in the lobby"""
-        if self.state.mode is not 'LOBBY':
+        if self.state.mode != LOBBY:
             return
 
-        # Put the game into play mode
-        self.state.mode = 'PLAY'
+        # Put the game into countdown mode, it is in play once the countdown
+        # is over
+        self.state.mode = COUNTDOWN
 
-        # Lock the participants and add them to the track
-        for client in self.state.clients.values():
-            self.track.add_participant(Car(client.id))
+        # Lock the participants and add them to the track before anyone is
+        # told the race is about to start
+        await self.simulation.call('add_participants', self.state.get_ids())
 
         # Send the countdown to every client
-        self.state.start_time = datetime.now() + timedelta(seconds=5)
+        self.state.start_time = self.clock.now() + COUNTDOWN_TIME
         clients =  self.state.clients.values()
-        await asyncio.wait([self.send_countdown(client) for client in clients])
+        self.spectators.publish(self.buffer(
+            'begin_countdown', (COUNTDOWN_TIME, self.state.start_time)))
+        await asyncio.wait([asyncio.ensure_future(self.send_countdown(client))
+                            for client in clients])
 
     async def ping(self, skt):
-        """Ping the client 50 times and calculate the latency"""
-        repeat, latencies = 50, []
+        """Ping the client ping_rounds times and calculate the latency"""
+        repeat, latencies = self.ping_rounds, []
         for _ in range(repeat):
-            start = time.time()
+            start = self.clock.now()
             await self.send(skt, 'ping')
             await skt.recv()
-            end = time.time()
+            end = self.clock.now()
             latencies.append(end - start)
         return statistics.mean(latencies) / 2
+
+
+def encode_token(token):
+    """The admin token as bytes: compare_digest only takes ASCII strings. A
+    lone surrogate, which JSON can decode to, is encoded as is
+    """
+    return str(token).encode('utf-8', 'surrogatepass')
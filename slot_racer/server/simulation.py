@@ -0,0 +1,283 @@
+# Module to run the authoritative simulation off the server's event loop
+#
+# The Simulation owns the server's track (and the race recorder), and turns a
+# batch of inputs into the encoded payloads of a tick. The SimulationWorker
+# runs it inline on the event loop, in a worker thread or in a worker process.
+# Requests go to the worker over a queue and their results come back over
+# another one, so the event loop never waits on the simulation: it keeps
+# accepting connections, reading inputs and answering pings while a tick is
+# being computed.
+
+# package imports
+import os
+import queue
+import asyncio
+import itertools
+import threading
+import multiprocessing
+from ..game import Car, Track, Event, CollisionIndex, Pool
+from ..communication import Serializer, TrackPublisher
+from ..replay import RaceRecorder
+from ..results import RaceStats
+
+# global variables
+INLINE  = 'inline'
+THREAD  = 'thread'
+PROCESS = 'process'
+MODES   = (INLINE, THREAD, PROCESS)
+
+
+def race_path(path, race):
+    """The path the race is recorded to: the first race is recorded to the
+    given path, the next ones to path-2, path-3, ... before the extension
+    """
+    if race == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}-{race}{ext}'
+
+
+class Simulation(object):
+    """Simulation is the server's authoritative copy of the race
+
+    It is defined by the following attributes:
+    - track: the server's track
+    - winner: the id of the winning car, once there is one
+    - recorder: the RaceRecorder logging the race, if recording is enabled.
+          Every race is logged to its own file, see race_path
+    - race: the number of the race, counting from 1
+    - cars: the Pool the cars are taken from, and given back to once the race
+          is reset
+    - stats: the RaceStats following the laps and falls of every car
+    - publisher: the TrackPublisher sharing every tick's cars with local
+          processes through shared memory, if enabled
+    - collisions: the CollisionIndex finding the cars that run into one
+          another. They fall, and every client is sent a 'collide' event
+
+    And the following behaviours:
+    - add_participants(ids): Puts the cars on the track
+    - tick(gametime, inputs): Applies a batch of (car id, received gametime,
+          subject, data) inputs, in the order they were received, and
+          advances the track. Returns the winner's id, the encoded messages
+          to broadcast, and the result of the race on the tick it is won
+    - snapshot(): The last event of every car, to catch a spectator up
+    - reset(): Ends the race and readies the same track for the next one
+    - close(): Finishes the recording
+    """
+    def __init__(self, record=None, shared=None):
+        self.track      = Track()
+        self.winner     = None
+        self.record     = record
+        self.race       = 1
+        self.recorder   = RaceRecorder(record) if record else None
+        self.cars       = Pool(Car)
+        self.stats      = RaceStats()
+        self.collisions = CollisionIndex(self.track)
+        self.serializer = Serializer()
+        self.publisher  = TrackPublisher(shared) if shared else None
+
+    def add_participants(self, ids):
+        for car_id in ids:
+            self.track.add_participant(self.cars.acquire(car_id))
+
+    def tick(self, gametime, inputs):
+        events = []
+        for car_id, received, subject, data in inputs:
+            car = self.track.get_car_by_id(car_id)
+            if car is None:
+                continue
+            timestamp, speed, distance = data[:3]
+
+            # An input older than the car's last event is stale, since a car
+            # only moves on from its last event. That event may be a collision
+            # the server applied after the input was sent: the car fell where
+            # it collided and must not pick up from before that
+            if car.prev_events and timestamp < car.prev_events[-1].timestamp:
+                continue
+            event = Event(subject, timestamp, speed, distance)
+            car.append_events([event], received)
+            if self.recorder is not None:
+                self.recorder.event(received, car_id, event)
+            events.append((car_id, (subject, data)))
+
+        self.track.update_all(gametime)
+        for pair in self.collisions.update():
+            for car in pair:
+                if car.fallen is not None:
+                    continue
+                event = car.collide(car.distance, gametime)
+                if self.recorder is not None:
+                    self.recorder.event(gametime, car.id, event)
+                events.append((car.id, ('collide', (gametime, 0,
+                                                    car.distance))))
+        self.stats.tick(gametime, self.track)
+        if self.recorder is not None:
+            self.recorder.tick(gametime, self.track)
+
+        # Check for winners. The winner is only announced once
+        messages, result = [], None
+        winner = self.track.check_winner()
+        if winner is not None and self.winner is None:
+            self.winner = winner.id
+            result = self.stats.result(gametime, self.track, winner.id)
+            if self.recorder is not None:
+                self.recorder.winner(gametime, winner.id)
+            messages.append(self.serializer.compose('winner', winner.id))
+        if self.publisher is not None:
+            self.publisher.publish(gametime, self.track.participants,
+                                   self.winner)
+
+        messages.append(self.serializer.compose('update', (gametime, events)))
+        return self.winner, messages, result
+
+    def snapshot(self):
+        return [(car.id, (event.event_type, (event.timestamp, event.speed,
+                                             event.distance)))
+                for car in self.track.participants
+                for event in car.prev_events[-1:]]
+
+    def reset(self):
+        for car in self.track.reset():
+            self.cars.release(car)
+        self.winner = None
+        self.stats.reset()
+        self.collisions.reset()
+        self.race += 1
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = RaceRecorder(race_path(self.record, self.race))
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.publisher is not None:
+            self.publisher.close()
+
+
+def serve(requests, results, record=None, shared=None, parent=None,
+          collector=None):
+    """Runs a Simulation on the requests until it is closed. Every request is
+    a (request id, command, args) tuple, answered with (request id, result),
+    or (request id, exception) if the command raised.
+    A worker process also stops once its parent, the server, is gone, and
+    freezes its own long-lived structures with the given Collector
+    """
+    simulation = Simulation(record, shared)
+    if collector is not None:
+        collector.freeze()
+    while True:
+        try:
+            request_id, command, args = requests.get(timeout=1.0)
+        except queue.Empty:
+            if parent is not None and os.getppid() != parent:
+                simulation.close()
+                return
+            continue
+        try:
+            result = getattr(simulation, command)(*args)
+        except Exception as exc:
+            result = exc
+        results.put((request_id, result))
+        if command == 'close':
+            return
+
+
+class SimulationWorker(object):
+    """SimulationWorker hands the simulation's work to where it runs
+
+    It is defined by the following attributes:
+    - mode: 'inline' on the event loop, 'thread' or 'process'
+    - simulation: the Simulation itself, when it runs inline
+    - requests/results: the queues to and from the worker
+    - futures: the pending requests, by id
+    - collector: the Collector a worker process freezes its simulation with
+
+    And the following behaviours:
+    - start(): Starts the worker. Must be called from the event loop
+    - call(command, *args): Runs a Simulation behaviour and returns its
+          result, without blocking the event loop. Raises what it raised
+    - submit(command, *args): Same, without waiting for the result
+    - close(): Closes the simulation and stops the worker
+    """
+    def __init__(self, mode=INLINE, record=None, shared=None, collector=None):
+        if mode not in MODES:
+            raise ValueError(f'Unknown simulation mode: {mode}. '
+                             f'Choose from {", ".join(MODES)}')
+        self.mode       = mode
+        self.record     = record
+        self.shared     = shared
+        self.collector  = collector
+        self.simulation = None
+        self.requests   = None
+        self.results    = None
+        self.futures    = {}
+        self.ids        = itertools.count()
+        self.loop       = None
+        self.workers    = []
+
+    def start(self):
+        self.loop = asyncio.get_event_loop()
+        if self.mode == INLINE:
+            self.simulation = Simulation(self.record, self.shared)
+            return
+
+        if self.mode == THREAD:
+            self.requests, self.results = queue.Queue(), queue.Queue()
+            worker = threading.Thread(
+                target=serve, daemon=True,
+                args=(self.requests, self.results, self.record, self.shared))
+        else:
+            self.requests = multiprocessing.Queue()
+            self.results  = multiprocessing.Queue()
+            worker = multiprocessing.Process(
+                target=serve, daemon=True,
+                args=(self.requests, self.results, self.record, self.shared,
+                      os.getpid(), self.collector))
+        reader = threading.Thread(target=self._read_results, daemon=True)
+        self.workers = [worker, reader]
+        for thread in self.workers:
+            thread.start()
+
+    def _read_results(self):
+        """Resolves the futures as the results come back, on the loop"""
+        while True:
+            request_id, result = self.results.get()
+            self.loop.call_soon_threadsafe(self._resolve, request_id, result)
+            if request_id is None:
+                return
+
+    def _resolve(self, request_id, result):
+        future = self.futures.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def submit(self, command, *args):
+        if self.mode == INLINE:
+            future = self.loop.create_future()
+            try:
+                future.set_result(getattr(self.simulation, command)(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+        request_id = next(self.ids)
+        future = self.futures[request_id] = self.loop.create_future()
+        self.requests.put((request_id, command, args))
+        return future
+
+    async def call(self, command, *args):
+        return await self.submit(command, *args)
+
+    def close(self):
+        """Closes the simulation, waiting for the worker to finish what it was
+        given first
+        """
+        if self.mode == INLINE:
+            self.simulation.close()
+            return
+        self.requests.put((None, 'close', ()))
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,73 @@
+# Module to let read-only spectators watch a race
+#
+# Every broadcast is encoded once and published to a SpectatorChannel. The
+# channel keeps the last few encoded buffers, and each spectator socket is
+# served by its own task that sends the very same buffer objects. Publishing
+# is O(1) for the tick, whatever the number of spectators.
+
+# package imports
+import asyncio
+from collections import deque
+
+
+class SpectatorChannel(object):
+    """SpectatorChannel shares pre-encoded broadcast buffers between spectators
+
+    It is defined by the following attributes:
+    - capacity: the number of buffers kept for spectators that fall behind
+    - frames: the last published (sequence number, buffer) pairs
+    - seq: the sequence number of the last published buffer
+    - count: the number of spectators currently watching
+    - published: a future resolved (and replaced) on every publish
+
+    And the following behaviours:
+    - publish(buffer): Makes an encoded buffer available to every spectator
+    - serve(skt, greeting, cursor): Sends the greeting and then every buffer
+          published after the cursor to the socket, until it disconnects or
+          falls too far behind
+    """
+    def __init__(self, capacity=100):
+        self.capacity  = capacity
+        self.frames    = deque(maxlen=capacity)
+        self.seq       = 0
+        self.count     = 0
+        self.published = None
+
+    def publish(self, buffer):
+        self.seq += 1
+        self.frames.append((self.seq, buffer))
+        if self.published is not None and not self.published.done():
+            self.published.set_result(None)
+        self.published = None
+
+    async def wait(self):
+        if self.published is None:
+            self.published = asyncio.get_event_loop().create_future()
+        await asyncio.shield(self.published)
+
+    async def serve(self, skt, greeting=(), cursor=None):
+        """Serve one spectator. The greeting buffers catch it up with the race
+        before it starts following the broadcasts published after the cursor,
+        the last sequence number when the greeting was put together
+        """
+        self.count += 1
+        try:
+            if cursor is None:
+                cursor = self.seq
+            for buffer in greeting:
+                await skt.send(buffer)
+            while True:
+                if cursor == self.seq:
+                    await self.wait()
+                    continue
+
+                # A spectator that fell out of the kept window can't be caught
+                # up with events only, so let it reconnect instead
+                oldest = self.frames[0][0]
+                if cursor + 1 < oldest:
+                    await skt.close(1008, 'Spectator fell behind')
+                    return
+                cursor, buffer = self.frames[cursor + 1 - oldest]
+                await skt.send(buffer)
+        finally:
+            self.count -= 1
@@ -0,0 +1,144 @@
+# Module to test how the server lets the clients' inputs through
+
+
+# local imports
+import asyncio
+from .inputs import coalesce, valid_event, TokenBucket
+from .server import Server
+from ..communication.serializer import Message
+from ..game import Car
+from ..game.state.extra import log
+
+# global definitions
+RATE  = 10.0
+BURST = 3
+
+
+def event(car_id, subject, received=0.0):
+    return (car_id, received, Message(subject, [received, 0.0, 0.0]))
+
+
+class FixedClock(object):
+    """A clock that only moves when told to"""
+    def __init__(self):
+        self.time = 0.0
+
+    def now(self):
+        return self.time
+
+
+def test0():
+    """Test0: Only the last throttle event of every car is kept
+       - Earlier throttle events of a car are coalesced away
+       - Explode events are all kept, in the order they came in
+    """
+    match = []
+    events = [
+        event(0, Car.ACCELERATE, 0.1),
+        event(1, Car.ACCELERATE, 0.2),
+        event(0, 'explode', 0.3),
+        event(0, Car.STOP_ACCELERATING, 0.4),
+        event(1, 'explode', 0.5),
+        event(0, Car.ACCELERATE, 0.6)
+    ]
+    kept = coalesce(events)
+
+    # earlier throttle events of a car are coalesced away
+    match.append([e for e in kept if e[2].subject != 'explode'] ==
+                 [events[1], events[5]])
+
+    # explode events are all kept, in the order they came in
+    match.append(kept == [events[1], events[2], events[4], events[5]])
+    match.append(coalesce([]) == [])
+
+    log(match, test0.__doc__)
+
+
+def test1():
+    """Test1: Only events the simulation can apply are valid
+       - Known subjects with a timestamp, speed and distance
+       - Unknown subjects and short data
+       - Booleans, NaN, infinities and strings
+    """
+    match = []
+
+    # known subjects with a timestamp, speed and distance
+    match.append(valid_event(Car.ACCELERATE, [1.0, 0.5, 2]))
+    match.append(valid_event('explode', (1, 0.5, 2.0, 'extra')))
+
+    # unknown subjects and short data
+    match.append(not valid_event('teleport', [1.0, 0.5, 2.0]))
+    match.append(not valid_event(Car.ACCELERATE, [1.0, 0.5]))
+    match.append(not valid_event(Car.ACCELERATE, None))
+
+    # booleans, NaN, infinities and strings
+    match.append(not valid_event(Car.ACCELERATE, [True, 0.5, 2.0]))
+    match.append(not valid_event(Car.ACCELERATE, [1.0, float('nan'), 2.0]))
+    match.append(not valid_event('explode', [1.0, 0.5, float('inf')]))
+    match.append(not valid_event(Car.ACCELERATE, ['1.0', 0.5, 2.0]))
+
+    log(match, test1.__doc__)
+
+
+def test2():
+    """Test2: The token bucket allows a burst, then a steady rate
+       - A full bucket lets the burst through
+       - Tokens come back at the rate
+       - Refilling never goes over the burst
+    """
+    bucket, match = TokenBucket(RATE, BURST), []
+
+    # a full bucket lets the burst through
+    match.append(all(bucket.take(0.0) for _ in range(BURST)))
+    match.append(not bucket.take(0.0))
+
+    # tokens come back at the rate
+    match.append(bucket.take(1 / RATE))
+    match.append(not bucket.take(1 / RATE))
+
+    # refilling never goes over the burst
+    taken = [bucket.take(100.0) for _ in range(BURST + 1)]
+    match.append(taken == [True] * BURST + [False])
+
+    log(match, test2.__doc__)
+
+
+def test3():
+    """Test3: An input held back by the rate limit costs a token
+       - It is held while its client has no token
+       - It goes ahead once its client has a token again
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server, match = Server(), []
+    server.clock = FixedClock()
+    server.simulation.start()
+    client_id = server.state.add_client(None, 0.0, TokenBucket(RATE, 1))
+    client = server.state.clients[None]
+    loop.run_until_complete(
+        server.simulation.call('add_participants', [client_id]))
+    client.bucket.take(0.0)
+    client.held = event(client_id, Car.ACCELERATE)
+
+    # it is held while its client has no token
+    loop.run_until_complete(server.start_tick())
+    match.append(client.held is not None)
+
+    # it goes ahead once its client has a token again
+    server.clock.time = 1 / RATE
+    loop.run_until_complete(server.start_tick())
+    match.append(client.held is None and client.bucket.tokens < 1.0)
+
+    server.simulation.close()
+    loop.close()
+    asyncio.set_event_loop(None)
+
+    log(match, test3.__doc__)
+
+
+def run():
+    """Runs all tests"""
+    test0()
+    test1()
+    test2()
+    test3()